@@ -0,0 +1,25 @@
+"""Cost of the config accessors, which re-read config.ini on every call."""
+import ymp.config as config
+from harness import measure
+
+CALLS = 1000
+
+ACCESSORS = (
+    'get_music_dir',
+    'is_smart_download_enabled',
+    'is_permanent_mode',
+    'get_max_songs',
+    'is_preload_enabled',
+    'get_preload_trigger',
+)
+
+def run(scale):
+    config.get_config() # Make sure config.ini exists
+    results = {}
+    for name in ACCESSORS:
+        accessor = getattr(config, name)
+        def calls(accessor=accessor):
+            for _ in range(CALLS):
+                accessor()
+        results[f'config.{name}[x{CALLS}]'] = measure(calls, runs=scale['runs'])
+    return results
@@ -0,0 +1,38 @@
+"""
+Parallel range downloads (ymp.chunked) against a local server that throttles
+every connection, like YouTube does, compared with one streaming connection.
+"""
+import os
+
+import requests
+
+from harness import measure
+from standins import ThrottledAudioHandler, start_audio_server
+
+RATE = 8 * 1024 * 1024 # Bytes/s per connection
+CHUNK_SIZE = 512 * 1024
+
+def single_connection(url, dest):
+    with requests.get(url, stream=True, timeout=30) as response, open(dest, 'wb') as f:
+        for block in response.iter_content(64 * 1024):
+            f.write(block)
+
+def run(scale):
+    import ymp.chunked as chunked
+    server, base_url = start_audio_server(handler=ThrottledAudioHandler)
+    server.rate = RATE
+    url = f'{base_url}/audio/mix.webm'
+    dest = os.path.join(os.environ['HOME'], 'mix.webm')
+    size = len(server.payload)
+    results = {}
+    try:
+        results['download.single_connection'] = measure(lambda: single_connection(url, dest), runs=scale['runs'],
+                                                        size=size, rate=RATE)
+        for connections in (2, 4, 8):
+            download = lambda: chunked.ChunkedDownload(url, dest, connections=connections, chunk_size=CHUNK_SIZE).run()
+            results[f'download.chunked_{connections}_connections'] = measure(download, runs=scale['runs'],
+                                                                           size=size, rate=RATE)
+    finally:
+        server.shutdown()
+        server.server_close()
+    return results
@@ -0,0 +1,24 @@
+"""Library index: the incremental rescan of an unchanged tree, and a search over it."""
+import os
+
+import ymp.config as config
+import ymp.library as library
+from bench_storage import make_tree
+from harness import measure
+
+def run(scale):
+    results = {}
+    music_dir = os.path.join(config.get_music_dir(), 'library')
+    created = 0
+    for count in sorted(scale['files']):
+        make_tree(music_dir, created, count)
+        created = count
+        index = library.Library(os.path.join(config.CONFIG_DIR, f'library-{count}.json'))
+        index.refresh(music_dir) # First scan reads every file once
+
+        results[f'library.refresh.unchanged[{count}]'] = measure(lambda: index.refresh(music_dir), runs=scale['runs'])
+        # A fresh process: the index is loaded from disk first
+        results[f'library.refresh.cold[{count}]'] = measure(
+            lambda: library.Library(index.path).refresh(music_dir), runs=scale['runs'])
+        results[f'library.search[{count}]'] = measure(lambda: index.search('track 0042', 8), runs=scale['runs'])
+    return results
@@ -0,0 +1,76 @@
+"""
+Full resolve -> stream -> download -> play pipeline, fully offline:
+stubbed YoutubeDL, local HTTP audio server and a fake ffplay.
+"""
+import contextlib
+import io
+import os
+import time
+
+from harness import summarize
+from standins import start_audio_server, install_stub_youtube_dl, install_fake_ffplay
+
+FIRST_AUDIO_TIMEOUT = 10
+
+def wait_first_audio(marker):
+    """Blocks until the fake ffplay has read its first bytes. Returns the time it took."""
+    start = time.perf_counter()
+    while not os.path.exists(marker):
+        if time.perf_counter() - start > FIRST_AUDIO_TIMEOUT:
+            raise RuntimeError("fake ffplay never reported first audio")
+        time.sleep(0.001)
+    os.remove(marker)
+    return time.perf_counter() - start
+
+def run(scale):
+    server, base_url = start_audio_server()
+    install_stub_youtube_dl(base_url)
+    install_fake_ffplay(os.path.join(os.environ['HOME'], 'bin'))
+    marker = os.path.join(os.environ['HOME'], 'first-audio')
+    os.environ['YMP_BENCH_FIRST_AUDIO'] = marker
+
+    # Imported after the stand-ins are installed
+    import ymp.downloader as downloader
+    import ymp.player as player
+    from ymp.playlistmanager import Playlist
+    player.AUDIO_AVAILABLE = True
+
+    stages = {'resolve': [], 'first_sound_stream': [], 'download': [], 'first_sound_cached': [], 'total': []}
+    pls = Playlist()
+    pls.enable_rich_ui = False
+    try:
+        for i in range(scale['pipeline_runs'] + 1):
+            # A new query every run, so the cache never short-circuits the download
+            pls.addsong(f'benchmark query {i} {time.time()}')
+            start = time.perf_counter()
+            song = pls.returnsong()
+
+            meta, url = downloader.extract_stream_info(song)
+            resolved = time.perf_counter()
+            pls.filepath = url
+            pls.playsong(meta, None)
+            first_stream = wait_first_audio(marker)
+
+            t = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                _, path = downloader.download(song)
+            downloaded = time.perf_counter() - t
+
+            pls.stop_all()
+            pls.filepath = path
+            pls.playsong(meta, None)
+            first_cached = wait_first_audio(marker)
+            pls.stop_all()
+
+            if i == 0:
+                continue # Warmup
+            stages['resolve'].append(resolved - start)
+            stages['first_sound_stream'].append(resolved - start + first_stream)
+            stages['download'].append(downloaded)
+            stages['first_sound_cached'].append(first_cached)
+            stages['total'].append(time.perf_counter() - start)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    return {f'pipeline.{name}': summarize(times) for name, times in stages.items()}
@@ -0,0 +1,32 @@
+"""parse_pls on large local playlist files."""
+import contextlib
+import io
+import os
+import tempfile
+
+from ymp.downloader import parse_pls
+from harness import measure
+
+def write_pls(path, count):
+    with open(path, 'w') as f:
+        f.write('[playlist]\n')
+        for i in range(1, count + 1):
+            f.write(f'File{i}=http://radio{i % 20}.example.com:8000/stream{i}\n')
+            f.write(f'Title{i}=Station {i}\n')
+            f.write(f'Length{i}=-1\n')
+        f.write(f'NumberOfEntries={count}\nVersion=2\n')
+
+def run(scale):
+    results = {}
+    for count in scale['pls']:
+        fd, path = tempfile.mkstemp(suffix='.pls')
+        os.close(fd)
+        try:
+            write_pls(path, count)
+            def parse():
+                with contextlib.redirect_stdout(io.StringIO()):
+                    parse_pls(path)
+            results[f'pls.parse_local[{count}]'] = measure(parse, runs=scale['runs'])
+        finally:
+            os.remove(path)
+    return results
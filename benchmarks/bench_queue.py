@@ -0,0 +1,101 @@
+"""Playlist queue operations at scale, with tracks built from yt-dlp-like flat playlist entries."""
+import os
+import random
+import tempfile
+
+import ymp.session as session
+import ymp.tracks as tracks
+from ymp.playlistmanager import Playlist
+from harness import measure, retained_mb
+
+def flat_entry(i):
+    """Roughly what yt-dlp's extract_flat returns for one playlist item."""
+    video_id = f'vid{i:08d}'
+    return {
+        '_type': 'url', 'ie_key': 'Youtube', 'id': video_id,
+        'url': f'https://www.youtube.com/watch?v={video_id}',
+        'title': f'Artist {i % 500} - Song {i}', 'description': None,
+        'duration': 180 + i % 120, 'channel_id': f'UC{i % 500:020d}',
+        'channel': f'Artist {i % 500}', 'channel_url': f'https://www.youtube.com/channel/UC{i % 500:020d}',
+        'uploader': f'Artist {i % 500}', 'view_count': i * 37,
+        'thumbnails': [{'url': f'https://i.ytimg.com/vi/{video_id}/hqdefault.jpg', 'height': 360, 'width': 480}],
+        'live_status': None, 'channel_is_verified': None,
+    }
+
+def make_playlist(size):
+    pls = Playlist()
+    pls.enable_rich_ui = False
+    pls.queuedplaylist = [tracks.of(flat_entry(i)) for i in range(size)]
+    return pls
+
+def run(scale):
+    results = {}
+    for size in scale['queue']:
+        entries = [flat_entry(i) for i in range(size)]
+
+        # What the queue holds: the flat entries as they were queued before ymp.tracks, and tracks
+        def raw_queue():
+            return [flat_entry(i) for i in range(size)]
+        def track_queue():
+            return [tracks.of(flat_entry(i)) for i in range(size)]
+        results[f'queue.fill_raw_entries[{size}]'] = measure(raw_queue, runs=scale['runs'], retained_mb=retained_mb(raw_queue))
+        results[f'queue.fill_tracks[{size}]'] = measure(track_queue, runs=scale['runs'], retained_mb=retained_mb(track_queue))
+
+        queued = [tracks.of(entry) for entry in entries] # As downloader.get_playlist_info returns them
+        def add_all():
+            pls = Playlist()
+            for track in queued:
+                pls.addsong(track)
+        results[f'queue.addsong[{size}]'] = measure(add_all, runs=scale['runs'])
+
+        state = {}
+        def fill():
+            state['pls'] = make_playlist(size)
+        def drain():
+            pls = state['pls']
+            while pls.queuedplaylist:
+                pls.returnsong()
+        results[f'queue.returnsong_drain[{size}]'] = measure(drain, runs=scale['runs'], setup=fill)
+
+        def shuffle():
+            random.seed(0)
+            state['pls'].shuffleplaylist()
+        results[f'queue.shuffle[{size}]'] = measure(shuffle, runs=scale['runs'], setup=fill)
+
+        def loop():
+            pls = state['pls']
+            pls.playedplaylist, pls.queuedplaylist = pls.queuedplaylist, []
+            pls.loopqueue()
+        results[f'queue.loopqueue[{size}]'] = measure(loop, runs=scale['runs'], setup=fill)
+
+        def jump_to_middle():
+            # What selecting an item in the TUI list does
+            pls = state['pls']
+            song = pls.queuedplaylist.pop(size // 2)
+            pls.queuedplaylist.insert(0, song)
+        results[f'queue.jump_to_middle[{size}]'] = measure(jump_to_middle, runs=scale['runs'], setup=fill)
+
+        def preload_check():
+            pls = state['pls']
+            pls.preload_done.clear()
+            pls.check_preload(0) # below trigger: only the cheap checks
+        results[f'queue.check_preload[{size}]'] = measure(preload_check, runs=scale['runs'], setup=fill)
+
+        path = os.path.join(tempfile.gettempdir(), f'ymp-bench-session-{os.getpid()}.json')
+        def save_session():
+            session.write_snapshot(session.snapshot(state['pls']), path)
+        results[f'queue.session_snapshot[{size}]'] = measure(save_session, runs=scale['runs'], setup=fill)
+
+        # A periodic save while a song plays: only the position moved since the last one
+        def start_saver():
+            fill()
+            pls = state['pls']
+            pls.meta, pls.playobj, pls.songpaused, pls.resumetime = {'id': 'vid00000000', 'title': 'Playing'}, object(), True, 0
+            state['saver'] = session.SessionSaver(pls, path=path, interval=60)
+            state['saver'].save()
+        def save_tick():
+            state['pls'].resumetime += 5000
+            state['saver'].save()
+        results[f'queue.session_tick[{size}]'] = measure(save_tick, runs=scale['runs'], setup=start_saver)
+        os.remove(path)
+    return results
@@ -0,0 +1,130 @@
+"""
+Cold-start benchmark for the ymp entry point.
+
+Reports
+  * time-to-argparse: wall time of `python -m ymp --version` (interpreter start, imports, argument parsing)
+  * time-to-first-frame: wall time from process start until the Textual UI has drawn its first frame
+  * the slowest imports of each path, from `python -X importtime`
+
+Every run uses a throwaway HOME, so no real config, cache or lock is touched.
+
+Usage (from the repository root):
+    python benchmarks/bench_startup.py [--runs N] [--json results.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Modules that must not be imported just to parse the command line
+HEAVY_MODULES = ('yt_dlp', 'textual', 'rich', 'requests', 'pyfiglet', 'mpris_server', 'bs4', 'lxml')
+
+# Budgets in milliseconds (median); exceeding one makes the script exit with status 1
+BUDGET_ARGPARSE_MS = 150
+BUDGET_FIRST_FRAME_MS = 1500
+
+# Runs ymp headless and reports the moment the first frame has been rendered
+FIRST_FRAME_DRIVER = '''
+import sys, time
+import textual.app
+
+_run = textual.app.App.run
+
+def run(self, *args, **kwargs):
+    async def auto_pilot(pilot):
+        await pilot.pause()
+        sys.__stdout__.write("FIRST_FRAME %f\\n" % time.time())
+        sys.__stdout__.flush()
+        pilot.app.exit()
+    return _run(self, headless=True, auto_pilot=auto_pilot)
+
+textual.app.App.run = run
+sys.argv = ['ymp']
+from ymp.__main__ import main
+main()
+'''
+
+def parse_importtime(stderr):
+    """Returns {module: cumulative_us} from `-X importtime` output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative)
+    return modules
+
+def top_imports(modules, count=8):
+    """Slowest top-level packages by cumulative import time (ms)."""
+    roots = {name: us for name, us in modules.items() if '.' not in name}
+    ranked = sorted(roots.items(), key=lambda item: item[1], reverse=True)[:count]
+    return [{'module': name, 'ms': round(us / 1000, 1)} for name, us in ranked]
+
+def run_once(args, home, driver=None):
+    """Runs one cold start and returns (wall_ms, stdout, stderr)."""
+    env = dict(os.environ, HOME=home, PYTHONPATH=ROOT)
+    cmd = [sys.executable, '-X', 'importtime']
+    cmd += ['-c', driver] if driver else ['-m', 'ymp'] + args
+    start = time.time()
+    proc = subprocess.run(cmd, env=env, cwd=home, capture_output=True, text=True, timeout=60)
+    end = time.time()
+    if driver:
+        for line in proc.stdout.splitlines():
+            if line.startswith('FIRST_FRAME '):
+                end = float(line.split()[1])
+                break
+        else:
+            raise RuntimeError(f"ymp exited without drawing a frame:\n{proc.stderr[-2000:]}")
+    return (end - start) * 1000, proc.stdout, proc.stderr
+
+def measure(runs, driver=None, args=()):
+    times = []
+    modules = {}
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as home:
+            wall_ms, _, stderr = run_once(list(args), home, driver)
+        times.append(wall_ms)
+        modules = parse_importtime(stderr)
+    return {
+        'runs': runs,
+        'min_ms': round(min(times), 1),
+        'median_ms': round(statistics.median(times), 1),
+        'heavy_imports': sorted(m for m in HEAVY_MODULES if m in modules),
+        'top_imports': top_imports(modules),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="ymp cold-start benchmark")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--json', metavar='FILE', help="Also write the results to FILE")
+    parser.add_argument('--skip-first-frame', action='store_true', help="Only measure time-to-argparse")
+    opts = parser.parse_args()
+
+    results = {'time_to_argparse': measure(opts.runs, args=['--version'])}
+    if not opts.skip_first_frame:
+        results['time_to_first_frame'] = measure(opts.runs, driver=FIRST_FRAME_DRIVER)
+
+    budgets = {'time_to_argparse': BUDGET_ARGPARSE_MS, 'time_to_first_frame': BUDGET_FIRST_FRAME_MS}
+    failed = False
+    for name, result in results.items():
+        result['budget_ms'] = budgets[name]
+        over = result['median_ms'] > budgets[name]
+        failed = failed or over
+        print(f"{name:22} median {result['median_ms']:8.1f} ms  min {result['min_ms']:8.1f} ms"
+              f"  budget {budgets[name]} ms{'  OVER BUDGET' if over else ''}")
+        print(f"{'':22} heavy imports: {', '.join(result['heavy_imports']) or 'none'}")
+        print(f"{'':22} slowest: " + ', '.join(f"{i['module']} {i['ms']}ms" for i in result['top_imports']))
+
+    if opts.json:
+        with open(opts.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Smart Download storage management: check_disk_usage / manage_storage on synthetic music trees."""
+import contextlib
+import io
+import os
+
+import ymp.config as config
+from harness import measure
+
+FILE_SIZE = 512 # Bytes per synthetic track; the cost under test is the walk, not the data
+FILES_PER_DIR = 100 # Spread tracks over "artist" folders like permanent mode does
+EVICT = 50 # Tracks removed per eviction run
+MTIME_BASE = 1_000_000_000 # Track i gets mtime MTIME_BASE + i, so lower indexes are older
+
+def track_path(root, i):
+    return os.path.join(root, f'Artist {i // FILES_PER_DIR:05d}', f'Track {i:06d}.mp3')
+
+def write_track(path, i):
+    with open(path, 'wb') as f:
+        f.write(b'\0' * FILE_SIZE)
+    os.utime(path, (MTIME_BASE + i, MTIME_BASE + i))
+
+def make_tree(root, start, stop):
+    """Adds tracks start..stop-1 to the synthetic tree."""
+    for i in range(start, stop):
+        path = track_path(root, i)
+        if i == start or i % FILES_PER_DIR == 0:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_track(path, i)
+
+def restore_oldest(root):
+    """Setup step that recreates the tracks evicted by the previous run."""
+    def setup():
+        for i in range(EVICT):
+            path = track_path(root, i)
+            if not os.path.exists(path):
+                write_track(path, i)
+    return setup
+
+def quiet(fn):
+    """manage_storage prints one line per eviction; keep the benchmark output readable."""
+    def wrapper():
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn()
+    return wrapper
+
+def run(scale):
+    results = {}
+    music_dir = config.get_music_dir()
+    config.set_runtime_permanent_storage(False)
+
+    created = 0
+    for count in sorted(scale['files']):
+        # Grow the same tree instead of rebuilding it for every size
+        make_tree(music_dir, created, count)
+        created = count
+
+        results[f'storage.check_disk_usage[{count}]'] = measure(
+            lambda: config.check_disk_usage(music_dir), runs=scale['runs'])
+
+        # Limits that are never hit: pure scan + sort cost
+        config.update_setting('SmartDownload', 'max_songs', 0)
+        config.update_setting('SmartDownload', 'max_storage_mb', 0)
+        results[f'storage.manage_storage.scan[{count}]'] = measure(
+            config.manage_storage, runs=scale['runs'])
+
+        # Count limit just below the tree size: scan + evict the EVICT oldest tracks
+        config.update_setting('SmartDownload', 'max_songs', count - EVICT)
+        results[f'storage.manage_storage.evict_count[{count}]'] = measure(
+            quiet(config.manage_storage), runs=scale['runs'], setup=restore_oldest(music_dir))
+        config.update_setting('SmartDownload', 'max_songs', 0)
+
+        # Size limit just below the tree size: exercises the check_disk_usage re-walk
+        limit_mb = (count - EVICT) * FILE_SIZE / (1024 * 1024)
+        config.update_setting('SmartDownload', 'max_storage_mb', max(int(limit_mb), 1))
+        results[f'storage.manage_storage.evict_size[{count}]'] = measure(
+            quiet(config.manage_storage), runs=scale['runs'], setup=restore_oldest(music_dir))
+        config.update_setting('SmartDownload', 'max_storage_mb', 0)
+
+    return results
@@ -0,0 +1,35 @@
+"""Rendering cost of YmpTui.update_playlist_view with large queues (headless Textual)."""
+import asyncio
+import time
+
+from ymp.playlistmanager import Playlist
+from ymp.tui import YmpTui
+from harness import summarize
+from bench_queue import flat_entry
+
+class ViewOnlyTui(YmpTui):
+    """YmpTui without the player loop, MPRIS and background workers."""
+
+    def on_mount(self, event) -> None:
+        event.prevent_default() # Skip YmpTui.on_mount
+        self.update_playlist_view()
+
+async def bench_view(size, runs):
+    pls = Playlist()
+    pls.queuedplaylist = [flat_entry(i) for i in range(size)]
+    app = ViewOnlyTui(playlist_manager=pls, download_dir=None)
+    times = []
+    async with app.run_test(headless=True, size=(160, 50)) as pilot:
+        await pilot.pause()
+        for _ in range(runs + 1):
+            start = time.perf_counter()
+            app.update_playlist_view()
+            await pilot.pause() # Includes layout and the repaint of the list
+            times.append(time.perf_counter() - start)
+    return summarize(times[1:]) # First run is warmup
+
+def run(scale):
+    results = {}
+    for size in scale['queue']:
+        results[f'tui.update_playlist_view[{size}]'] = asyncio.run(bench_view(size, scale['runs']))
+    return results
@@ -0,0 +1,92 @@
+"""
+Shared helpers for the ymp benchmark suite.
+
+The suite never touches the network or the user's real config/music dir:
+`isolate()` points HOME at a throwaway directory *before* ymp is imported
+(ymp.config resolves its paths at import time).
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+def isolate():
+    """Redirects HOME to a temporary directory and makes the repo importable. Returns the new HOME."""
+    home = tempfile.mkdtemp(prefix='ymp-bench-')
+    os.environ['HOME'] = home
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    return home
+
+def summarize(times, **extra):
+    """Turns a list of durations (seconds) into the result record stored in the JSON file."""
+    result = {
+        'runs': len(times),
+        'min': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.fmean(times),
+        'max': max(times),
+    }
+    result.update(extra)
+    return result
+
+def measure(fn, runs=5, warmup=1, setup=None, **extra):
+    """
+    Times fn() `runs` times after `warmup` untimed calls.
+    `setup()` runs untimed before every call (e.g. to recreate deleted files).
+    """
+    for _ in range(warmup):
+        if setup: setup()
+        fn()
+    times = []
+    for _ in range(runs):
+        if setup: setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return summarize(times, **extra)
+
+def retained_mb(build):
+    """MB still allocated by what build() returns (traced with tracemalloc, so run it untimed)."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = build()
+        size = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del kept
+    return size / (1024 * 1024)
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def environment():
+    """Metadata stored next to the results so runs from different commits/machines can be told apart."""
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+def write_results(path, results, **meta):
+    data = {'meta': dict(environment(), **meta), 'results': results}
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,78 @@
+"""
+Offline benchmark suite for ymp's hot paths.
+
+Runs without network access: config and music dir live in a throwaway HOME,
+YoutubeDL is stubbed, audio comes from a local HTTP server and ffplay is faked.
+Results are written as JSON so runs from different commits can be compared.
+
+Usage (from the repository root):
+    python benchmarks/run.py [--scale quick|full] [--only storage,queue] [--output results.json]
+    python benchmarks/run.py --compare base.json new.json
+"""
+import argparse
+import importlib
+import os
+import shutil
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import harness
+
+SUITES = ('config', 'queue', 'pls', 'storage', 'tui', 'pipeline', 'download', 'library')
+
+SCALES = {
+    'quick': {'runs': 5, 'files': [10_000], 'queue': [10_000], 'pls': [10_000], 'pipeline_runs': 5},
+    'full': {'runs': 7, 'files': [10_000, 100_000], 'queue': [10_000, 50_000], 'pls': [10_000, 100_000],
+             'pipeline_runs': 10},
+}
+
+def compare(base_path, new_path):
+    """Prints the median of every benchmark present in both files and the ratio new/base."""
+    base = harness.load_results(base_path)
+    new = harness.load_results(new_path)
+    print(f"base: {base['meta'].get('commit')}  new: {new['meta'].get('commit')}")
+    print(f"{'benchmark':55} {'base ms':>10} {'new ms':>10} {'ratio':>7}")
+    for name in sorted(set(base['results']) & set(new['results'])):
+        old_ms = base['results'][name]['median'] * 1000
+        new_ms = new['results'][name]['median'] * 1000
+        ratio = new_ms / old_ms if old_ms else float('inf')
+        print(f"{name:55} {old_ms:10.2f} {new_ms:10.2f} {ratio:7.2f}")
+    for name in sorted(set(new['results']) - set(base['results'])):
+        print(f"{name:55} {'-':>10} {new['results'][name]['median'] * 1000:10.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="ymp offline benchmark suite")
+    parser.add_argument('--scale', choices=SCALES, default='quick')
+    parser.add_argument('--only', help=f"Comma separated suites to run ({', '.join(SUITES)})")
+    parser.add_argument('--output', metavar='FILE', help="Write results to FILE (JSON)")
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help="Compare two result files")
+    opts = parser.parse_args()
+
+    if opts.compare:
+        compare(*opts.compare)
+        return
+
+    suites = opts.only.split(',') if opts.only else SUITES
+    home = harness.isolate()
+    scale = SCALES[opts.scale]
+    results = {}
+    try:
+        for name in suites:
+            start = time.perf_counter()
+            module = importlib.import_module(f'bench_{name}')
+            suite_results = module.run(scale)
+            results.update(suite_results)
+            print(f"[{name}] {time.perf_counter() - start:.1f}s")
+            for bench, result in suite_results.items():
+                memory = f"  retained {result['retained_mb']:8.1f} MB" if 'retained_mb' in result else ""
+                print(f"  {bench:55} median {result['median'] * 1000:10.3f} ms  min {result['min'] * 1000:10.3f} ms{memory}")
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+
+    if opts.output:
+        harness.write_results(opts.output, results, scale=opts.scale, suites=list(suites))
+        print(f"Results written to {opts.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+Local stand-ins used by the offline benchmarks: an HTTP server for audio fixtures,
+a stubbed yt_dlp.YoutubeDL and a fake `ffplay` executable.
+"""
+import hashlib
+import os
+import stat
+import sys
+import threading
+import time
+import types
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+AUDIO_SIZE = 4 * 1024 * 1024
+
+class AudioHandler(BaseHTTPRequestHandler):
+    """Serves /audio/<id>.webm with a deterministic payload (supports Range requests)."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = self.server.payload
+        start, end = 0, len(body) - 1
+        rng = self.headers.get('Range')
+        if rng and rng.startswith('bytes='):
+            first, _, last = rng[len('bytes='):].partition('-')
+            start = int(first or 0)
+            end = min(int(last), end) if last else end
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(body)}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'audio/webm')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        view = memoryview(body)[start:end + 1]
+        try:
+            for offset in range(0, len(view), 64 * 1024):
+                self.send_block(view[offset:offset + 64 * 1024])
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def send_block(self, block):
+        self.wfile.write(block)
+
+    def log_message(self, *args):
+        pass
+
+class ThrottledAudioHandler(AudioHandler):
+    """Like AudioHandler, but every connection is limited to `server.rate` bytes/s (like YouTube)."""
+
+    def send_block(self, block):
+        start = time.perf_counter()
+        self.wfile.write(block)
+        delay = len(block) / self.server.rate - (time.perf_counter() - start)
+        if delay > 0:
+            time.sleep(delay)
+
+def start_audio_server(size=AUDIO_SIZE, handler=AudioHandler):
+    """Starts the audio server in a daemon thread. Returns (server, base_url)."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    server.payload = bytes(range(256)) * (size // 256)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+class StubYoutubeDL:
+    """
+    Stand-in for yt_dlp.YoutubeDL. Every query/URL resolves to a track on the local audio
+    server; download=True fetches it over HTTP and writes the final .mp3 like the
+    FFmpegExtractAudio postprocessor would.
+    """
+    base_url = None
+
+    def __init__(self, params=None):
+        self.params = params or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def extract_info(self, url, download=True, process=True):
+        if url.startswith('ytsearch1:'):
+            # Flat search result, like process=False on a real search
+            video_id = hashlib.sha1(url[len('ytsearch1:'):].encode()).hexdigest()[:11]
+            return {'_type': 'playlist', 'entries': iter([{'id': video_id, 'url': f'https://www.youtube.com/watch?v={video_id}'}])}
+        if 'watch?v=' in url:
+            video_id = url.split('watch?v=', 1)[1][:11]
+        else:
+            video_id = hashlib.sha1(url.encode()).hexdigest()[:11]
+        meta = {
+            'id': video_id,
+            'title': f'Track {video_id}',
+            'artist': 'Bench Artist',
+            'album': 'Bench Album',
+            'ext': 'webm',
+            'duration': 180,
+            'url': f'{self.base_url}/audio/{video_id}.webm',
+            'protocol': 'http',
+            'webpage_url': f'https://www.youtube.com/watch?v={video_id}',
+        }
+        if download:
+            return self.process_ie_result(meta, download=True)
+        return meta
+
+    def process_ie_result(self, meta, download=True):
+        """Fetches the audio (unless it was fetched already) and 'converts' it to the final .mp3."""
+        if download:
+            target = os.path.splitext(self.prepare_filename(meta))[0] + '.mp3'
+            if not os.path.exists(target):
+                source = self.prepare_filename(meta)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                if not os.path.exists(source):
+                    with urllib.request.urlopen(meta['url']) as response, open(source, 'wb') as f:
+                        while True:
+                            chunk = response.read(256 * 1024)
+                            if not chunk:
+                                break
+                            f.write(chunk)
+                os.replace(source, target)
+        return meta
+
+    def prepare_filename(self, meta):
+        return self.params['outtmpl'] % meta
+
+def install_stub_youtube_dl(base_url):
+    """Makes `from yt_dlp import YoutubeDL` return the stub (yt-dlp itself is never imported)."""
+    StubYoutubeDL.base_url = base_url
+    module = types.ModuleType('yt_dlp')
+    module.YoutubeDL = StubYoutubeDL
+    sys.modules['yt_dlp'] = module
+
+FAKE_FFPLAY = '''#!{python}
+# Fake ffplay: reads the first bytes of its input, reports "first audio" and exits.
+import os, sys, time, urllib.request
+source = sys.argv[-1]
+stream = urllib.request.urlopen(source) if source.startswith('http') else open(source, 'rb')
+stream.read(16384)
+marker = os.environ.get('YMP_BENCH_FIRST_AUDIO')
+if marker:
+    open(marker, 'w').close()
+time.sleep(float(os.environ.get('YMP_BENCH_PLAY_SECONDS', '0')))
+'''
+
+def install_fake_ffplay(bin_dir):
+    """Writes a fake `ffplay` into bin_dir and puts it first on PATH."""
+    os.makedirs(bin_dir, exist_ok=True)
+    path = os.path.join(bin_dir, 'ffplay')
+    with open(path, 'w') as f:
+        f.write(FAKE_FFPLAY.format(python=sys.executable))
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC | stat.S_IXGRP | stat.S_IXOTH)
+    os.environ['PATH'] = bin_dir + os.pathsep + os.environ.get('PATH', '')
+    return path
@@ -27,9 +27,7 @@ setuptools.setup(
         'requests',
         'pydub',
         'termcolor',
-        'beautifulsoup4',
         'colorama',
-        'lxml',
         'simpleaudio',
         'rich',
         'setuptools',
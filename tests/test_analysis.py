@@ -0,0 +1,91 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import ymp.analysis as analysis
+
+FFMPEG_OUTPUT = """Input #0, mp3, from 'song.mp3':
+  Duration: 00:03:20.00, start: 0.025057, bitrate: 320 kb/s
+[silencedetect @ 0x5581] silence_start: 0
+[silencedetect @ 0x5581] silence_end: 2.5 | silence_duration: 2.5
+[silencedetect @ 0x5581] silence_start: 95.2
+[silencedetect @ 0x5581] silence_end: 96.1 | silence_duration: 0.9
+[silencedetect @ 0x5581] silence_start: 196
+[silencedetect @ 0x5581] silence_end: 200 | silence_duration: 4
+[Parsed_ebur128_0 @ 0x5580] Summary:
+
+  Integrated loudness:
+    I:         -9.5 LUFS
+    Threshold: -19.8 LUFS
+
+  True peak:
+    Peak:        0.4 dBFS
+"""
+
+class TestAnalysis(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_parse_and_summarize(self):
+        report = analysis.parse_report(FFMPEG_OUTPUT)
+        self.assertEqual(report['loudness'], -9.5)
+        self.assertEqual(report['duration'], 200)
+        self.assertEqual(report['silences'], [(0, 2.5), (95.2, 96.1), (196, 200)])
+
+        result = analysis.summarize(report, target=-18)
+        # -8.5 dB to reach the target; a quiet song is limited by its peak instead
+        self.assertEqual(result['gain'], -8.5)
+        self.assertEqual((result['start'], result['end']), (2.4, 196.1)) # Silence in the middle stays
+        quiet = analysis.summarize(dict(report, loudness=-30.0, peak=-3.0, silences=[]), target=-18)
+        self.assertEqual(quiet['gain'], 2.0)
+        self.assertEqual((quiet['start'], quiet['end']), (0, None))
+
+    def test_trailing_silence_without_end(self):
+        report = analysis.parse_report(FFMPEG_OUTPUT.replace("[silencedetect @ 0x5581] silence_end: 200 | silence_duration: 4\n", ""))
+        self.assertEqual(analysis.summarize(report, target=-18)['end'], 196.1)
+
+    @patch('ymp.analysis._lower_priority')
+    @patch('ymp.analysis.subprocess.Popen')
+    def test_analyze(self, popen, lower_priority):
+        process = popen.return_value
+        process.communicate.return_value = (None, FFMPEG_OUTPUT.encode())
+        process.returncode = 0
+        with patch('ymp.config.get_target_loudness', return_value=-18.0):
+            result = analysis.analyze('song.mp3')
+        self.assertEqual(result['gain'], -8.5)
+        cmd = popen.call_args[0][0]
+        self.assertEqual(cmd[0], 'ffmpeg')
+        self.assertIn('song.mp3', cmd)
+
+        process.returncode = 1
+        self.assertIsNone(analysis.analyze('broken.mp3'))
+
+    def test_store(self):
+        song = os.path.join(self.tmpdir, 'song.mp3')
+        with open(song, 'wb') as f:
+            f.write(b'x' * 100)
+        store = analysis.AnalysisStore(os.path.join(self.tmpdir, 'analysis.json'))
+        store.put(song, {'gain': -3.0, 'start': 1.0, 'end': None})
+
+        store = analysis.AnalysisStore(store.path) # Reloaded from disk
+        self.assertEqual(store.get(song)['gain'], -3.0)
+        with patch('ymp.config.is_analysis_enabled', return_value=True), \
+             patch('ymp.config.is_normalize_enabled', return_value=True), \
+             patch('ymp.config.is_trim_silence_enabled', return_value=False):
+            self.assertEqual(analysis.playback_options(song, store), (-3.0, 0, None))
+
+        with open(song, 'ab') as f:
+            f.write(b'changed')
+        self.assertIsNone(store.get(song))
+        os.remove(song)
+        self.assertEqual(store.prune(), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import ymp.analysis as analysis
+import ymp.cacheindex as cacheindex
+import ymp.config as config
+import ymp.downloader as downloader
+
+def id3(text):
+    """A minimal ID3v2 header followed by `text` as the tag body."""
+    size = len(text)
+    return b'ID3\x04\x00\x00' + bytes([(size >> 21) & 0x7f, (size >> 14) & 0x7f, (size >> 7) & 0x7f, size & 0x7f]) + text
+
+class TestCacheIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.music_dir = os.path.join(self.tmpdir, 'music')
+        os.makedirs(os.path.join(self.music_dir, 'Artist', 'Album'))
+        self.index = cacheindex.CacheIndex(os.path.join(self.tmpdir, 'index.json'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, data):
+        path = os.path.join(self.music_dir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_video_id(self):
+        vid = 'dQw4w9WgXcQ'
+        for url in (f'https://www.youtube.com/watch?v={vid}&list=x', f'https://music.youtube.com/watch?v={vid}',
+                    f'https://youtu.be/{vid}?t=3', f'https://www.youtube.com/shorts/{vid}'):
+            self.assertEqual(cacheindex.video_id(url), vid, url)
+        self.assertIsNone(cacheindex.video_id('never gonna give you up song'))
+        self.assertIsNone(cacheindex.video_id('https://www.youtube.com/playlist?list=PL123'))
+
+    def test_audio_hash_ignores_tags(self):
+        a = self.write('a.mp3', id3(b'title=A') + b'\xff\xfb' * 500)
+        b = self.write('b.mp3', id3(b'title=B, with a thumbnail') + b'\xff\xfb' * 500 + b'TAG' + b'\0' * 125)
+        c = self.write('c.mp3', id3(b'title=A') + b'\xff\xfa' * 500)
+        self.assertEqual(cacheindex.audio_hash(a), cacheindex.audio_hash(b))
+        self.assertNotEqual(cacheindex.audio_hash(a), cacheindex.audio_hash(c))
+
+    def test_dedupe(self):
+        flat = self.write('Artist - Song.mp3', id3(b'cache mode') + b'\xff\xfb' * 500)
+        nested = self.write(os.path.join('Artist', 'Album', 'Song.mp3'), id3(b'permanent mode') + b'\xff\xfb' * 500)
+        variant = self.write('Artist - Song (Official Video).mp3', b'\xff\xfa' * 600)
+        other = self.write('Other.mp3', b'\xff\xf3' * 500)
+        self.index.add('dQw4w9WgXcQ', flat, {'title': 'Song'})
+        self.index.add('9bZkp7q19f0', variant, {'title': 'Song (Official Video)'}) # Another upload
+
+        store = analysis.AnalysisStore(os.path.join(self.tmpdir, 'analysis.json'))
+        with patch('ymp.analysis.STORE', store), patch('builtins.print'):
+            duplicates, saved = cacheindex.dedupe(self.music_dir, self.index)
+        self.assertEqual(duplicates, 1)
+        self.assertTrue(os.path.samefile(flat, nested))
+        self.assertFalse(os.path.samefile(flat, variant))
+        self.assertFalse(os.path.samefile(flat, other))
+        self.assertEqual(len(config._stored_songs(self.music_dir)), 3) # Hardlinks are one song
+
+        # A second pass finds nothing left to do
+        with patch('ymp.analysis.STORE', store), patch('builtins.print'):
+            self.assertEqual(cacheindex.dedupe(self.music_dir, self.index), (0, 0))
+
+    def test_move_keeps_alias(self):
+        kept = self.write('kept.mp3', b'x')
+        removed = os.path.join(self.music_dir, 'removed.mp3')
+        self.index.add('dQw4w9WgXcQ', removed, {'title': 'Song'})
+        self.assertTrue(self.index.move(removed, kept))
+        self.assertEqual(self.index.locate(path=removed), os.path.abspath(kept))
+        self.assertEqual(self.index.locate('dQw4w9WgXcQ'), os.path.abspath(kept))
+
+    def test_download_hit_by_video_id(self):
+        song = self.write('Artist - Song.mp3', b'x')
+        self.index.add('dQw4w9WgXcQ', song, {'id': 'dQw4w9WgXcQ', 'title': 'Song', 'formats': ['large']})
+        ytdl = MagicMock()
+        with patch('ymp.config.is_smart_download_enabled', return_value=True), \
+             patch('ymp.config.get_music_dir', return_value=self.music_dir), \
+             patch('ymp.config.manage_storage'), \
+             patch('ymp.config.is_permanent_mode', return_value=True), \
+             patch('ymp.cacheindex.INDEX', self.index), \
+             patch('ymp.analysis.schedule'), \
+             patch('ymp.downloader._youtube_dl', return_value=ytdl):
+            meta, path = downloader.download('https://youtu.be/dQw4w9WgXcQ')
+        self.assertEqual(path, os.path.abspath(song))
+        self.assertEqual(meta, {'id': 'dQw4w9WgXcQ', 'title': 'Song'})
+        ytdl.__enter__.return_value.extract_info.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
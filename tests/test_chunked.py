@@ -0,0 +1,120 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import ymp.chunked as chunked
+
+PAYLOAD = bytes(range(256)) * 4096 # 1 MiB
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves PAYLOAD with Range support (/norange: without), counting concurrent connections."""
+    protocol_version = 'HTTP/1.1'
+    active = 0
+    peak = 0
+    drop_once = False
+    lock = threading.Lock()
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.active += 1
+            cls.peak = max(cls.peak, cls.active)
+        try:
+            start, end = 0, len(PAYLOAD) - 1
+            rng = self.headers.get('Range')
+            if rng and self.path != '/norange':
+                first, _, last = rng[len('bytes='):].partition('-')
+                start, end = int(first), min(int(last), end)
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {start}-{end}/{len(PAYLOAD)}')
+            else:
+                self.send_response(200)
+            self.send_header('Content-Length', str(end - start + 1))
+            self.end_headers()
+            body = PAYLOAD[start:end + 1]
+            with cls.lock:
+                drop = cls.drop_once and len(body) > 1000 # Not the size probe
+                if drop:
+                    cls.drop_once = False
+            if drop:
+                # Cut the chunk short: the client has to resume it
+                self.wfile.write(body[:1000])
+                self.close_connection = True
+                return
+            time.sleep(0.02) # Keep connections open long enough to overlap
+            self.wfile.write(body)
+        finally:
+            with cls.lock:
+                cls.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+class TestChunkedDownload(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+        cls.server.daemon_threads = True
+        cls.base = f'http://127.0.0.1:{cls.server.server_port}'
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.dest = os.path.join(self.tmpdir, 'song.webm')
+        RangeHandler.peak = 0
+        chunked._host_slots.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_parallel_chunks_and_combined_progress(self):
+        progress = []
+        download = chunked.ChunkedDownload(self.base + '/song', self.dest, connections=4,
+                                           chunk_size=64 * 1024, hooks=[progress.append])
+        with patch('ymp.config.get_max_connections_per_host', return_value=3):
+            self.assertTrue(download.run())
+        with open(self.dest, 'rb') as f:
+            self.assertEqual(f.read(), PAYLOAD)
+        self.assertFalse(os.path.exists(self.dest + '.ymp-part'))
+
+        self.assertLessEqual(RangeHandler.peak, 3) # The per-host cap wins over 4 connections
+        self.assertGreater(RangeHandler.peak, 1)
+        done = [p['downloaded_bytes'] for p in progress]
+        self.assertEqual(done, sorted(done))
+        self.assertEqual(progress[-1]['status'], 'finished')
+        self.assertEqual(progress[-1]['downloaded_bytes'], len(PAYLOAD))
+        self.assertEqual(progress[-1]['total_bytes'], len(PAYLOAD))
+
+    def test_broken_chunk_is_resumed(self):
+        RangeHandler.drop_once = True
+        download = chunked.ChunkedDownload(self.base + '/song', self.dest, connections=2, chunk_size=256 * 1024)
+        with patch('ymp.config.get_max_connections_per_host', return_value=8):
+            self.assertTrue(download.run())
+        with open(self.dest, 'rb') as f:
+            self.assertEqual(f.read(), PAYLOAD)
+        self.assertEqual(download.downloaded, len(PAYLOAD))
+
+    def test_left_to_yt_dlp(self):
+        with patch('ymp.config.get_max_connections_per_host', return_value=8):
+            download = chunked.ChunkedDownload(self.base + '/norange', self.dest)
+            self.assertFalse(download.run())
+        self.assertFalse(chunked.can_fetch({'protocol': 'm3u8_native', 'url': 'https://example.com/x.m3u8'}))
+        self.assertTrue(chunked.can_fetch({'protocol': 'https', 'url': 'https://example.com/audio'}))
+        with patch('ymp.config.get_download_connections', return_value=1):
+            self.assertFalse(chunked.fetch({'protocol': 'https', 'url': self.base + '/song'}, self.dest))
+        self.assertFalse(os.path.exists(self.dest))
+
+if __name__ == '__main__':
+    unittest.main()
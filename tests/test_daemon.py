@@ -0,0 +1,120 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ymp import ctl, radio
+from ymp.daemon import Daemon
+from ymp.playlistmanager import Playlist
+
+@unittest.skipUnless(hasattr(__import__('socket'), 'AF_UNIX'), "Unix sockets only")
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'ymp.sock')
+        # Only the control server runs, the player loop is not started
+        self.daemon = Daemon(Playlist(), self.tmpdir, path=self.path)
+        self.daemon.server.start()
+        self.client = ctl.Client(self.path)
+
+    def tearDown(self):
+        self.client.close()
+        self.daemon.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def test_enqueue_and_queue(self):
+        reply = self.client.request('enqueue', items=['first', 'https://youtu.be/x'])
+        self.assertEqual(reply['queued'], 2)
+        self.client.request('enqueue', items=['urgent'], front=True)
+        queue = self.client.request('queue')['queue']
+        self.assertEqual([entry['url'] for entry in queue], ['urgent song', 'first song', 'https://youtu.be/x'])
+        self.assertEqual(queue[0], {'url': 'urgent song', 'source': 'search', 'state': 'unresolved'})
+
+        self.client.request('jump', index=2)
+        status = self.client.request('status', since=0, queue=True)
+        self.assertEqual(status['queue'][0]['url'], 'https://youtu.be/x')
+        self.assertEqual(status['queue_length'], 3)
+        self.assertIsNone(status['title'])
+
+    def test_errors(self):
+        with self.assertRaises(ctl.DaemonError):
+            self.client.request('pause') # Nothing is playing
+        with self.assertRaises(ctl.DaemonError):
+            self.client.request('no_such_command')
+        with self.assertRaises(ctl.DaemonError):
+            self.client.request('seek') # Missing argument
+        # The connection survives errors
+        self.assertEqual(self.client.request('ping')['pid'], os.getpid())
+
+    def test_log_since(self):
+        self.daemon.log_message("one")
+        seq = self.client.request('status')['log_seq']
+        self.daemon.log_message("two")
+        status = self.client.request('status', since=seq)
+        self.assertEqual(status['log'], ["two"])
+
+    def test_is_running(self):
+        self.assertTrue(ctl.is_running(self.path))
+        self.assertFalse(ctl.is_running(os.path.join(self.tmpdir, 'missing.sock')))
+
+    def test_expand_in_front_streams_in_order(self):
+        self.client.request('enqueue', items=['https://youtu.be/x'])
+
+        def entries(url):
+            for i in range(60):
+                yield f'https://radio.example.com/{i:02d}.mp3'
+                if i == 0:
+                    # The first song plays while the playlist is read
+                    self.daemon.playlist.returnsong()
+            raise ValueError("Bad playlist line")
+        with patch('ymp.playlists.iter_queue_entries', side_effect=entries):
+            self.daemon._expand('radio.m3u', front=True)
+
+        queue = [track.url for track in self.daemon.playlist.queuedplaylist]
+        self.assertEqual(queue, [f'https://radio.example.com/{i:02d}.mp3' for i in range(1, 51)] + ['https://youtu.be/x'])
+        self.assertEqual(self.client.request('status', since=0)['log'][-2:],
+                         ["Error reading playlist radio.m3u: Bad playlist line", "Expanded playlist: 51 songs added."])
+
+    def drop_station(self, during_connect):
+        """Runs one player loop tick on a dropped station; `during_connect` runs while the next mirror connects."""
+        station = radio.Station({'title': 'Radio X', 'url': 'http://a', 'mirrors': ['http://a', 'http://b']})
+        playlist = self.daemon.playlist
+        playlist.station, playlist.meta, playlist.songpaused = station, station.meta(), False
+        playlist.playobj = dropped = MagicMock(is_playing=MagicMock(return_value=False))
+        relay = MagicMock()
+
+        def connect_stream(url):
+            during_connect()
+            return relay
+        with patch.object(playlist, 'connect_stream', side_effect=connect_stream), \
+             patch('ymp.player.genmusic', return_value=(MagicMock(), 0)) as genmusic, \
+             patch.object(self.daemon.stopped, 'wait', side_effect=[False, True]):
+            self.daemon.player_loop()
+        return station, dropped, relay, genmusic
+
+    def test_station_failover_outside_lock(self):
+        commands = []
+        # A control command gets through while the next mirror connects
+        station, dropped, relay, genmusic = self.drop_station(lambda: commands.append(self.client.request('queue')))
+
+        self.assertEqual(len(commands), 1)
+        self.assertEqual(self.daemon.playlist.filepath, 'http://b')
+        self.assertIs(self.daemon.playlist.station, station)
+        self.assertIs(genmusic.call_args[0][4], relay)
+        self.assertIs(self.daemon.playlist.playobj, genmusic.return_value[0])
+
+    def test_skip_during_failover(self):
+        station, dropped, relay, genmusic = self.drop_station(lambda: self.client.request('next'))
+
+        # The station is not restarted over the skip, the loop moves on to the next song
+        genmusic.assert_not_called()
+        relay.close.assert_called_once()
+        self.assertIsNone(self.daemon.playlist.station)
+        self.assertIs(self.daemon.playlist.playobj, dropped)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import ymp.library as library
+
+def frame(frame_id, body, major=3):
+    size = len(body)
+    if major == 4:
+        size = ((size >> 21) & 0x7F) << 24 | ((size >> 14) & 0x7F) << 16 | ((size >> 7) & 0x7F) << 8 | (size & 0x7F)
+    return frame_id.encode() + struct.pack('>I', size) + b'\0\0' + body
+
+def text(value, encoding=3):
+    if encoding == 1:
+        return b'\1' + value.encode('utf-16') + b'\0\0'
+    return bytes([encoding]) + value.encode('utf-8') + b'\0'
+
+def mp3(path, frames=b'', major=3, frames_count=None, audio=4000):
+    """An MPEG-1 layer III file (128 kbit/s, 44.1 kHz, stereo) with an ID3v2 tag and optional Xing header."""
+    tag = frames + b'\0' * 16 # Padding
+    size = len(tag)
+    header = b'ID3' + bytes([major, 0, 0]) + bytes([(size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F])
+    first = b'\xff\xfb\x90\x00' + b'\0' * 32
+    if frames_count is not None:
+        first += b'Info' + struct.pack('>II', 1, frames_count)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(header + tag + first + b'\0' * (audio - len(first)))
+
+class TestLibrary(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.music = os.path.join(self.tmpdir, 'music')
+        self.library = library.Library(os.path.join(self.tmpdir, 'library.json'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_read_tags(self):
+        path = os.path.join(self.music, 'a.mp3')
+        mp3(path, frame('TIT2', text('Get Lucky')) + frame('TPE1', text('Daft Punk', encoding=1))
+            + frame('TALB', text('Random Access Memories'))
+            + frame('TXXX', text('purl') + 'https://www.youtube.com/watch?v=5NV6Rdv1a3I'.encode()),
+            frames_count=1000)
+        self.assertEqual(library.read_tags(path), {
+            'title': 'Get Lucky', 'artist': 'Daft Punk', 'album': 'Random Access Memories',
+            'duration': round(1000 * 1152 / 44100, 3), 'id': '5NV6Rdv1a3I'})
+
+        # ID3v2.4 with the URL as comment, and a CBR file without a Xing header
+        path = os.path.join(self.music, 'b.mp3')
+        mp3(path, frame('TIT2', text('One More Time'), major=4)
+            + frame('COMM', b'\3eng\0' + b'https://youtu.be/FGBhQbmPwH8', major=4), major=4, audio=16000)
+        tags = library.read_tags(path)
+        self.assertEqual(tags['id'], 'FGBhQbmPwH8')
+        self.assertAlmostEqual(tags['duration'], 16000 * 8 / 128000)
+
+    def test_incremental_refresh(self):
+        for i in range(3):
+            mp3(os.path.join(self.music, 'Artist', f'{i}.mp3'), frame('TIT2', text(f'Song {i}')))
+        self.assertEqual(self.library.refresh(self.music), (3, 0))
+
+        with patch('ymp.library.read_tags', wraps=library.read_tags) as read_tags:
+            self.assertEqual(library.Library(self.library.path).refresh(self.music), (0, 0))
+            read_tags.assert_not_called() # Nothing changed: no file is opened
+
+            mp3(os.path.join(self.music, 'Artist', '1.mp3'), frame('TIT2', text('Renamed')), audio=5000)
+            os.remove(os.path.join(self.music, 'Artist', '2.mp3'))
+            self.assertEqual(self.library.refresh(self.music), (1, 1))
+            read_tags.assert_called_once()
+
+        titles = [entry['title'] for entry in self.library.songs_in(os.path.join(self.music, 'Artist'))]
+        self.assertEqual(titles, ['Song 0', 'Renamed'])
+        self.assertEqual([e['title'] for e in self.library.search('artist renamed')], ['Renamed'])
+        self.assertEqual(self.library.search('nothing'), [])
+
+    def test_lookup_by_video_id(self):
+        path = os.path.join(self.music, 'a.mp3')
+        mp3(path, frame('TXXX', text('purl') + b'https://www.youtube.com/watch?v=5NV6Rdv1a3I'))
+        self.library.refresh(self.music)
+        found, meta = self.library.lookup('5NV6Rdv1a3I')
+        self.assertEqual(found, os.path.abspath(path))
+        self.assertEqual(meta['webpage_url'], 'https://www.youtube.com/watch?v=5NV6Rdv1a3I')
+        self.assertIsNone(self.library.lookup('xxxxxxxxxxx'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import sys
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ymp.lock import LockFile
+
+HOLDER = """
+import sys
+sys.path.insert(0, {root!r})
+from ymp.lock import LockFile
+lock = LockFile({path!r})
+print(lock.acquire(), flush=True)
+sys.stdin.read()
+"""
+
+@unittest.skipIf(sys.platform == 'win32', "POSIX process checks")
+class TestLockFile(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'ymp.lock')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_held_by_other_process(self):
+        root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+        holder = subprocess.Popen([sys.executable, '-c', HOLDER.format(root=root, path=self.path)],
+                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        try:
+            self.assertEqual(holder.stdout.readline().strip(), 'True')
+            lock = LockFile(self.path)
+            self.assertFalse(lock.acquire())
+            # A failed attempt must not wipe the holder's PID
+            self.assertEqual(lock.holder(), holder.pid)
+        finally:
+            holder.stdin.close()
+            holder.wait()
+
+    def test_held_lock_with_unknown_pid(self):
+        root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+        holder = subprocess.Popen([sys.executable, '-c', HOLDER.format(root=root, path=self.path)],
+                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        try:
+            self.assertEqual(holder.stdout.readline().strip(), 'True')
+            dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+            dead.wait()
+            # What a holder in another PID namespace looks like: its PID is not running here
+            with open(self.path, 'r+') as f:
+                f.write(str(dead.pid))
+                f.truncate()
+            lock = LockFile(self.path)
+            self.assertIsNone(lock.holder())
+            self.assertFalse(lock.acquire())
+            self.assertTrue(os.path.exists(self.path))
+        finally:
+            holder.stdin.close()
+            holder.wait()
+
+    def test_stale_pid(self):
+        dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+        dead.wait()
+        with open(self.path, 'w') as f:
+            f.write(str(dead.pid))
+        lock = LockFile(self.path)
+        self.assertIsNone(lock.holder())
+        self.assertTrue(lock.acquire())
+        self.assertEqual(lock.read_pid(), os.getpid())
+        lock.release()
+        self.assertFalse(os.path.exists(self.path))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import ymp.logbook as logbook
+
+class TestLogBook(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_bounded_and_batched(self):
+        log = logbook.LogBook(lines=10)
+        threads = [threading.Thread(target=lambda: [log.add(f"line {i}") for i in range(100)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(log.seq, 400)
+        self.assertEqual(len(log.records), 10)
+        self.assertEqual(len(log.drain()), 10) # Only what still fits the view
+        self.assertEqual(log.drain(), [])
+
+    def test_levels_and_since(self):
+        log = logbook.LogBook()
+        log.add("Fetching info", 'debug')
+        log.add("Playing: Song")
+        seq = log.seq
+        log.add("Download failed", 'error')
+        self.assertEqual(log.drain(), ["Playing: Song", "Download failed"])
+        self.assertEqual(log.since(0, 'debug'), ["Fetching info", "Playing: Song", "Download failed"])
+        self.assertEqual(log.since(seq), ["Download failed"])
+        self.assertEqual(log.since(0, 'warning'), ["Download failed"])
+
+    def test_json_lines_file_rotates(self):
+        path = os.path.join(self.tmpdir, 'logs', 'ymp.jsonl')
+        log = logbook.LogBook(path=path, file_level='info', max_bytes=2000, backups=2)
+        log.add("hidden", 'debug')
+        for i in range(100):
+            log.add(f"line {i}", 'warning')
+        log.close()
+
+        with open(path, encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(records[-1]['message'], "line 99")
+        self.assertEqual(records[-1]['level'], 'warning')
+        self.assertEqual(records[-1]['seq'], 101)
+        self.assertTrue(os.path.exists(path + '.2'))
+        self.assertFalse(os.path.exists(path + '.3'))
+        self.assertLessEqual(os.path.getsize(path), 2000)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from urllib import request
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import ymp.metrics as metrics
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_histogram_buckets(self):
+        hist = metrics.Histogram('test_seconds', 'Test.', buckets=(0.1, 1))
+        metrics.REGISTRY.remove(hist)
+        for value in (0.05, 0.5, 0.5, 5):
+            hist.observe(value)
+        samples = {(name, labels.get('le')): value for name, labels, value in hist.samples()}
+        self.assertEqual(samples[('test_seconds_bucket', '0.1')], 1)
+        self.assertEqual(samples[('test_seconds_bucket', '1.0')], 3)
+        self.assertEqual(samples[('test_seconds_bucket', '+Inf')], 4)
+        self.assertEqual(samples[('test_seconds_count', None)], 4)
+        self.assertAlmostEqual(samples[('test_seconds_sum', None)], 6.05)
+
+    def test_textfile_report(self):
+        before = metrics.parse(metrics.exposition())
+        metrics.cache_lookup('preload', hit=True)
+        metrics.cache_lookup('preload', hit=False)
+        metrics.DOWNLOADED_BYTES.inc(3 * 1024 * 1024)
+        metrics.EXTRACT_SECONDS.observe(0.5)
+
+        path = os.path.join(self.tmpdir, 'metrics.prom')
+        metrics.write_textfile(path)
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+        self.assertIn('# TYPE ymp_extract_seconds histogram', text)
+        samples = metrics.parse(text)
+
+        key = ('ymp_cache_lookups_total', frozenset({'path': 'preload', 'result': 'hit'}.items()))
+        self.assertEqual(samples[key] - before.get(key, 0), 1)
+        lines = metrics.report(samples)
+        self.assertTrue(any(line.startswith('  preload: ') for line in lines))
+        self.assertTrue(any(line.startswith('Extract latency: avg') for line in lines))
+
+    def test_http_endpoint(self):
+        server = metrics.serve(0)
+        try:
+            port = server.server_address[1]
+            with request.urlopen(f'http://127.0.0.1:{port}/metrics', timeout=5) as response:
+                body = response.read().decode('utf-8')
+            self.assertIn('ymp_cache_lookups_total', body)
+        finally:
+            server.shutdown()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+import unittest
+from unittest.mock import MagicMock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import ymp.mpris as mpris
+import ymp.tracks as tracks
+from ymp.playlistmanager import Playlist
+
+class FakeApp:
+    """Runs marshalled commands right away and records them."""
+
+    def __init__(self):
+        self.playlist = Playlist()
+        self.playlist.enable_rich_ui = False
+        self.calls = []
+        self.seek_by = MagicMock()
+        self.jump_to = MagicMock()
+        self.set_paused = MagicMock()
+
+    def call_from_thread(self, callback, *args):
+        self.calls.append(callback)
+        return callback(*args)
+
+class TestMprisAdapter(unittest.TestCase):
+    def setUp(self):
+        self.app = FakeApp()
+        self.playlist = self.app.playlist
+        self.playlist.playedplaylist = [tracks.of('first song'), tracks.of({'id': 'dQw4w9WgXcQ', 'title': 'Current', 'duration': 200})]
+        self.playlist.queuedplaylist = [tracks.of({'title': f'Song {i}', 'duration': 60}) for i in range(20000)]
+        self.adapter = mpris.YmpMprisAdapter(self.app)
+
+    def test_tracklist_is_a_window(self):
+        tracks = self.adapter.Tracks()
+        self.assertEqual(len(tracks), 1 + mpris.TRACKLIST_WINDOW)
+        self.assertEqual(tracks[0], self.adapter.current_track())
+        self.assertEqual(tracks[0], '/ymp/track/1')
+
+        # Metadata only for the requested IDs; stale ones are skipped
+        metadata = self.adapter.GetTracksMetadata(['/ymp/track/2', '/ymp/track/20001', '/ymp/track/99999', 'bogus'])
+        self.assertEqual([m['xesam:title'] for m in metadata], ['Song 0', 'Song 19999'])
+        self.assertEqual(metadata[0]['mpris:length'], 60000000)
+
+        # Track IDs stay valid while the queue advances
+        self.playlist.returnsong()
+        self.assertEqual(self.adapter.current_track(), '/ymp/track/2')
+        self.assertEqual(self.adapter.GetTracksMetadata(['/ymp/track/3'])[0]['xesam:title'], 'Song 1')
+
+    def test_position_from_player_clock(self):
+        self.assertEqual(self.adapter.Position(), 0) # Nothing playing
+        self.playlist.playobj = object()
+        self.playlist.starttime = time.time() - 2
+        self.playlist.resumetime = 10000
+        self.assertAlmostEqual(self.adapter.Position() / 1000000, 12, delta=0.1)
+
+    def test_commands_run_on_the_app_thread(self):
+        self.playlist.playobj = object()
+        self.playlist.starttime = time.time()
+        self.playlist.resumetime = 30000
+
+        self.adapter.Seek(-5000000)
+        self.app.seek_by.assert_called_once_with(-5)
+        self.adapter.SetPosition('/ymp/track/1', 90000000)
+        self.assertAlmostEqual(self.app.seek_by.call_args[0][0], 60, delta=0.1)
+        self.adapter.SetPosition('/ymp/track/0', 0) # Not the current track: ignored
+        self.assertEqual(self.app.seek_by.call_count, 2)
+
+        self.adapter.GoTo('/ymp/track/5')
+        self.app.jump_to.assert_called_once_with(3)
+        self.adapter.Pause()
+        self.app.set_paused.assert_called_once_with(True)
+        self.assertEqual(len(self.app.calls), 5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import ymp.cacheindex as cacheindex
+import ymp.library as library
+import ymp.offline as offline
+import ymp.tracks as tracks
+from ymp.daemon import Daemon
+from ymp.playlistmanager import Playlist
+
+class TestConnectivity(unittest.TestCase):
+    @patch('ymp.config.get_offline_mode', return_value='auto')
+    def test_changes_are_reported(self, mode):
+        connectivity = offline.Connectivity()
+        connectivity._thread = True # No watcher thread, probes only when asked
+        changes = []
+        connectivity.listeners.append(changes.append)
+        with patch.object(connectivity, 'probe', return_value=True):
+            self.assertTrue(connectivity.check())
+        with patch.object(connectivity, 'probe', return_value=False):
+            self.assertFalse(connectivity.note_failure())
+            self.assertFalse(connectivity.is_online())
+        with patch.object(connectivity, 'probe', return_value=True):
+            connectivity.check()
+        self.assertEqual(changes, [False, True]) # Not the first probe
+
+        mode.return_value = 'on'
+        self.assertFalse(connectivity.is_online())
+        mode.return_value = 'off'
+        with patch.object(connectivity, 'probe', return_value=False):
+            self.assertTrue(connectivity.note_failure()) # Never probed
+
+class TestLocalCopy(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.song = os.path.join(self.tmpdir, 'Daft Punk - Get Lucky.mp3')
+        with open(self.song, 'wb') as f:
+            f.write(b'mp3')
+        self.index = cacheindex.CacheIndex(os.path.join(self.tmpdir, 'index.json'))
+        self.index.add('5NV6Rdv1a3I', self.song, {'id': '5NV6Rdv1a3I', 'title': 'Get Lucky', 'artist': 'Daft Punk'})
+        self.library = library.Library(os.path.join(self.tmpdir, 'library.json'))
+        patches = [patch('ymp.cacheindex.INDEX', self.index), patch('ymp.library.LIBRARY', self.library),
+                   patch('ymp.offline.is_online', return_value=False),
+                   patch('ymp.config.get_offline_queue', return_value='defer')]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_resolved_without_network(self):
+        path = os.path.abspath(self.song)
+        self.assertEqual(offline.local_copy('https://youtu.be/5NV6Rdv1a3I')[0], path)
+        self.assertEqual(offline.local_copy({'id': '5NV6Rdv1a3I', 'url': 'x'})[0], path)
+        self.assertEqual(offline.local_copy('daft punk get lucky song')[0], path)
+        self.assertEqual(offline.local_copy({'title': 'Get Lucky'})[0], path)
+        self.assertIsNone(offline.local_copy('one more time song'))
+        self.assertIsNone(offline.local_copy('https://youtu.be/FGBhQbmPwH8'))
+
+    def test_daemon_defers_and_requeues(self):
+        daemon = Daemon(Playlist(), self.tmpdir, path=os.path.join(self.tmpdir, 'ymp.sock'))
+        daemon.playlist.queuedplaylist = [tracks.of(song) for song in
+                                          ('one more time song', 'https://youtu.be/5NV6Rdv1a3I', 'last song')]
+        with patch('ymp.downloader.extract_stream_info') as extract, \
+                patch.object(daemon.playlist, 'playsong') as playsong:
+            daemon.start_next_song()
+            self.assertEqual([track.url for track in daemon.playlist.deferred], ['one more time song'])
+            self.assertEqual(daemon.playlist.playedplaylist, [])
+            daemon.start_next_song()
+            playsong.assert_called_once()
+            self.assertEqual(daemon.playlist.filepath, os.path.abspath(self.song))
+            extract.assert_not_called()
+
+        daemon.connectivity_changed(True)
+        self.assertEqual([track.url for track in daemon.playlist.queuedplaylist], ['one more time song', 'last song'])
+        self.assertEqual(daemon.playlist.deferred, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -54,5 +54,21 @@ class TestPlayer(unittest.TestCase):
         self.assertIn('-ss', cmd)
         self.assertIn('5.0', cmd)
 
+    @patch('ymp.player.AUDIO_AVAILABLE', True)
+    @patch('subprocess.Popen')
+    def test_ffplay_gain_and_end(self, mock_popen):
+        """Test gain and early end from the loudness/silence analysis."""
+        player.genmusic("song.mp3", 2000, gain_db=-4.5, end_ms=180000)
+
+        cmd = mock_popen.call_args[0][0]
+        self.assertEqual(cmd[cmd.index('-t') + 1], '178.0')
+        self.assertEqual(cmd[cmd.index('-af') + 1], 'volume=-4.5dB')
+
+        # A seek past the trimmed silence ends the song instead of playing the silence
+        mock_popen.reset_mock()
+        playobj, _ = player.genmusic("song.mp3", 181000, gain_db=-4.5, end_ms=180000)
+        mock_popen.assert_not_called()
+        self.assertFalse(playobj.is_playing())
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,85 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import ymp.playlists as playlists
+
+def split(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+class TestPlaylists(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, data):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_m3u_extinf_and_relative_paths(self):
+        path = self.write('mix.m3u', b"#EXTM3U\r\n#EXTINF:215,Artist - Song\r\nmusic/song.mp3\r\n\r\nhttp://example.com/b.mp3\r\n")
+        entries = list(playlists.iter_entries(path))
+        self.assertEqual(entries, [
+            {'url': os.path.join(self.tmpdir, 'music', 'song.mp3'), 'title': 'Artist - Song', 'length': 215},
+            {'url': 'http://example.com/b.mp3', 'title': None, 'length': -1},
+        ])
+
+    def test_remote_m3u_resolves_against_playlist_url(self):
+        chunks = [b"#EXTM3U\n#EXTINF:-1 tvg-id=\"x\",Radio\nstream.aac\n"]
+        entry, = playlists.iter_entries('http://example.com/lists/radio.m3u', chunks)
+        self.assertEqual(entry, {'url': 'http://example.com/lists/stream.aac', 'title': 'Radio', 'length': -1})
+
+    def test_hls_is_one_stream(self):
+        source = 'http://example.com/live/index.m3u8'
+        chunks = [b"#EXTM3U\n#EXT-X-VERSION:3\n#EXT-X-TARGETDURATION:6\n#EXTINF:6.0,\nseg1.ts\n#EXTINF:6.0,\nseg2.ts\n"]
+        self.assertEqual(list(playlists.iter_entries(source, chunks)), [{'url': source, 'title': None, 'length': -1, 'hls': True}])
+
+    def test_xspf(self):
+        data = (b'<?xml version="1.0" encoding="UTF-8"?>\n'
+                b'<playlist version="1" xmlns="http://xspf.org/ns/0/"><trackList>'
+                b'<track><location>file:///music/a%20b.ogg</location><title>Song</title>'
+                b'<creator>Artist</creator><duration>201000</duration></track>'
+                b'<track><title>No location</title></track>'
+                b'</trackList></playlist>')
+        entries = list(playlists.iter_entries('list.xspf', split(data, 7)))
+        self.assertEqual(entries, [{'url': '/music/a b.ogg', 'title': 'Artist - Song', 'length': 201}])
+
+    def test_format_from_content(self):
+        path = self.write('download', b"\xef\xbb\xbf[playlist]\nFile1=http://a/1\nNumberOfEntries=1\n")
+        self.assertTrue(playlists.is_playlist(path))
+        self.assertEqual(playlists.open_playlist(path)[0], 'pls')
+        self.assertFalse(playlists.is_playlist(self.write('notes.txt', b"just text\n")))
+        self.assertTrue(playlists.is_playlist('http://example.com/x.M3U8?token=1'))
+
+    def test_chunk_boundaries(self):
+        data = "#EXTM3U\n#EXTINF:10,Café Ünïcode\r\nsong.mp3\n".encode('utf-8')
+        expected = list(playlists.iter_entries('a.m3u', [data]))
+        for size in range(1, 12):
+            self.assertEqual(list(playlists.iter_entries('a.m3u', split(data, size))), expected, size)
+        self.assertEqual(expected[0]['title'], 'Café Ünïcode')
+
+    def test_queue_entries(self):
+        station = b"[playlist]\nFile1=http://a/live\nTitle1=Radio X\nFile2=http://b/live\nNumberOfEntries=2\n"
+        entry, = playlists.iter_queue_entries('radio.pls', [station])
+        self.assertEqual(entry['_type'], 'station')
+        self.assertEqual(entry['mirrors'], ['http://a/live', 'http://b/live'])
+
+        song = self.write('song.mp3', b'')
+        path = self.write('list.m3u', b"song.mp3\n")
+        entry, = playlists.iter_queue_entries(path)
+        self.assertEqual(entry, {'url': song, 'title': 'song', 'duration': None})
+        self.assertEqual(playlists.local_meta(entry), {'title': 'song', 'duration': 0, 'webpage_url': None})
+        self.assertIsNone(playlists.local_meta({'url': 'http://a/1.mp3'}))
+
+    def test_batches(self):
+        self.assertEqual(list(playlists.batches(range(6), 2)), [[0], [1, 2], [3, 4], [5]])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,7 +4,7 @@ import unittest
 from unittest.mock import MagicMock, patch
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from ymp.downloader import parse_pls
+from ymp.downloader import parse_pls, parse_pls_entries
 
 class TestPLSParser(unittest.TestCase):
     def test_parse_local_pls(self):
@@ -27,14 +27,59 @@ Title2=Song 2
             if os.path.exists("test.pls"):
                 os.remove("test.pls")
 
+    def test_parse_titles_and_lengths(self):
+        content = """[playlist]
+NumberOfEntries=2
+File2=http://mirror2.example.com/live
+Title2=Radio X (mirror)
+Length2=-1
+File1=http://mirror1.example.com/live
+Title1=Radio X
+"""
+        with open("test.pls", "w") as f:
+            f.write(content)
+
+        try:
+            entries = parse_pls_entries("test.pls")
+            self.assertEqual(entries, [
+                {'url': 'http://mirror1.example.com/live', 'title': 'Radio X', 'length': -1},
+                {'url': 'http://mirror2.example.com/live', 'title': 'Radio X (mirror)', 'length': -1},
+            ])
+        finally:
+            if os.path.exists("test.pls"):
+                os.remove("test.pls")
+
+    def test_parse_keys_grouped_by_type(self):
+        content = """[playlist]
+File1=/music/one.mp3
+File2=/music/two.mp3
+Title1=One
+Title2=Two
+Length1=215
+Length2=187
+NumberOfEntries=2
+"""
+        with open("test.pls", "w") as f:
+            f.write(content)
+
+        try:
+            entries = parse_pls_entries("test.pls")
+            self.assertEqual(entries, [
+                {'url': '/music/one.mp3', 'title': 'One', 'length': 215},
+                {'url': '/music/two.mp3', 'title': 'Two', 'length': 187},
+            ])
+        finally:
+            if os.path.exists("test.pls"):
+                os.remove("test.pls")
+
     @patch('ymp.downloader.get')
     def test_parse_remote_pls(self, mock_get):
         # Mock requests.get
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.text = """[playlist]
+        mock_response.iter_content.return_value = [b"""[playlist]
 File1=http://remote.com/stream
-"""
+"""]
         mock_get.return_value = mock_response
 
         urls = parse_pls("http://example.com/radio.pls")
@@ -0,0 +1,102 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import ymp.cacheindex as cacheindex
+import ymp.downloader as downloader
+import ymp.quality as quality
+
+class FakeYoutubeDL:
+    """Writes the converted .mp3 like yt-dlp and its FFmpegExtractAudio postprocessor would."""
+
+    def __init__(self, options):
+        self.params = options
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def extract_info(self, link, download=True, process=True):
+        return {'id': 'dQw4w9WgXcQ', 'ext': 'webm', 'protocol': 'https', 'url': 'https://example.com/audio'}
+
+    def prepare_filename(self, meta):
+        return self.params['outtmpl'] % meta
+
+    def process_ie_result(self, meta, download=True):
+        with open(os.path.splitext(self.prepare_filename(meta))[0] + '.mp3', 'wb') as f:
+            f.write(b'best' * 1000)
+        return meta
+
+class TestQuality(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.estimate = quality.ThroughputEstimate(os.path.join(self.tmpdir, 'bandwidth.json'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_estimate(self):
+        self.assertIsNone(self.estimate.current())
+        self.estimate.add(100 * 1024, 1) # Too short to tell
+        self.assertIsNone(self.estimate.current())
+        self.estimate.add(1_000_000, 1)
+        self.estimate.add(4_000_000, 1, connections=4) # Per connection: the same
+        self.assertAlmostEqual(self.estimate.current(), 1_000_000)
+        self.estimate.add(2_000_000, 10)
+        self.assertAlmostEqual(self.estimate.current(), 1_000_000 + quality.SMOOTHING * (200_000 - 1_000_000))
+
+        # Persisted for the next run, but only while it is recent
+        reloaded = quality.ThroughputEstimate(self.estimate.path)
+        self.assertAlmostEqual(reloaded.current(), self.estimate.current())
+        reloaded.updated = time.time() - quality.MAX_AGE_SECONDS - 1
+        self.assertIsNone(reloaded.current())
+
+    @patch('ymp.config.get_download_connections', return_value=4)
+    @patch('ymp.config.is_adaptive_quality_enabled', return_value=True)
+    def test_choose_tier(self, adaptive, connections):
+        self.assertEqual(quality.choose_tier('stream', self.estimate), 'best') # Not measured yet
+        self.estimate.value, self.estimate.updated, self.estimate._loaded = 20_000, time.time(), True
+        self.assertEqual(quality.choose_tier('stream', self.estimate), 'low')
+        self.assertEqual(quality.choose_tier('download', self.estimate), 'medium') # 4 connections
+        self.estimate.value = 200_000
+        self.assertEqual(quality.choose_tier('stream', self.estimate), 'best')
+        adaptive.return_value = False
+        self.estimate.value = 1000
+        self.assertEqual(quality.choose_tier('stream', self.estimate), 'best')
+        self.assertEqual(quality.format_for('low'), quality.TIERS['low'])
+
+    @patch('ymp.downloader.thumbnails.after_download')
+    @patch('ymp.downloader.analysis.schedule')
+    @patch('ymp.downloader.chunked.fetch', return_value=False)
+    @patch('ymp.downloader._youtube_dl', FakeYoutubeDL)
+    def test_upgrade(self, fetch, schedule, after_download):
+        index = cacheindex.CacheIndex(os.path.join(self.tmpdir, 'index.json'))
+        song = os.path.join(self.tmpdir, 'Artist - Song.mp3')
+        with open(song, 'wb') as f:
+            f.write(b'low')
+        meta = {'id': 'dQw4w9WgXcQ', 'webpage_url': 'https://www.youtube.com/watch?v=dQw4w9WgXcQ', 'quality': 'low'}
+        index.add('dQw4w9WgXcQ', song, meta)
+
+        with patch('ymp.cacheindex.INDEX', index):
+            self.assertEqual(quality.Upgrader().candidates(), ['dQw4w9WgXcQ'])
+            self.assertTrue(downloader.upgrade('dQw4w9WgXcQ'))
+            self.assertEqual(quality.Upgrader().candidates(), [])
+        with open(song, 'rb') as f:
+            self.assertEqual(f.read(), b'best' * 1000)
+        self.assertEqual(index.lookup('dQw4w9WgXcQ')[1]['quality'], 'best')
+        schedule.assert_called_once_with(song) # Analysed again
+
+        # Hardlinks of other paths are not split up
+        os.link(song, song + '.link.mp3')
+        with patch('ymp.cacheindex.INDEX', index):
+            self.assertFalse(downloader.upgrade('dQw4w9WgXcQ'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import ymp.radio as radio
+
+class MirrorHandler(BaseHTTPRequestHandler):
+    """A radio mirror that answers after /delay/<seconds> or fails on /down."""
+
+    def do_GET(self):
+        if self.path == '/down':
+            self.send_error(503)
+            return
+        time.sleep(float(self.path.rsplit('/', 1)[1]))
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/mpeg')
+        self.end_headers()
+        try:
+            self.wfile.write(b'\xff' * radio.PROBE_BYTES)
+        except OSError:
+            pass
+
+    def log_message(self, *args):
+        pass
+
+class TestRadio(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), MirrorHandler)
+        cls.server.daemon_threads = True
+        cls.base = f'http://127.0.0.1:{cls.server.server_port}'
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_queue_entries(self):
+        live = [{'url': 'http://a/1', 'title': 'Radio X', 'length': -1}, {'url': 'http://b/1', 'title': None, 'length': -1}]
+        station, = radio.queue_entries(live)
+        self.assertTrue(radio.is_station(station))
+        self.assertEqual(station['title'], 'Radio X')
+        self.assertEqual(station['mirrors'], ['http://a/1', 'http://b/1'])
+
+        songs = radio.queue_entries([{'url': 'http://a/1.mp3', 'title': 'Song', 'length': 180}])
+        self.assertEqual(songs, [{'url': 'http://a/1.mp3', 'title': 'Song', 'duration': 180}])
+
+    def test_race_picks_fastest(self):
+        slow, fast, down = f'{self.base}/delay/0.5', f'{self.base}/delay/0', f'{self.base}/down'
+        station = radio.Station({'title': 'Radio X', 'url': slow, 'mirrors': [down, slow, fast]})
+        start = time.perf_counter()
+        self.assertEqual(station.race(timeout=2), fast)
+        self.assertLess(time.perf_counter() - start, 0.4) # Did not wait for the slow mirror
+        time.sleep(0.8)
+        self.assertEqual(station.mirrors, [fast, slow, down])
+
+    def test_race_all_down(self):
+        station = radio.Station({'title': 'Radio X', 'url': 'x', 'mirrors': [f'{self.base}/down'] * 2})
+        self.assertIsNone(station.race(timeout=2))
+
+    def test_failover(self):
+        station = radio.Station({'title': 'Radio X', 'url': 'a', 'mirrors': ['a', 'b', 'c']})
+        station.start()
+        self.assertEqual(station.next_mirror(), 'b')
+        self.assertEqual(station.next_mirror(), 'c')
+        self.assertIsNone(station.next_mirror()) # Three quick drops in a row
+
+        # A mirror that played for a while before dropping resets the count
+        station = radio.Station({'title': 'Radio X', 'url': 'a', 'mirrors': ['a']})
+        station.start()
+        with patch('ymp.radio.time.monotonic', return_value=time.monotonic() + radio.STABLE_SECONDS):
+            self.assertEqual(station.next_mirror(), 'a')
+
+if __name__ == '__main__':
+    unittest.main()
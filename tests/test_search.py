@@ -0,0 +1,77 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import ymp.search as search
+
+def results(*titles):
+    return [{'id': f'{i:011d}', 'url': f'https://www.youtube.com/watch?v={i:011d}', 'title': title,
+             'channel': 'Daft Punk', 'duration': 200} for i, title in enumerate(titles)]
+
+class TestSearchCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = search.SearchCache(os.path.join(self.tmpdir, 'search_cache.json'), max_entries=2, max_age_days=7)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_exact_and_prefix_extended(self):
+        self.assertEqual(self.cache.get('daft', 2), (None, False))
+        self.cache.put('Daft  ', results('One More Time', 'Get Lucky', 'Around the World'))
+
+        self.assertEqual(len(self.cache.get('daft', 2)[0]), 2)
+        self.assertTrue(self.cache.get('DAFT', 2)[1])
+        # Filtered from the cached "daft" results, complete when enough remain
+        found, complete = self.cache.get('daft punk get', 1)
+        self.assertEqual([r['title'] for r in found], ['Get Lucky'])
+        self.assertTrue(complete)
+        found, complete = self.cache.get('daft get', 2)
+        self.assertEqual(len(found), 1)
+        self.assertFalse(complete)
+
+    def test_lru_persisted_and_expiry(self):
+        self.cache.put('a', results('A'))
+        self.cache.put('b', results('B'))
+        self.cache.get('a', 5) # Now more recent than "b"
+        self.cache.put('c', results('C'))
+
+        reloaded = search.SearchCache(self.cache.path, max_entries=2, max_age_days=7)
+        self.assertIsNone(reloaded.get('b', 5)[0])
+        self.assertEqual(list(reloaded.entries), ['a', 'c'])
+
+        reloaded.entries['a'] = (time.time() - 8 * 86400, reloaded.entries['a'][1])
+        self.assertIsNone(reloaded.get('a', 5)[0])
+
+    def test_search_goes_to_the_network_once(self):
+        with patch('ymp.search.fetch', return_value=results('Get Lucky', 'Lose Yourself to Dance')) as fetch:
+            self.assertEqual(len(search.search('daft punk', 5, cache=self.cache)), 2)
+            self.assertEqual(len(search.search('daft punk', 5, cache=self.cache)), 2)
+            self.assertEqual(len(search.search('daft punk lucky', 1, cache=self.cache)), 1)
+        fetch.assert_called_once_with('daft punk')
+        self.assertIn('Daft Punk', search.describe(results('Get Lucky')[0]))
+        self.assertTrue(search.describe(results('Get Lucky')[0]).endswith('3:20'))
+
+    def test_merge_local_first(self):
+        remote = results('Get Lucky', 'Around the World')
+        local = [{'url': '/music/Daft Punk/Get Lucky.mp3', 'title': 'Get Lucky', 'channel': 'Daft Punk',
+                  'duration': 248, 'id': remote[0]['id']},
+                 {'url': '/music/Daft Punk/Veridis Quo.mp3', 'title': 'Veridis Quo', 'channel': 'Daft Punk',
+                  'duration': None}]
+
+        merged = search.merge(local, remote, 5)
+        # The downloaded "Get Lucky" stands in for its video
+        self.assertEqual([r['title'] for r in merged], ['Get Lucky', 'Veridis Quo', 'Around the World'])
+        self.assertEqual(merged[0]['url'], '/music/Daft Punk/Get Lucky.mp3')
+        self.assertEqual(len(search.merge(local, remote, 2)), 2)
+        self.assertEqual(search.describe(local[0]), 'Get Lucky · Daft Punk · 4:08 · local')
+        self.assertEqual(search.describe(local[1]), 'Veridis Quo · Daft Punk · live · local')
+        self.assertFalse(search.describe(remote[1]).endswith('local'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import ymp.session as session
+import ymp.tracks as tracks
+from ymp.playlistmanager import Playlist
+
+class TestSession(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'session.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def make_playlist(self):
+        pls = Playlist()
+        pls.enable_rich_ui = False
+        pls.queuedplaylist = [tracks.of('song a'), tracks.of({'id': 'abc', 'url': 'https://youtu.be/abc', 'title': 'B'})]
+        pls.playedplaylist = [tracks.of({'id': 'xyz', 'url': 'https://youtu.be/xyz', 'title': 'Current'})]
+        pls.repeat = 1
+        return pls
+
+    def test_roundtrip(self):
+        pls = self.make_playlist()
+        session.write_snapshot(session.snapshot(pls), self.path)
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+
+        restored = Playlist()
+        current = session.restore(restored, session.load_snapshot(self.path))
+        self.assertIsNone(current)
+        self.assertEqual(restored.queuedplaylist, pls.queuedplaylist)
+        self.assertEqual(restored.playedplaylist, pls.playedplaylist)
+        self.assertEqual(restored.repeat, 1)
+
+    def test_current_track_with_cached_file(self):
+        pls = self.make_playlist()
+        cached = os.path.join(self.tmpdir, 'Artist - Current.mp3')
+        with open(cached, 'w') as f:
+            f.write('x')
+        pls.meta = {'id': 'xyz', 'title': 'Current', 'formats': [{'url': 'big'}]}
+        pls.filepath = 'https://stream.example/xyz'
+        pls.cachepath = cached
+        pls.playobj = object()
+        pls.songpaused = True
+        pls.resumetime = 42000
+
+        current = session.snapshot(pls)['current']
+        self.assertEqual(current['meta'], {'id': 'xyz', 'title': 'Current'})
+        self.assertEqual(current['filepath'], cached)
+        self.assertEqual(current['position'], 42)
+
+    def test_load_corrupt_file(self):
+        with open(self.path, 'w') as f:
+            f.write('{"queue": [')
+        self.assertIsNone(session.load_snapshot(self.path))
+        self.assertIsNone(session.load_snapshot(os.path.join(self.tmpdir, 'missing.json')))
+
+    def test_saver_skips_empty_and_unchanged(self):
+        saver = session.SessionSaver(Playlist(), path=self.path, interval=60)
+        saver.save()
+        self.assertFalse(os.path.exists(self.path))
+
+        saver.playlist = self.make_playlist()
+        saver.save()
+        mtime = os.stat(self.path).st_mtime_ns
+        saver.save()
+        self.assertEqual(os.stat(self.path).st_mtime_ns, mtime)
+        with open(self.path) as f:
+            self.assertEqual(json.load(f)['queue'][0]['url'], 'song a')
+
+    def test_saver_serialises_the_queue_only_after_changes(self):
+        pls = self.make_playlist()
+        pls.meta = {'id': 'xyz', 'title': 'Current'}
+        pls.playobj, pls.songpaused, pls.resumetime = object(), True, 1000
+        saver = session.SessionSaver(pls, path=self.path, interval=60)
+        saver.save()
+
+        # Only the position moved: the queue is written as serialised before
+        pls.resumetime = 6000
+        pls.queuedplaylist[0].title = 'Renamed'
+        saver.save()
+        with open(self.path) as f:
+            data = json.load(f)
+        self.assertEqual(data['current']['position'], 6)
+        self.assertNotIn('title', data['queue'][0])
+        self.assertEqual(data['history'][0]['title'], 'Current')
+
+        pls.changed()
+        saver.save()
+        with open(self.path) as f:
+            self.assertEqual(json.load(f)['queue'][0]['title'], 'Renamed')
+
+    def test_saver_reports_errors(self):
+        with open(self.path, 'w') as f:
+            f.write('{}')
+        # A file where the session directory should be
+        saver = session.SessionSaver(self.make_playlist(), path=os.path.join(self.path, 'session.json'), interval=60)
+        errors = []
+        saver.on_error = errors.append
+        saver.save()
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(errors[0].startswith("Error saving session: "))
+
+    def test_restores_sessions_of_older_versions(self):
+        # Queue entries used to be saved as they were: strings and yt-dlp entry dicts
+        restored = Playlist()
+        session.restore(restored, {'queue': ['song a', {'id': 'abc', 'url': 'https://youtu.be/abc', 'title': 'B',
+                                                        'channel': 'C', 'thumbnails': []}]})
+        self.assertEqual(restored.queuedplaylist, self.make_playlist().queuedplaylist[:1] +
+                         [tracks.Track('https://youtu.be/abc', 'B', 'C', id='abc')])
+
+if __name__ == '__main__':
+    unittest.main()
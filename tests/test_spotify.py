@@ -0,0 +1,85 @@
+import os
+import sys
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import ymp.spotify as spotify
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'spotify')
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """Local stand-in for open.spotify.com / api.spotify.com serving saved pages."""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/playlist/road':
+            name, ctype = 'playlist.html', 'text/html'
+        elif url.path == '/v1/playlists/road/tracks':
+            if self.headers.get('Authorization') != 'Bearer fixture-token':
+                self.send_error(401)
+                return
+            offset = parse_qs(url.query)['offset'][0]
+            name, ctype = f'tracks_offset{offset}.json', 'application/json'
+        else:
+            self.send_error(404)
+            return
+        with open(os.path.join(FIXTURES, name), 'rb') as f:
+            body = f.read().replace(b'{base}', self.server.base.encode())
+        self.send_response(200)
+        self.send_header('Content-Type', ctype)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class TestSpotify(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+        cls.server.base = f'http://127.0.0.1:{cls.server.server_port}'
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_follows_pagination(self):
+        logs = []
+        tracks = list(spotify.iter_tracks(self.server.base + '/playlist/road', log=logs.append))
+        self.assertEqual(tracks, [
+            'Perfect Fairground Attraction',
+            'Under Pressure Queen David Bowie',
+            'Africa Toto',
+            'Go Your Own Way Fleetwood Mac',
+            'Take On Me a-ha',
+        ])
+        self.assertIn('Adding Road Trip To Queue.', logs)
+
+    def test_yields_incrementally(self):
+        tracks = spotify.iter_tracks(self.server.base + '/playlist/road', log=lambda msg: None)
+        self.assertEqual(next(tracks), 'Perfect Fairground Attraction')
+
+    def test_scan_entity_with_tiny_chunks(self):
+        with open(os.path.join(FIXTURES, 'playlist.html'), 'rb') as f:
+            page = f.read()
+        for size in (1, 7, 64, len(page)):
+            chunks = [page[i:i + size] for i in range(0, len(page), size)]
+            entity, token = spotify.scan_entity(chunks)
+            self.assertEqual(entity['name'], 'Road Trip')
+            self.assertEqual(entity['description'], 'Songs with {braces} and "quotes"')
+            self.assertEqual(token, 'fixture-token')
+
+    def test_missing_entity(self):
+        self.assertEqual(spotify.scan_entity([b'<html>nothing here</html>']), (None, None))
+        logs = []
+        self.assertEqual(list(spotify.iter_tracks(self.server.base + '/missing', log=logs.append)), [])
+        self.assertTrue(any('Error' in msg for msg in logs))
+
+if __name__ == '__main__':
+    unittest.main()
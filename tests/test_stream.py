@@ -0,0 +1,171 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import ymp.stream as stream
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """
+    A live stream that sends one block per connection and drops. /flaky only answers
+    connections 1 and 3, /down never.
+    """
+    protocol_version = 'HTTP/1.0'
+    connections = 0
+
+    def do_GET(self):
+        if self.path == '/down':
+            self.send_error(503)
+            return
+        type(self).connections += 1
+        if self.path == '/flaky' and type(self).connections not in (1, 3):
+            self.send_error(503)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/mpeg')
+        self.end_headers()
+        self.wfile.write(bytes([type(self).connections]) * 1000)
+
+    def log_message(self, *args):
+        pass
+
+def drain(relay):
+    data = b''
+    while True:
+        chunk = relay.read()
+        if not chunk:
+            return data
+        data += chunk
+
+def read_soon(relay, size, timeout=0.2):
+    """A chunk the relay hands out right away, None if the player would have to wait."""
+    result = []
+    feed = relay._feed
+    reader = threading.Thread(target=lambda: result.append(relay.read(size, feed)), daemon=True)
+    reader.start()
+    reader.join(timeout)
+    if reader.is_alive():
+        with relay._cond:
+            relay._feed += 1 # Ends the pending read without taking data
+            relay._cond.notify_all()
+        reader.join()
+        return None
+    return result[0]
+
+@patch('ymp.stream.BACKOFF_SECONDS', (0.01,))
+class TestStreamRelay(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FlakyHandler)
+        cls.server.daemon_threads = True
+        cls.base = f'http://127.0.0.1:{cls.server.server_port}'
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        FlakyHandler.connections = 0
+
+    def relay(self, path, **kwargs):
+        options = dict(buffer_bytes=1 << 20, max_reconnects=2, connect_timeout=2, stall_timeout=2, timeshift_seconds=0)
+        options.update(kwargs)
+        return stream.StreamRelay(self.base + path, **options)
+
+    def test_reconnects_until_it_gives_up(self):
+        events = []
+        relay = self.relay('/flaky', on_event=events.append)
+        relay.start()
+        self.assertTrue(relay.wait_connected())
+        # Drop, one failed attempt, reconnect, drop, then two failed attempts (max_reconnects=2)
+        self.assertEqual(drain(relay), b'\x01' * 1000 + b'\x03' * 1000)
+        self.assertEqual(FlakyHandler.connections, 5)
+        stats = relay.stats()
+        self.assertEqual(stats['state'], 'failed')
+        self.assertEqual((stats['outages'], stats['reconnects']), (2, 1))
+        self.assertTrue(any('reconnected' in e for e in events))
+
+    def test_unreachable_mirror_fails_right_away(self):
+        relay = self.relay('/down', max_reconnects=5)
+        relay.start()
+        self.assertFalse(relay.wait_connected())
+        self.assertEqual(drain(relay), b'')
+        self.assertEqual(relay.stats()['outages'], 0)
+
+    def test_full_buffer_drops_oldest(self):
+        relay = self.relay('/x', buffer_bytes=4)
+        relay.ring = stream.RingBuffer(10, file=False)
+        for chunk in (b'aaaa', b'bbbb', b'cccc', b'dddd'):
+            relay._put(chunk)
+        self.assertEqual(relay.read(), b'bbccccdddd')
+        self.assertEqual(relay.dropped_bytes, 6)
+        relay.close()
+
+    def test_read_ahead_bridges_a_drop(self):
+        relay = self.relay('/x', buffer_bytes=1000)
+        relay.ring = stream.RingBuffer(2000, file=False)
+        relay.connected = True
+        relay._put(b'a' * 600)
+        self.assertIsNone(read_soon(relay, 100)) # Not fed before the reserve is there
+        relay._put(b'b' * 600)
+        self.assertEqual(read_soon(relay, 100), b'a' * 100)
+
+        # The connection drops and comes back before the reserve is played: no gap
+        relay.connected = False
+        for _ in range(5):
+            self.assertEqual(len(read_soon(relay, 100)), 100)
+        relay.connected = True
+        relay._put(b'c' * 600)
+        played = b''.join(read_soon(relay, 100) for _ in range(12))
+        self.assertEqual(played, b'b' * 600 + b'c' * 600)
+
+        # An outage longer than the reserve: the player waits until it is built up again
+        self.assertIsNone(read_soon(relay, 100))
+        self.assertEqual(relay.stats()['state'], 'buffering')
+        relay._put(b'd' * 999)
+        self.assertIsNone(read_soon(relay, 100))
+        relay._put(b'd')
+        self.assertEqual(read_soon(relay, 100), b'd' * 100)
+        relay.close()
+
+    def test_ring_buffer_wraps(self):
+        ring = stream.RingBuffer(8)
+        ring.write(b'abcdef')
+        ring.write(b'ghij')
+        self.assertEqual((ring.start, ring.end), (2, 10))
+        self.assertEqual(ring.read(2, 100), b'cdefghij')
+        self.assertEqual(ring.read(7, 2), b'hi')
+        ring.close()
+
+    def test_timeshift(self):
+        relay = self.relay('/x')
+        relay.ring = stream.RingBuffer(1000, file=False)
+        relay.bitrate = 100 # Bytes per second
+        relay._put(b'x' * 1000)
+        relay.cursor = 1000 # At the live edge
+        self.assertEqual(relay.seek(-3), -3)
+        self.assertEqual(relay.cursor, 700)
+        self.assertEqual(relay.seek(60), 3) # Not past the live edge
+        self.assertEqual(relay.seek(-60), -10) # Not before the oldest audio kept
+
+        # Pausing after 2 s of playback from offset 0: the rest sits unplayed in ffplay/the pipe
+        relay.cursor = 1000
+        relay._feed_start = (0, time.monotonic() - 2)
+        relay.detach()
+        self.assertAlmostEqual(relay.cursor, 200, delta=10)
+        self.assertAlmostEqual(relay.stats()['behind'], 8, delta=0.1)
+        relay.close()
+
+    def test_is_relayable(self):
+        self.assertTrue(stream.is_relayable('http://radio.example.com:8000/stream'))
+        self.assertFalse(stream.is_relayable('https://example.com/live/index.m3u8'))
+        self.assertFalse(stream.is_relayable('/home/me/song.mp3'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import ymp.analysis as analysis
+import ymp.thumbnails as thumbnails
+
+def id3(payload):
+    size = len(payload)
+    return b'ID3\x03\x00\x00' + bytes([(size >> 21) & 0x7f, (size >> 14) & 0x7f, (size >> 7) & 0x7f, size & 0x7f]) + payload
+
+class TestThumbnails(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = thumbnails.ThumbnailCache(os.path.join(self.tmpdir, 'thumbs'), max_bytes=250, size=300)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_source_url(self):
+        meta = {'id': 'dQw4w9WgXcQ', 'thumbnails': [
+            {'url': 'https://i.ytimg.com/vi/x/maxresdefault.jpg', 'width': 1280},
+            {'url': 'https://i.ytimg.com/vi/x/mqdefault.jpg', 'width': 320},
+            {'url': 'https://i.ytimg.com/vi_webp/x/mqdefault.webp', 'width': 320},
+            {'url': 'https://i.ytimg.com/vi/x/default.jpg', 'width': 120},
+        ]}
+        self.assertEqual(thumbnails.source_url(meta, 300), 'https://i.ytimg.com/vi/x/mqdefault.jpg')
+        self.assertEqual(thumbnails.source_url(meta, 2000), 'https://i.ytimg.com/vi/x/maxresdefault.jpg')
+        # Cache hits only keep 'thumbnail' (see ymp.cacheindex.META_KEYS)
+        self.assertEqual(thumbnails.source_url({'id': 'dQw4w9WgXcQ'}),
+                         'https://i.ytimg.com/vi/dQw4w9WgXcQ/hqdefault.jpg')
+        self.assertIsNone(thumbnails.source_url({'title': 'Radio'}))
+
+    @patch('ymp.thumbnails.downscale', return_value=False)
+    @patch('requests.get')
+    def test_fetched_once_and_bounded(self, get, downscale):
+        get.return_value.content = b'x' * 100
+        for vid in ('aaaaaaaaaaa', 'bbbbbbbbbbb'):
+            self.assertEqual(self.cache.fetch({'id': vid}), self.cache.path(vid))
+        os.utime(self.cache.path('aaaaaaaaaaa'), (time.time() - 60,) * 2)
+        os.utime(self.cache.path('bbbbbbbbbbb'), (time.time() - 30,) * 2)
+        self.assertEqual(self.cache.fetch({'id': 'aaaaaaaaaaa'}), self.cache.path('aaaaaaaaaaa'))
+        self.assertEqual(get.call_count, 2) # The second request for a video is a cache hit
+        # Listing the queue (MPRIS TrackList) does not count as a use
+        self.assertEqual(self.cache.peek('bbbbbbbbbbb'), self.cache.path('bbbbbbbbbbb'))
+        self.assertIsNone(self.cache.peek('ddddddddddd'))
+
+        # Over 250 bytes: the least recently used (b, as a was just used again) goes
+        self.cache.fetch({'id': 'ccccccccccc'})
+        self.assertEqual(sorted(os.listdir(self.cache.directory)), ['aaaaaaaaaaa.jpg', 'ccccccccccc.jpg'])
+
+    def test_has_cover(self):
+        song = os.path.join(self.tmpdir, 'song.mp3')
+        with open(song, 'wb') as f:
+            f.write(id3(b'TIT2\x00\x00\x00\x02\x00\x00\x00A') + b'\xff\xfb' * 100)
+        self.assertFalse(thumbnails.has_cover(song))
+        with open(song, 'wb') as f:
+            f.write(id3(b'APIC\x00\x00\x00\x04\x00\x00\x00jpg') + b'\xff\xfb' * 100)
+        self.assertTrue(thumbnails.has_cover(song))
+
+    @patch('ymp.analysis._lower_priority')
+    @patch('ymp.thumbnails.subprocess.Popen')
+    def test_embed_keeps_analysis(self, popen, lower_priority):
+        song = os.path.join(self.tmpdir, 'song.mp3')
+        with open(song, 'wb') as f:
+            f.write(b'\xff\xfb' * 100)
+        store = analysis.AnalysisStore(os.path.join(self.tmpdir, 'analysis.json'))
+        store.put(song, {'gain': -3.0})
+
+        def run_ffmpeg(cmd, **kwargs):
+            with open(cmd[-1], 'wb') as f:
+                f.write(id3(b'APIC' + b'\0' * 50) + b'\xff\xfb' * 100)
+            popen.return_value.wait.return_value = 0
+            return popen.return_value
+        popen.side_effect = run_ffmpeg
+
+        with patch('ymp.analysis.STORE', store):
+            self.assertTrue(thumbnails.embed(song, 'cover.jpg'))
+            self.assertTrue(thumbnails.has_cover(song))
+            self.assertEqual(store.get(song)['gain'], -3.0) # Still valid with the new size
+            self.assertFalse(thumbnails.embed(song, 'cover.jpg')) # Already has one
+
+        # Hardlinked duplicates are not split up
+        other = os.path.join(self.tmpdir, 'other.mp3')
+        with open(other, 'wb') as f:
+            f.write(b'\xff\xfb' * 100)
+        os.link(other, other + '.link')
+        self.assertFalse(thumbnails.embed(other, 'cover.jpg'))
+        self.assertEqual(popen.call_count, 1)
+
+    def test_embedder_waits_while_downloading(self):
+        song = os.path.join(self.tmpdir, 'song.mp3')
+        with open(song, 'wb') as f:
+            f.write(b'\xff\xfb' * 100)
+        idle = [0, 60] # A download (of the playing song) still runs, then none for a minute
+        embedded = threading.Event()
+        with patch('ymp.downloader.idle_seconds', side_effect=lambda: idle.pop(0) if len(idle) > 1 else idle[0]), \
+             patch('ymp.thumbnails.embed', side_effect=lambda filepath, image: embedded.set()) as embed:
+            embedder = thumbnails.Embedder(MagicMock(fetch=MagicMock(return_value='cover.jpg')))
+            embedder.schedule({'id': 'aaaaaaaaaaa'}, song)
+            self.assertTrue(embedded.wait(5))
+        self.assertEqual(idle, [60]) # Polled again after the download
+        embed.assert_called_once_with(song, 'cover.jpg')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import io
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import ymp.tracing as tracing
+import ymp.player as player
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        tracing._stats.clear()
+
+    def tearDown(self):
+        tracing.disable()
+        tracing._stats.clear()
+        shutil.rmtree(self.tmpdir)
+
+    def test_disabled_is_noop(self):
+        self.assertIs(tracing.span('resolve'), tracing.NULL_SPAN)
+        trace = tracing.begin_track()
+        self.assertIs(trace, tracing.NULL_TRACE)
+        with trace.activate(), trace.span('spawn'):
+            pass
+        self.assertEqual(tracing.breakdown(), {})
+
+    def test_track_trace(self):
+        path = os.path.join(self.tmpdir, 'trace.json')
+        tracing.enable(path)
+        lines = []
+        trace = tracing.begin_track(since=tracing.now() - 0.5, on_finish=lines.append)
+        trace.set_label('some song')
+        with trace.activate():
+            with tracing.span('resolve'):
+                pass
+        with tracing.span('download'):
+            pass # Not part of any track
+        trace.player_started()
+        trace.first_audio()
+        trace.first_audio() # Only the first report counts
+
+        self.assertEqual(set(trace.stages), {'poll', 'resolve', 'first_audio'})
+        self.assertGreaterEqual(trace.stages['poll'], 0.5)
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0].startswith('First sound after'))
+
+        tracing.disable()
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+        # Chrome trace array without the (optional) closing bracket
+        events = json.loads(text.rstrip().rstrip(',') + ']')
+        names = [e['name'] for e in events]
+        self.assertEqual(names.count('time_to_first_sound'), 1)
+        resolve = events[names.index('resolve')]
+        self.assertEqual(resolve['ph'], 'X')
+        self.assertEqual(resolve['args']['track'], 'some song')
+        self.assertNotIn('track', events[names.index('download')]['args'])
+
+    def test_rolling_breakdown(self):
+        tracing.enable()
+        lines = []
+        for _ in range(3):
+            trace = tracing.begin_track(on_finish=lines.append)
+            with trace.span('extract'):
+                pass
+            trace.first_audio()
+        averages = tracing.breakdown()
+        self.assertEqual(averages['extract'][1], 3)
+        self.assertIn('Rolling avg (last 3)', lines[-1])
+        self.assertNotIn('Rolling avg', lines[0])
+
+    def test_watch_status(self):
+        class Process:
+            stderr = io.BufferedReader(io.BytesIO(
+                b"nan    :  0.000 fd=   0 aq=    0KB vq=    0KB sq=    0B \r"
+                b"   0.05 M-A:  0.000 fd=   0 aq=   12KB vq=    0KB sq=    0B \r"
+                b"   0.10 M-A:  0.000 fd=   0 aq=   12KB vq=    0KB sq=    0B \r"))
+
+        playobj = player.FFplayProcess(Process())
+        calls = []
+        player._watch_status(playobj, lambda: calls.append(1))
+        self.assertEqual(calls, [1])
+        self.assertIsNotNone(playobj.exited_at)
+
+if __name__ == '__main__':
+    unittest.main()
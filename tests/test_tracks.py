@@ -0,0 +1,157 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import ymp.downloader as downloader
+import ymp.session as session
+import ymp.tracks as tracks
+from ymp.playlistmanager import Playlist
+
+FLAT_ENTRY = {
+    '_type': 'url', 'ie_key': 'Youtube', 'id': 'dQw4w9WgXcQ', 'url': 'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+    'title': 'Never Gonna Give You Up', 'duration': 212.0, 'channel': 'Rick Astley', 'channel_id': 'UCuAXFkgsw1L7xaCfnd5JJOw',
+    'thumbnails': [{'url': 'https://i.ytimg.com/vi/dQw4w9WgXcQ/hqdefault.jpg', 'height': 360, 'width': 480}],
+    'view_count': 1, 'live_status': None,
+}
+
+class TestTracks(unittest.TestCase):
+    def test_flat_entry(self):
+        track = tracks.of(FLAT_ENTRY)
+        self.assertEqual((track.id, track.url, track.title, track.artist, track.duration),
+                         ('dQw4w9WgXcQ', FLAT_ENTRY['url'], 'Never Gonna Give You Up', 'Rick Astley', 212.0))
+        self.assertEqual((track.source, track.state), (tracks.YOUTUBE, tracks.LISTED))
+        self.assertFalse(hasattr(track, '__dict__'))
+        self.assertIs(tracks.of(track), track)
+
+    def test_artist_is_interned(self):
+        a = tracks.of(dict(FLAT_ENTRY, channel=''.join(['Rick ', 'Astley'])))
+        b = tracks.of(dict(FLAT_ENTRY, channel=''.join(['Rick', ' Astley'])))
+        self.assertIs(a.artist, b.artist)
+
+    def test_strings(self):
+        with tempfile.NamedTemporaryFile(suffix='.mp3') as f:
+            self.assertEqual(tracks.of(f.name).source, tracks.FILE)
+        query = tracks.of('daft punk song')
+        self.assertEqual((query.url, query.source, query.state), ('daft punk song', tracks.SEARCH, tracks.UNRESOLVED))
+        link = tracks.of('https://youtu.be/dQw4w9WgXcQ')
+        self.assertEqual((link.id, link.source), ('dQw4w9WgXcQ', tracks.YOUTUBE))
+        self.assertEqual(tracks.of('https://radio.example/stream').source, tracks.URL)
+        self.assertEqual(tracks.of({'title': 'Get Lucky'}).url, 'Get Lucky') # Only a title: searched for
+
+    def test_to_dict_roundtrip(self):
+        for entry in (FLAT_ENTRY, 'daft punk song', {'_type': 'station', 'title': 'Radio X', 'url': 'http://a',
+                                                     'mirrors': ['http://a', 'http://b'], 'titles': ['A', None]}):
+            track = tracks.of(entry)
+            self.assertEqual(tracks.of(track.to_dict()), track)
+        self.assertEqual(tracks.of('daft punk song').to_dict(),
+                         {'url': 'daft punk song', 'source': 'search', 'state': 'unresolved'})
+
+    def test_resolve(self):
+        track = tracks.of('get lucky song')
+        track.resolve({'webpage_url': 'https://www.youtube.com/watch?v=5NV6Rdv1a3I', 'id': '5NV6Rdv1a3I',
+                       'title': 'Get Lucky', 'uploader': 'Daft Punk', 'duration': 248, 'formats': []})
+        self.assertEqual((track.url, track.artist, track.source, track.state),
+                         ('https://www.youtube.com/watch?v=5NV6Rdv1a3I', 'Daft Punk', tracks.YOUTUBE, tracks.RESOLVED))
+
+    def test_info_is_fetched_once(self):
+        tracks._fetch_info.cache_clear()
+        ytdl = MagicMock()
+        ytdl.__enter__.return_value.extract_info.return_value = {'entries': [{'id': 'x', 'description': 'full'}]}
+        with patch('ymp.downloader._youtube_dl', return_value=ytdl) as youtube_dl:
+            track = tracks.of('get lucky song')
+            self.assertEqual(track.info()['description'], 'full')
+            self.assertEqual(tracks.of('get lucky song').info()['description'], 'full')
+        self.assertEqual(youtube_dl.call_count, 1)
+        self.assertIsNone(tracks.Track('/music/a.mp3', source=tracks.FILE).info())
+        tracks._fetch_info.cache_clear()
+
+def flat(i):
+    vid = f'video{i:06d}'
+    return {'_type': 'url', 'id': vid, 'url': tracks.WATCH_URL + vid, 'title': f'Song {i}', 'duration': 200}
+
+class TestPlaylistExpansion(unittest.TestCase):
+    def setUp(self):
+        self.pages = [] # Pages fetched by the fake extractor
+        real = downloader._youtube_dl
+        def youtube_dl(options):
+            ytdl = real(options)
+            ytdl.extract_info = self.extract_info
+            return ytdl
+        patcher = patch('ymp.downloader._youtube_dl', youtube_dl)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def extract_info(self, url, download=False, process=True, ie_key=None):
+        if 'watch' in url: # Leads to the playlist, like YouTube's watch?v=...&list=... links
+            return {'_type': 'url', 'url': 'https://www.youtube.com/playlist?list=PL1', 'ie_key': 'YoutubeTab'}
+        def entries():
+            for page in range(3):
+                self.pages.append(page)
+                yield from (flat(page * 100 + i) for i in range(100))
+        return {'_type': 'playlist', 'id': 'PL1', 'entries': entries()}
+
+    def test_pages_are_fetched_as_consumed(self):
+        songs = downloader.iter_playlist('https://www.youtube.com/watch?v=video000000&list=PL1')
+        self.assertEqual(next(songs).title, 'Song 0')
+        self.assertEqual(self.pages, [0])
+        self.assertEqual(len(list(songs)), 299)
+        self.assertEqual(self.pages, [0, 1, 2])
+
+        rest = list(downloader.iter_playlist('https://www.youtube.com/playlist?list=PL1', start=250))
+        self.assertEqual([track.title for track in rest[:2]], ['Song 250', 'Song 251'])
+        self.assertEqual(len(rest), 50)
+        self.assertEqual(len(downloader.get_playlist_info('https://www.youtube.com/playlist?list=PL1')), 300)
+
+    def test_expands_in_place(self):
+        pls = Playlist()
+        for song in ('first', 'https://www.youtube.com/playlist?list=PL1', 'last'):
+            pls.addsong(song)
+        link = pls.queuedplaylist[1]
+        self.assertEqual(pls.begin_expansion(link), 0)
+        pls.returnsong()
+        self.assertFalse(pls.has_next()) # The player waits for the first page
+        self.assertIsNone(pls.returnsong())
+
+        self.assertTrue(pls.expand(link, [flat(0)]))
+        self.assertTrue(pls.has_next())
+        self.assertIn('1 songs so far', link.label)
+
+        # Saved while loading: expanded again after the songs already queued
+        restored = Playlist()
+        session.restore(restored, session.snapshot(pls))
+        self.assertEqual(restored.queuedplaylist[1].state, tracks.UNRESOLVED)
+        self.assertEqual(restored.begin_expansion(restored.queuedplaylist[1]), 1)
+
+        self.assertTrue(pls.expand(link, [flat(1), flat(2)]))
+        pls.end_expansion(link)
+        self.assertEqual([track.label for track in pls.queuedplaylist], ['Song 0', 'Song 1', 'Song 2', 'last song'])
+
+    def test_empty_playlist_stays_a_song(self):
+        pls = Playlist()
+        pls.addsong('https://www.youtube.com/playlist?list=PL1')
+        link = pls.queuedplaylist[0]
+        pls.begin_expansion(link)
+        pls.end_expansion(link)
+        self.assertEqual(pls.queuedplaylist, [link])
+        self.assertEqual(link.state, tracks.UNRESOLVED)
+
+    def test_daemon_expands_in_place(self):
+        from ymp.daemon import Daemon
+        tmpdir = tempfile.mkdtemp()
+        daemon = Daemon(Playlist(), tmpdir, path=os.path.join(tmpdir, 'ymp.sock'))
+        running = set(threading.enumerate())
+        with patch('ymp.daemon.print'):
+            daemon.enqueue(['first', 'https://www.youtube.com/playlist?list=PL1', 'last'])
+            for thread in set(threading.enumerate()) - running:
+                thread.join(timeout=5)
+        queue = daemon.playlist.queuedplaylist
+        self.assertEqual(len(queue), 302)
+        self.assertEqual((queue[1].title, queue[300].title, queue[-1].url), ('Song 0', 'Song 299', 'last song'))
+        os.rmdir(tmpdir)
+
+if __name__ == '__main__':
+    unittest.main()
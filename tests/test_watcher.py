@@ -0,0 +1,88 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import ymp.config as config
+import ymp.watcher as watcher
+
+def write(path, size):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'\0' * size)
+
+class TestMusicTree(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_matches_the_walk(self):
+        write(os.path.join(self.tmpdir, 'a.mp3'), 100)
+        write(os.path.join(self.tmpdir, 'Artist', 'b.mp3'), 200)
+        os.link(os.path.join(self.tmpdir, 'a.mp3'), os.path.join(self.tmpdir, 'c.mp3'))
+        write(os.path.join(self.tmpdir, 'cover.jpg'), 1000)
+        tree = watcher.MusicTree(self.tmpdir)
+        tree.scan()
+        self.assertEqual(sorted(map(sorted, (s[0] for s in tree.stored_songs()))),
+                         sorted(map(sorted, (s[0] for s in config._stored_songs(self.tmpdir)))))
+        self.assertEqual(tree.total, 300) # The hardlink counts once, like check_disk_usage
+
+        tree.remove(os.path.join(self.tmpdir, 'a.mp3'))
+        self.assertEqual(tree.total, 300) # Still linked as c.mp3
+        tree.remove(os.path.join(self.tmpdir, 'c.mp3'))
+        self.assertEqual(tree.total, 200)
+
+@unittest.skipUnless(watcher._libc() is not None and sys.platform.startswith('linux'), "inotify only")
+class TestWatcher(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.watcher = watcher.Watcher(self.tmpdir, sync_indexes=False).start()
+
+    def tearDown(self):
+        self.watcher.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, "the watcher did not catch up")
+            time.sleep(0.02)
+
+    def songs(self):
+        return sorted(os.path.relpath(p, self.tmpdir) for paths, _, _ in self.watcher.tree.stored_songs() for p in paths)
+
+    def test_follows_changes(self):
+        self.assertTrue(self.watcher.live)
+        write(os.path.join(self.tmpdir, 'a.mp3'), 100)
+        write(os.path.join(self.tmpdir, 'New', 'Album', 'b.mp3'), 200) # Folders created on the way
+        self.wait_for(lambda: self.songs() == ['New/Album/b.mp3', 'a.mp3'] and self.watcher.tree.total == 300)
+
+        os.rename(os.path.join(self.tmpdir, 'a.mp3'), os.path.join(self.tmpdir, 'New', 'a.mp3'))
+        shutil.rmtree(os.path.join(self.tmpdir, 'New', 'Album'))
+        self.wait_for(lambda: self.songs() == ['New/a.mp3'] and self.watcher.tree.total == 100)
+        self.assertEqual(self.watcher._renamed, [(os.path.join(self.tmpdir, 'a.mp3'), os.path.join(self.tmpdir, 'New', 'a.mp3'))])
+
+    def test_manage_storage_does_not_walk(self):
+        for i in range(3):
+            write(os.path.join(self.tmpdir, f'{i}.mp3'), 100)
+            os.utime(os.path.join(self.tmpdir, f'{i}.mp3'), (1000 + i, 1000 + i))
+        self.wait_for(lambda: len(self.songs()) == 3 and self.watcher.tree.stored_songs()[0][1] == 1000)
+        with patch('ymp.watcher._watcher', self.watcher), \
+                patch('ymp.config.get_music_dir', return_value=self.tmpdir), \
+                patch('ymp.config.is_permanent_mode', return_value=False), \
+                patch('ymp.config._stored_songs', side_effect=AssertionError("walked")), \
+                patch('ymp.config.check_disk_usage', side_effect=AssertionError("walked")):
+            with patch('ymp.config.get_config') as get_config, patch('builtins.print'):
+                get_config.return_value.getint.side_effect = lambda section, key: {'max_songs': 2, 'max_storage_mb': 1}[key]
+                config.manage_storage()
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir, '0.mp3'))) # The oldest
+        self.wait_for(lambda: self.songs() == ['1.mp3', '2.mp3'])
+
+if __name__ == '__main__':
+    unittest.main()
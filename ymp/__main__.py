@@ -1,35 +1,34 @@
 import warnings
-import ymp.downloader as downloader
-from ymp.playlistmanager import Playlist
-from ymp.player import wait
 import ymp.config as config
 
 
 import threading, argparse, json, sys, os
 import subprocess
-from urllib import request
 
-from pyfiglet import Figlet
 from colorama import init,deinit
 from termcolor import colored
 from ymp.lock import LockFile
-from ymp.tui import YmpTui
 
-musicplaylist = Playlist()
+# Heavy modules (yt-dlp, Textual, Rich, pyfiglet, MPRIS) are imported inside main()
+# once we know the player is actually started, so --version/--config stay fast.
+musicplaylist = None
 songavailable = threading.Event()
 
-dir_obj=downloader.makedownload()
-dir_path = dir_obj.name if hasattr(dir_obj, 'name') else dir_obj
+dir_obj = None
+dir_path = None
 
 
 def playspotify(link):
-    """Parses a Spotify playlist and adds the songs to the queue."""
-    spotifyplaylist=downloader.spotifyparser(link)
-    musicplaylist.queuedplaylist.extend(spotifyplaylist)
-    songavailable.set()
+    """Parses a Spotify playlist and adds the songs to the queue as they are fetched."""
+    import ymp.spotify as spotify
+    import ymp.tracks as tracks
+    for track in spotify.iter_tracks(link):
+        musicplaylist.queuedplaylist.append(tracks.of(track))
+        songavailable.set()
 
 def playyoutube(link):
     """Fetches info for a YouTube playlist/video and adds it to the queue."""
+    import ymp.downloader as downloader
     if "list=" in link:
         print("Fetching playlist info...")
         playlist_items = downloader.get_playlist_info(link)
@@ -45,23 +44,24 @@ def playyoutube(link):
 
 def saveplaylist(name):
     """Saves the current playlist to a JSON file."""
-    path = config.get_playlist_folder()
+    path = config.get_playlist_dir()
     if not os.path.exists(path):
         os.makedirs(path, exist_ok=True)
     filepath = os.path.join(path, f'{name}.json')
-    playlist_data = musicplaylist.returnplaylist()
+    playlist_data = [track.to_dict() for track in musicplaylist.returnplaylist()]
     with open(filepath, 'w', encoding='utf-8') as f:
         json.dump(playlist_data, f, ensure_ascii=False, indent=4)
     print(f"Playlist '{name}' successfully saved to {filepath}")
 
 def loadplaylist(name):
     """Loads a playlist from a JSON file."""
-    path = config.get_playlist_folder()
+    path = config.get_playlist_dir()
     filepath = os.path.join(path, f'{name}.json')
     try:
         with open(filepath, 'r', encoding='utf-8') as f:
             playlist_data = json.load(f)
-            musicplaylist.queuedplaylist.extend(playlist_data)
+            import ymp.tracks as tracks
+            musicplaylist.queuedplaylist.extend(tracks.of(entry) for entry in playlist_data)
             print(f"Successfully loaded playlist '{name}'")
             songavailable.set()
     except FileNotFoundError:
@@ -93,6 +93,7 @@ def save_local_commit(commit_hash):
 
 def check_for_updates():
     """Checks for updates on GitHub and offers to upgrade."""
+    from urllib import request
     print("Checking for updates...")
     try:
         # Get the latest commit hash from the master branch on GitHub
@@ -139,20 +140,55 @@ def check_for_updates():
     except Exception as e:
         print(colored(f"Could not check for updates: {e}", "red"))
 
-def main():
-    init()
-
-    # Ensure single instance
-    lock = LockFile(os.path.join(config.CONFIG_DIR, 'ymp.lock'))
-    if not lock.acquire():
-        print(colored("Error: YMP is already running.", "red"))
-        sys.exit(1)
-
-    f = Figlet(font='banner3-D')
-    print(" ")
-    print(colored(f.renderText('YMP'),'cyan'))
-    print("\t\t\t\t\t\t- by pheinze")
-
+def forwarded_items(args):
+    """The songs, URLs and playlists of the command line, as handed over to a running instance."""
+    items = []
+    if args.s:
+        items.append(args.s)
+    if args.y:
+        items.append(args.y)
+    if args.p:
+        items.extend(args.p)
+    elif args.query and not (args.s or args.y or args.l):
+        items.append(args.query)
+    if args.l:
+        filepath = os.path.join(config.get_playlist_dir(), f'{args.l}.json')
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                items.extend(json.load(f))
+        except (OSError, ValueError) as e:
+            print(colored(f"Error loading playlist: {e}", 'red'))
+    return items
+
+def forward_to_running(args):
+    """
+    Hands the command line over to the instance holding the lock.
+    Returns True if it was forwarded (or there was nothing to forward and we attached to a daemon).
+    Only the standard library is imported here, so this stays fast.
+    """
+    from ymp import ctl
+    running = ctl.ping()
+    if running is None:
+        return False
+    items = forwarded_items(args)
+    if not items:
+        if running.get('mode') != 'daemon' or args.daemon:
+            return False
+        # Playback is owned by a daemon, act as its remote control
+        from ymp.tui import AttachedTui
+        AttachedTui(ctl.Client()).run()
+        return True
+    try:
+        with ctl.Client() as client:
+            reply = client.request('enqueue', items=ctl.absolute_items(items))
+    except (OSError, ValueError, ctl.DaemonError) as e:
+        print(colored(f"Could not hand over to the running ymp: {e}", 'red'))
+        return False
+    print(colored(f"Added {len(items)} item(s) to the running ymp (pid {running.get('pid')}).", 'green'))
+    return True
+
+def build_parser():
+    """Builds the command line parser."""
     from . import __version__
     epilog_text = (
         'Thank you for using YMP! :)\n\n'
@@ -174,11 +210,28 @@ def main():
     parser.add_argument('--donate', action='store_true', help="Show donation information")
     parser.add_argument('--config', action='store_true', help="Configure YMP settings interactively")
     parser.add_argument('--manual', action='store_true', help="Show the detailed user manual")
+    parser.add_argument('--resume', action='store_true', help="Restore the last session (queue, history, position)")
+    parser.add_argument('--stats', action='store_true', help="Show runtime metrics (cache hit rate, downloads, latency)")
+    parser.add_argument('--analyze', action='store_true', help="Analyse loudness and silence of all songs in the music directory")
+    parser.add_argument('--dedupe', action='store_true', help="Collapse duplicate songs in the music directory")
+    parser.add_argument('--scan', action='store_true', help="Update the library index of the music directory (tags of new/changed songs)")
+    parser.add_argument('--offline', action='store_true', help="Play only songs stored on disk (cache and library), without network access")
+    parser.add_argument('--daemon', action='store_true', help="Run headless, controlled with `ymp ctl` or an attached TUI")
+    parser.add_argument('--trace', nargs='?', const='', metavar='file', help="Log where the time to first sound goes; optionally write a Chrome trace file")
     
     # Allow URL/Query without -p flag
     parser.add_argument('query', nargs='?', help="Directly play a URL or search query")
+    return parser
+
+def main():
+    global musicplaylist, dir_obj, dir_path
+    init()
 
-    args = parser.parse_args()
+    if sys.argv[1:2] == ['ctl']:
+        from ymp import ctl
+        sys.exit(ctl.main(sys.argv[2:]))
+
+    args = build_parser().parse_args()
 
     if args.manual:
         # Show manual (assuming MANUAL.md is in the package or we print a large text)
@@ -206,16 +259,12 @@ Run `ymp --config` to change settings.
 - `next`/`back`: Navigation
 - `seek [sec]`: Jump forward/backward
 
-## PLS Support
-You can play internet radio playlists (.pls) by passing the URL or file path.
+## Playlist Files
+You can play .pls (internet radio), .m3u/.m3u8 and .xspf playlists by passing the URL or file path.
         """
         console.print(Markdown(manual_text))
         sys.exit()
 
-    if args.download:
-        config.set_runtime_permanent_storage(True)
-        print(colored("Permanent Download Mode Enabled.", "blue"))
-
     if args.config:
         print(colored("--- YMP Configuration Wizard ---", "cyan"))
         current = config.get_config()
@@ -252,42 +301,105 @@ You can play internet radio playlists (.pls) by passing the URL or file path.
         check_for_updates()
         sys.exit()
 
+    if args.stats:
+        import ymp.metrics as metrics
+        path = config.get_metrics_file()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                samples = metrics.parse(f.read())
+        except (OSError, TypeError):
+            print(colored("No metrics recorded yet (enable them in the [Metrics] section of config.ini).", "yellow"))
+            sys.exit(1)
+        print(colored(f"--- YMP Stats ({path}) ---", "cyan"))
+        for line in metrics.report(samples):
+            print(line)
+        sys.exit()
+
+    if args.analyze:
+        import ymp.analysis as analysis
+        analysis.analyze_library()
+        sys.exit()
+
+    if args.dedupe:
+        import ymp.cacheindex as cacheindex
+        duplicates, saved = cacheindex.dedupe()
+        print(f"Collapsed {duplicates} duplicates, {saved / (1024 * 1024):.1f} MB freed.")
+        sys.exit()
+
+    if args.scan:
+        import ymp.library as library
+        start = time.perf_counter()
+        updated, removed = library.LIBRARY.refresh()
+        print(f"Library: {len(library.LIBRARY)} songs, {updated} updated, {removed} removed "
+              f"({time.perf_counter() - start:.2f}s).")
+        sys.exit()
+
+    # Ensure single instance
+    lock = LockFile(os.path.join(config.CONFIG_DIR, 'ymp.lock'))
+    if not lock.acquire():
+        if forward_to_running(args):
+            sys.exit()
+        pid = lock.holder()
+        print(colored(f"Error: YMP is already running{f' (pid {pid})' if pid else ''}.", "red"))
+        sys.exit(1)
+
+    if not args.daemon:
+        from pyfiglet import Figlet
+        f = Figlet(font='banner3-D')
+        print(" ")
+        print(colored(f.renderText('YMP'),'cyan'))
+        print("\t\t\t\t\t\t- by pheinze")
+
+    if args.download:
+        config.set_runtime_permanent_storage(True)
+        print(colored("Permanent Download Mode Enabled.", "blue"))
+
+    if args.offline:
+        import ymp.offline as offline
+        offline.force_offline()
+        print(colored("Offline Mode: playing from the cache and library only.", "blue"))
+
+    if args.trace is not None or config.is_tracing_enabled():
+        import ymp.tracing as tracing
+        tracing.enable(args.trace or config.get_trace_file())
+
+    import ymp.downloader as downloader
+    import ymp.session as session
+    from ymp.playlistmanager import Playlist
+
+    musicplaylist = Playlist()
+    dir_obj = downloader.makedownload()
+    dir_path = dir_obj.name if hasattr(dir_obj, 'name') else dir_obj
+
     # Handle 'query' positional argument as if it were -p
     if args.query and not (args.s or args.y or args.l or args.p):
         args.p = [args.query]
 
+    # Restore the last session before adding new songs behind it
+    resume = None
+    if args.resume:
+        snapshot = session.load_snapshot()
+        if snapshot:
+            resume = session.restore(musicplaylist, snapshot)
+            print(f"Restored session: {len(musicplaylist.queuedplaylist)} songs in queue.")
+        else:
+            print(colored("No saved session found.", "yellow"))
+
     # Pre-populate playlist if args exist
     initial_queue = []
     if args.s:
-        # Spotify parsing logic needs to run here or be passed
-        # Re-using playspotify logic but without threading events yet
-        print("Parsing Spotify...")
-        initial_queue.extend(downloader.spotifyparser(args.s))
+        # The TUI streams Spotify playlists into the queue in the background
+        initial_queue.append(args.s)
     if args.y:
-         if "list=" in args.y:
-             print("Fetching playlist info...")
-             items = downloader.get_playlist_info(args.y)
-             if items: initial_queue.extend(items)
-         else:
-             initial_queue.append(args.y)
+        # YouTube playlists are expanded by the player in the background, page by page
+        initial_queue.append(args.y)
     if args.p:
-        for songs in args.p:
-            if songs.endswith('.pls'):
-                 urls = downloader.parse_pls(songs)
-                 initial_queue.extend(urls)
-            elif "list=" in songs and ("http://" in songs or "https://" in songs):
-                print("Fetching playlist info...")
-                items = downloader.get_playlist_info(songs)
-                if items:
-                    initial_queue.extend(items)
-                else:
-                    initial_queue.append(songs)
-            else:
-                initial_queue.append(songs)
+        # So are playlist files
+        initial_queue.extend(args.p)
 
     if args.l:
         # Load playlist logic
-        path = config.get_playlist_folder()
+        path = config.get_playlist_dir()
         filepath = os.path.join(path, f'{args.l}.json')
         try:
             with open(filepath, 'r', encoding='utf-8') as f:
@@ -296,10 +408,41 @@ You can play internet radio playlists (.pls) by passing the URL or file path.
         except Exception as e:
             print(f"Error loading playlist: {e}")
 
-    # Launch TUI
+    saver = None
+    if config.is_session_enabled():
+        saver = session.SessionSaver(musicplaylist)
+        saver.start()
+
+    exporter = None
+    if config.is_metrics_enabled():
+        import ymp.metrics as metrics
+        exporter = metrics.MetricsExporter(config.get_metrics_file(), config.get_metrics_interval(), config.get_metrics_port())
+        exporter.start()
+
     import signal
+    if args.daemon:
+        from ymp.daemon import Daemon
+        daemon = Daemon(musicplaylist, dir_obj)
+        if saver: saver.on_error = lambda message: daemon.log_message(message, 'error')
+        signal.signal(signal.SIGINT, lambda sig, frame: daemon.shutdown())
+        signal.signal(signal.SIGTERM, lambda sig, frame: daemon.shutdown())
+        try:
+            daemon.run(initial_queue, resume)
+        except OSError as e:
+            print(colored(f"Error: could not start the control socket: {e}", "red"))
+        finally:
+            if saver: saver.stop()
+            if exporter: exporter.stop()
+            deinit()
+            downloader.removedownload(dir_obj)
+            lock.release()
+        sys.exit()
+
+    # Launch TUI
     def signal_handler(sig, frame):
         try:
+            if saver: saver.stop()
+            if exporter: exporter.stop()
             deinit()
             musicplaylist.stop_all()
             downloader.removedownload(dir_obj)
@@ -310,10 +453,16 @@ You can play internet radio playlists (.pls) by passing the URL or file path.
 
     signal.signal(signal.SIGINT, signal_handler)
 
-    app = YmpTui(playlist_manager=musicplaylist, download_dir=dir_obj, initial_queue=initial_queue)
+    from ymp.tui import YmpTui
+    app = YmpTui(playlist_manager=musicplaylist, download_dir=dir_obj, initial_queue=initial_queue, resume=resume)
+    if saver: saver.on_error = lambda message: app.log_message(message, 'error')
     try:
         app.run()
     finally:
+        if saver:
+            saver.on_error = None # The final save reports to the terminal again
+            saver.stop()
+        if exporter: exporter.stop()
         deinit()
         musicplaylist.stop_all()
         downloader.removedownload(dir_obj)
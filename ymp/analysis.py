@@ -0,0 +1,253 @@
+"""
+Loudness and silence analysis of cached songs.
+
+After a download, a low-priority background pass runs ffmpeg's ebur128 (EBU R128
+integrated loudness and true peak) and silencedetect filters over the file once and
+stores the results next to the cache (analysis.json). At play time the player only
+looks them up: it applies a ReplayGain-style gain towards the target loudness and
+skips leading/trailing silence, without decoding anything itself.
+`ymp --analyze` fills in the results for songs that were downloaded before.
+"""
+import json
+import os
+import queue
+import re
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import ymp.config as config
+
+ANALYSIS_FILE = os.path.join(config.CONFIG_DIR, 'analysis.json')
+
+SILENCE_THRESHOLD = '-50dB'
+SILENCE_MIN_SECONDS = 0.5
+SILENCE_PAD_SECONDS = 0.1 # Kept around trimmed silence, so fades are not cut
+MAX_PEAK_DB = -1.0 # The gain never pushes the true peak above this (dBTP)
+GAIN_RANGE_DB = (-20.0, 12.0)
+
+_INTEGRATED = re.compile(r'^\s*I:\s*(-?[\d.]+|-inf) LUFS', re.MULTILINE)
+_PEAK = re.compile(r'^\s*Peak:\s*(-?[\d.]+|-inf) dBFS', re.MULTILINE)
+_DURATION = re.compile(r'Duration: (\d+):(\d\d):(\d\d(?:\.\d+)?)')
+_SILENCE = re.compile(r'silence_(start|end): (-?[\d.]+)')
+
+def _number(text):
+    return float('-inf') if text == '-inf' else float(text)
+
+def parse_report(output):
+    """Loudness, peak, duration and silent ranges from ffmpeg's ebur128/silencedetect output."""
+    loudness = _INTEGRATED.findall(output)
+    peak = _PEAK.findall(output)
+    duration = _DURATION.search(output)
+    silences = []
+    for kind, value in _SILENCE.findall(output):
+        if kind == 'start':
+            silences.append([float(value), None])
+        elif silences and silences[-1][1] is None:
+            silences[-1][1] = float(value)
+    return {
+        # The summary comes last, after any per-segment values
+        'loudness': _number(loudness[-1]) if loudness else None,
+        'peak': _number(peak[-1]) if peak else None,
+        'duration': int(duration[1]) * 3600 + int(duration[2]) * 60 + float(duration[3]) if duration else None,
+        'silences': [tuple(s) for s in silences],
+    }
+
+def summarize(report, target=None):
+    """The stored analysis of a file: loudness/peak, the gain to apply and the audible range."""
+    target = config.get_target_loudness() if target is None else target
+    loudness, peak, duration = report['loudness'], report['peak'], report['duration']
+
+    gain = None
+    if loudness is not None and loudness != float('-inf'):
+        gain = target - loudness
+        if peak is not None and peak != float('-inf'):
+            gain = min(gain, MAX_PEAK_DB - peak)
+        gain = round(max(GAIN_RANGE_DB[0], min(GAIN_RANGE_DB[1], gain)), 2)
+
+    start, end = 0.0, None
+    for silence_start, silence_end in report['silences']:
+        if silence_start <= 0.05 and silence_end is not None:
+            start = max(0.0, silence_end - SILENCE_PAD_SECONDS)
+        elif duration and (silence_end is None or silence_end >= duration - 0.05):
+            end = min(duration, silence_start + SILENCE_PAD_SECONDS)
+    if end is not None and end <= start:
+        start, end = 0.0, None # Silent (or nearly) all the way: play it as it is
+
+    return {'loudness': loudness if loudness != float('-inf') else None, 'peak': peak if peak != float('-inf') else None,
+            'gain': gain, 'start': round(start, 2), 'end': round(end, 2) if end is not None else None,
+            'duration': duration}
+
+def _lower_priority(process):
+    """Moves the analysis below normal priority (preexec_fn is not safe with threads)."""
+    try:
+        os.setpriority(os.PRIO_PROCESS, process.pid, 10)
+    except (AttributeError, OSError):
+        pass
+
+def analyze(path):
+    """Runs ffmpeg over a file and returns its analysis (see summarize()), None if ffmpeg fails."""
+    cmd = ['ffmpeg', '-hide_banner', '-nostats', '-i', path,
+           '-af', f'ebur128=peak=true:framelog=verbose,silencedetect=noise={SILENCE_THRESHOLD}:d={SILENCE_MIN_SECONDS}',
+           '-f', 'null', '-']
+    kwargs = {'creationflags': subprocess.BELOW_NORMAL_PRIORITY_CLASS} if sys.platform == 'win32' else {}
+    try:
+        process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.PIPE, **kwargs)
+    except OSError:
+        return None
+    if sys.platform != 'win32':
+        _lower_priority(process)
+    _, output = process.communicate()
+    if process.returncode != 0:
+        return None
+    return summarize(parse_report(output.decode('utf-8', 'replace')))
+
+class AnalysisStore:
+    """Analysis results by file path, valid as long as the file keeps its size."""
+
+    def __init__(self, path=ANALYSIS_FILE):
+        self.path = path
+        self.entries = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self.entries is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+        return self.entries
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def get(self, filepath):
+        """The analysis of a file, or None if it was not analysed (or changed since)."""
+        key = os.path.abspath(filepath)
+        with self._lock:
+            entry = self._load().get(key)
+        try:
+            # Not the mtime: playing a cached song touches it (Smart Download LRU)
+            if entry and entry.get('size') == os.path.getsize(filepath):
+                return entry
+        except OSError:
+            pass
+        return None
+
+    def put(self, filepath, result):
+        entry = dict(result, size=os.path.getsize(filepath))
+        with self._lock:
+            self._load()[os.path.abspath(filepath)] = entry
+            self._save()
+
+    def rename(self, old, new):
+        """Keeps the analysis of a file that was moved."""
+        with self._lock:
+            entry = self._load().pop(os.path.abspath(old), None)
+            if entry is not None:
+                self.entries[os.path.abspath(new)] = entry
+                self._save()
+
+    def prune(self):
+        """Drops entries of files that no longer exist. Returns how many."""
+        with self._lock:
+            entries = self._load()
+            gone = [key for key in entries if not os.path.exists(key)]
+            for key in gone:
+                del entries[key]
+            if gone:
+                self._save()
+        return len(gone)
+
+STORE = AnalysisStore()
+
+class Analyzer:
+    """Analyses files one at a time on a background thread, in the order they were downloaded."""
+
+    def __init__(self, store=STORE):
+        self.store = store
+        self.queue = queue.Queue()
+        self.pending = set()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def schedule(self, filepath):
+        with self._lock:
+            if filepath in self.pending:
+                return
+            self.pending.add(filepath)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self.queue.put(filepath)
+
+    def _run(self):
+        while True:
+            filepath = self.queue.get()
+            try:
+                if os.path.exists(filepath) and self.store.get(filepath) is None:
+                    result = analyze(filepath)
+                    if result is not None:
+                        self.store.put(filepath, result)
+            except Exception:
+                pass # Analysis is an extra, never an error for playback
+            finally:
+                with self._lock:
+                    self.pending.discard(filepath)
+
+_analyzer = None
+
+def schedule(filepath):
+    """Queues a downloaded file for analysis (if enabled and not done yet)."""
+    global _analyzer
+    if not filepath or not config.is_analysis_enabled():
+        return
+    if _analyzer is None:
+        _analyzer = Analyzer()
+    _analyzer.schedule(filepath)
+
+def playback_options(filepath, store=STORE):
+    """
+    (gain_db, start_seconds, end_seconds) to play a file with, from its stored
+    analysis and the settings; (None, 0, None) when there is nothing to apply.
+    """
+    if not filepath or not config.is_analysis_enabled():
+        return None, 0, None
+    entry = store.get(filepath)
+    if not entry:
+        return None, 0, None
+    gain = entry.get('gain') if config.is_normalize_enabled() else None
+    if config.is_trim_silence_enabled():
+        return gain, entry.get('start') or 0, entry.get('end')
+    return gain, 0, None
+
+def analyze_library(music_dir=None, jobs=None, store=STORE):
+    """Analyses every song of the music directory that has no (valid) analysis yet."""
+    store.prune()
+    todo = [path for path in config.iter_music_files(music_dir) if store.get(path) is None]
+    if not todo:
+        print("All songs are analysed.")
+        return 0
+    jobs = jobs or max(1, (os.cpu_count() or 2) // 2)
+    print(f"Analysing {len(todo)} songs ({jobs} at a time)...")
+    done = failed = 0
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for path, result in zip(todo, executor.map(analyze, todo)):
+            if result is None:
+                failed += 1
+                print(f"  Failed: {os.path.basename(path)}")
+                continue
+            store.put(path, result)
+            done += 1
+            gain = f"{result['gain']:+.1f} dB" if result['gain'] is not None else "no gain"
+            print(f"  [{done + failed}/{len(todo)}] {os.path.basename(path)}: {gain}, "
+                  f"plays {result['start']:.1f}s-{result['end'] or result['duration'] or 0:.1f}s")
+    print(f"Analysed {done} songs" + (f", {failed} failed (is ffmpeg installed?)" if failed else "") + ".")
+    return done
@@ -0,0 +1,282 @@
+"""
+Content-addressed index of the music directory.
+
+Downloads are named after their title (cache mode: "Artist - Title", permanent mode:
+Artist/Album/Title), so the same video reached through another search, a title variant
+or a mode switch used to be stored again. The index maps each video ID to the file that
+holds it: download() looks the ID up before fetching and returns the stored file.
+
+`ymp --dedupe` collapses duplicates that are already on disk in one pass. Files are
+matched by video ID, or by a hash of their audio (tags excluded) when the ID is not
+known. Duplicates become hardlinks of the kept file, so every human-readable path keeps
+working without taking space; where hardlinks are not possible, the duplicate is removed
+and its path kept as an alias in the index.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from urllib.parse import parse_qs, urlparse
+
+import ymp.config as config
+
+INDEX_FILE = os.path.join(config.CONFIG_DIR, 'cache_index.json')
+
+# Only these keys of the (large) yt-dlp meta dict are kept for cache hits
+META_KEYS = ('id', 'title', 'artist', 'album', 'duration', 'webpage_url', 'thumbnail', 'quality')
+
+_VIDEO_ID = re.compile(r'^[A-Za-z0-9_-]{11}$')
+
+def video_id(link):
+    """The YouTube video ID of a watch/short/youtu.be URL, None for anything else."""
+    if not isinstance(link, str) or not link.startswith(('http://', 'https://')):
+        return None
+    url = urlparse(link)
+    host = url.netloc.lower().split(':')[0]
+    if host == 'youtu.be':
+        candidate = url.path.strip('/').split('/')[0]
+    elif host.endswith('youtube.com'):
+        if url.path == '/watch':
+            candidate = (parse_qs(url.query).get('v') or [''])[0]
+        elif url.path.startswith(('/shorts/', '/live/', '/embed/')):
+            candidate = url.path.split('/')[2]
+        else:
+            return None
+    else:
+        return None
+    return candidate if _VIDEO_ID.match(candidate) else None
+
+def audio_hash(path, block_size=1 << 20):
+    """
+    SHA-256 of an MP3's audio, without its ID3v2 header and ID3v1 trailer: two copies
+    of a song with different tags or embedded thumbnails hash the same.
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        start = 0
+        header = f.read(10)
+        if len(header) == 10 and header[:3] == b'ID3':
+            # Syncsafe size (7 bits per byte), plus the header and an optional footer
+            tag_size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+            start = 10 + tag_size + (10 if header[5] & 0x10 else 0)
+        end = size
+        if size >= 128:
+            f.seek(size - 128)
+            if f.read(3) == b'TAG':
+                end = size - 128
+        digest = hashlib.sha256()
+        f.seek(start)
+        remaining = max(0, end - start)
+        while remaining:
+            block = f.read(min(block_size, remaining))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest.hexdigest()
+
+def same_file(a, b):
+    try:
+        return os.path.samefile(a, b)
+    except OSError:
+        return False
+
+class CacheIndex:
+    """Video ID -> stored file (plus aliases of removed duplicates), persisted as JSON."""
+
+    def __init__(self, path=INDEX_FILE):
+        self.path = path
+        self.videos = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self.videos is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.videos = json.load(f).get('videos', {})
+            except (OSError, ValueError, AttributeError):
+                self.videos = {}
+        return self.videos
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'videos': self.videos}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def lookup(self, vid):
+        """(path, meta) of a stored video, or None if it is not stored (anymore)."""
+        if not vid:
+            return None
+        with self._lock:
+            entry = self._load().get(vid)
+        if entry and os.path.exists(entry['path']):
+            return entry['path'], dict(entry.get('meta') or {})
+        return None
+
+    def add(self, vid, path, meta=None):
+        """Records the file a video was downloaded to."""
+        if not vid or not path:
+            return
+        meta = {k: meta.get(k) for k in META_KEYS if meta and meta.get(k) is not None}
+        with self._lock:
+            entry = self._load().get(vid) or {}
+            entry['path'] = os.path.abspath(path)
+            entry['meta'] = meta or entry.get('meta') or {}
+            entry.setdefault('aliases', [])
+            self.videos[vid] = entry
+            self._save()
+
+    def entries(self):
+        """(video ID, path, meta) of all indexed videos."""
+        with self._lock:
+            return [(vid, entry['path'], dict(entry.get('meta') or {})) for vid, entry in self._load().items()]
+
+    def id_of(self, path):
+        """The video ID a file (or alias) is indexed under, or None."""
+        path = os.path.abspath(path)
+        with self._lock:
+            for vid, entry in self._load().items():
+                if entry['path'] == path or path in entry.get('aliases', ()):
+                    return vid
+        return None
+
+    def path_ids(self):
+        """{stored path or alias: video ID} for all indexed videos."""
+        with self._lock:
+            ids = {}
+            for vid, entry in self._load().items():
+                ids[entry['path']] = vid
+                for alias in entry.get('aliases', ()):
+                    ids[alias] = vid
+            return ids
+
+    def move(self, old, new):
+        """
+        After `old` was removed as a duplicate of `new`: videos stored as `old` now point
+        at `new`, and `old` is kept as an alias. Returns False if neither is indexed.
+        """
+        old, new = os.path.abspath(old), os.path.abspath(new)
+        with self._lock:
+            entries = [e for e in self._load().values() if e['path'] in (old, new)]
+            for entry in entries:
+                entry['path'] = new
+                if old not in entry.setdefault('aliases', []):
+                    entry['aliases'].append(old)
+            if entries:
+                self._save()
+        return bool(entries)
+
+    def rename(self, old, new):
+        """Follows a stored file that was renamed (by hand, see ymp.watcher)."""
+        old, new = os.path.abspath(old), os.path.abspath(new)
+        with self._lock:
+            entries = [e for e in self._load().values() if e['path'] == old]
+            for entry in entries:
+                entry['path'] = new
+            if entries:
+                self._save()
+
+    def locate(self, vid=None, path=None):
+        """
+        An existing file for a video ID and/or a (possibly removed) path: the path itself,
+        the stored file of its video, or None.
+        """
+        if path and os.path.exists(path):
+            return path
+        vid = vid or (self.id_of(path) if path else None)
+        hit = self.lookup(vid)
+        return hit[0] if hit else None
+
+INDEX = CacheIndex()
+
+def dedupe(music_dir=None, index=INDEX):
+    """
+    Collapses duplicate songs in the music directory in one pass.
+    Returns (duplicates, bytes_saved).
+    """
+    music_dir = music_dir or config.get_music_dir()
+
+    # Paths that are already hardlinks of each other are one file
+    inodes = {}
+    for path in config.iter_music_files(music_dir):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        inodes.setdefault((st.st_dev, st.st_ino), []).append(path)
+    files = [paths[0] for paths in inodes.values()]
+    print(f"Checking {len(files)} songs for duplicates...")
+
+    # Files sharing a video ID or an audio hash are copies of one song
+    ids = index.path_ids()
+    parent = {path: path for path in files}
+
+    def root(path):
+        while parent[path] != path:
+            parent[path] = parent[parent[path]]
+            path = parent[path]
+        return path
+
+    first = {}
+    for path in files:
+        keys = []
+        if os.path.abspath(path) in ids:
+            keys.append('id:' + ids[os.path.abspath(path)])
+        try:
+            keys.append('sha256:' + audio_hash(path))
+        except OSError:
+            pass
+        for key in keys:
+            if key in first:
+                parent[root(path)] = root(first[key])
+            else:
+                first[key] = path
+
+    groups = {}
+    for path in files:
+        groups.setdefault(root(path), []).append(path)
+
+    duplicates = saved = 0
+    for paths in groups.values():
+        if len(paths) < 2:
+            continue
+        keep = _pick(paths, ids)
+        for path in paths:
+            if path == keep:
+                continue
+            size = os.path.getsize(path)
+            how = _replace_with_link(path, keep, index)
+            if how:
+                duplicates += 1
+                saved += size
+                print(f"  {os.path.relpath(path, music_dir)} -> {how} of {os.path.relpath(keep, music_dir)}")
+    return duplicates, saved
+
+def _pick(paths, ids):
+    """The copy to keep: one the index points at, else the most recently used."""
+    indexed = [path for path in paths if os.path.abspath(path) in ids]
+    return max(indexed or paths, key=os.path.getmtime)
+
+def _replace_with_link(path, keep, index):
+    """Replaces a duplicate by a hardlink of `keep` (or removes it, keeping an alias)."""
+    import ymp.analysis as analysis
+    if analysis.STORE.get(keep) is None and analysis.STORE.get(path) is not None:
+        analysis.STORE.rename(path, keep) # Keep the analysis of the duplicate
+    tmp_path = path + '.ymp-link'
+    try:
+        os.link(keep, tmp_path)
+        os.replace(tmp_path, path)
+        return "hardlink"
+    except OSError:
+        pass
+    try:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        os.remove(path)
+    except OSError as e:
+        print(f"Error removing {path}: {e}")
+        return None
+    return "alias" if index.move(path, keep) else "removed duplicate"
@@ -0,0 +1,172 @@
+"""
+Multi-connection download of a single audio file, in HTTP range chunks.
+
+YouTube throttles each connection, so an hour-long mix fetched over yt-dlp's one
+connection takes minutes. download() fetches the format yt-dlp selected with
+several connections at once (`[Download] connections`), each taking the next
+chunk of `chunk_size_kb` until the file is complete, and yt-dlp then only runs
+its postprocessors on the finished file. Fragmented formats (DASH/HLS) are left to
+yt-dlp's own concurrent fragment downloads.
+
+Connections are capped per host across all downloads (the playing song and
+preloads), so they never open more than `max_connections_per_host` between them.
+Progress of all chunks is combined and reported to yt-dlp style progress hooks.
+"""
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+import ymp.config as config
+
+RETRIES = 3 # Attempts per chunk before the download fails
+TIMEOUT = 15
+
+_host_slots = {}
+_host_lock = threading.Lock()
+
+def host_slots(url):
+    """The semaphore limiting the connections to a URL's host."""
+    host = urlparse(url).netloc.lower()
+    with _host_lock:
+        if host not in _host_slots:
+            _host_slots[host] = threading.BoundedSemaphore(max(1, config.get_max_connections_per_host()))
+        return _host_slots[host]
+
+def can_fetch(info):
+    """True if yt-dlp selected a single plain HTTP(S) file (not fragments, not merged formats)."""
+    return (info.get('protocol') in ('http', 'https') and bool(info.get('url'))
+            and not info.get('requested_formats') and not info.get('fragments'))
+
+def probe_size(session, url, headers=None):
+    """The size of a file that can be fetched in ranges, or None if the server does not support it."""
+    with host_slots(url):
+        with session.get(url, headers=dict(headers or {}, Range='bytes=0-0'), timeout=TIMEOUT) as response:
+            content_range = response.headers.get('Content-Range', '')
+    total = content_range.rsplit('/', 1)[-1]
+    if response.status_code != 206 or not total.isdigit():
+        return None
+    return int(total)
+
+def chunks(size, chunk_size):
+    """(start, end) byte ranges (inclusive) covering `size` bytes."""
+    return [(start, min(start + chunk_size, size) - 1) for start in range(0, size, chunk_size)]
+
+class ChunkedDownload:
+    """Fetches one URL into a file with `connections` threads, chunk by chunk."""
+
+    def __init__(self, url, filename, connections=4, chunk_size=1 << 20, headers=None, size=None, hooks=()):
+        self.url = url
+        self.filename = filename
+        self.connections = max(1, connections)
+        self.chunk_size = max(64 * 1024, chunk_size)
+        self.headers = dict(headers or {})
+        self.size = size
+        self.hooks = list(hooks)
+        self.downloaded = 0
+        self.error = None
+        self._pending = []
+        self._lock = threading.Lock()
+        self._hook_lock = threading.Lock() # Hooks are called by one chunk at a time
+        self._started = None
+
+    def run(self):
+        """Downloads the file. Returns False if the server does not support ranges; raises on errors."""
+        import requests
+        if not self.size:
+            self.size = probe_size(requests.Session(), self.url, self.headers)
+        if not self.size:
+            return False
+
+        part = self.filename + '.ymp-part'
+        os.makedirs(os.path.dirname(os.path.abspath(part)), exist_ok=True)
+        with open(part, 'wb') as f:
+            f.truncate(self.size)
+        self._pending = chunks(self.size, self.chunk_size)
+        self._started = time.monotonic()
+        workers = [threading.Thread(target=self._work, args=(part,), daemon=True)
+                   for _ in range(min(self.connections, len(self._pending)))]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        if self.error is not None:
+            os.remove(part)
+            raise self.error
+        os.replace(part, self.filename)
+        self._report('finished')
+        return True
+
+    def _work(self, part):
+        import requests
+        session = requests.Session()
+        with open(part, 'r+b') as f:
+            while True:
+                with self._lock:
+                    if not self._pending or self.error is not None:
+                        return
+                    start, end = self._pending.pop(0)
+                position = [start] # A retry continues where the chunk broke off
+                for attempt in range(RETRIES):
+                    try:
+                        self._fetch(session, f, position, end)
+                        break
+                    except (OSError, requests.RequestException, ValueError) as e:
+                        if attempt == RETRIES - 1:
+                            with self._lock:
+                                self.error = self.error or e
+                            return
+
+    def _fetch(self, session, f, position, end):
+        with host_slots(self.url):
+            headers = dict(self.headers, Range=f'bytes={position[0]}-{end}')
+            with session.get(self.url, headers=headers, stream=True, timeout=TIMEOUT) as response:
+                if response.status_code != 206:
+                    raise ValueError(f"Range request answered with {response.status_code}")
+                for block in response.iter_content(64 * 1024):
+                    f.seek(position[0])
+                    f.write(block)
+                    position[0] += len(block)
+                    with self._lock:
+                        self.downloaded += len(block)
+                    self._report('downloading')
+                if position[0] != end + 1:
+                    raise ValueError("Chunk ended early")
+
+    def _report(self, status):
+        """Combined progress of all chunks, in the format of yt-dlp's progress hooks."""
+        elapsed = time.monotonic() - self._started
+        with self._lock:
+            downloaded = self.downloaded
+        progress = {
+            'status': status,
+            'filename': self.filename,
+            'downloaded_bytes': downloaded,
+            'total_bytes': self.size,
+            'elapsed': elapsed,
+            'speed': downloaded / elapsed if elapsed > 0 else None,
+            'connections': self.connections, # ymp.quality measures per connection
+            'eta': (self.size - downloaded) / (downloaded / elapsed) if downloaded and elapsed > 0 else None,
+        }
+        with self._hook_lock:
+            for hook in self.hooks:
+                hook(progress)
+
+def fetch(info, filename, hooks=()):
+    """
+    Downloads the format yt-dlp selected in `info` to `filename` over several connections.
+    Returns True on success, False if it should be left to yt-dlp (one connection
+    configured, no range support, or the download failed).
+    """
+    connections = config.get_download_connections()
+    if connections <= 1 or not can_fetch(info):
+        return False
+    download = ChunkedDownload(info['url'], filename, connections=connections,
+                               chunk_size=config.get_download_chunk_size(),
+                               headers=info.get('http_headers'), size=info.get('filesize'), hooks=hooks)
+    try:
+        return download.run()
+    except Exception as e:
+        print(f"Parallel download failed ({e}), retrying with one connection...")
+        return False
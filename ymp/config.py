@@ -2,6 +2,8 @@ import configparser
 import os
 import shutil
 
+import ymp.metrics as metrics
+
 CONFIG_DIR = os.path.expanduser('~/.config/ymp')
 CONFIG_FILE = os.path.join(CONFIG_DIR, 'config.ini')
 
@@ -17,6 +19,75 @@ DEFAULT_CONFIG = {
         'max_storage_mb': '0', # 0 = unlimited/disabled
         'preload_enabled': 'True',
         'preload_trigger_seconds': '10', # Start loading next song when current song > 10s played
+    },
+    'Download': {
+        'connections': '4', # Parallel connections per download (ranges/fragments), 1 = a single connection
+        'chunk_size_kb': '1024', # Size of the ranges fetched per request
+        'max_connections_per_host': '8', # Shared by all running downloads (playing song and preloads)
+    },
+    'Quality': {
+        'adaptive': 'True', # Pick the audio format by the measured bandwidth (low bitrate on poor links)
+        'upgrade': 'True', # Download songs cached at a lower quality again once the link allows (idle time)
+    },
+    'Watcher': {
+        'enabled': 'True', # Keep track of the music directory with inotify (Linux) instead of walking it
+        'reconcile_minutes': '10', # Full rescan catching anything the watcher missed
+    },
+    'Network': {
+        'offline': 'auto', # auto: detect a lost connection; on: always play from disk; off: never assume offline
+        'probe_host': 'www.youtube.com', # Connectivity is probed with a TCP connection to this host
+        'recheck_seconds': '10', # How often the connection is probed while offline
+        'offline_queue': 'defer', # Songs with no local copy while offline: defer (queue again later) or skip
+    },
+    'Library': {
+        'scan_on_start': 'True', # Index new/changed songs of the music directory at startup (tags only)
+    },
+    'Search': {
+        'results': '8', # Results shown in the TUI search panel
+        'debounce_ms': '300', # Typing pause before a search is sent
+        'cache_entries': '500', # Queries kept in the result cache
+        'cache_days': '7', # Cached results older than this are searched again
+    },
+    'Session': {
+        'enabled': 'True',
+        'snapshot_interval_seconds': '5', # How often the queue/position snapshot is written
+    },
+    'Tracing': {
+        'enabled': 'False', # Log a time-to-first-sound breakdown for every track
+        'trace_file': '', # Optional Chrome trace (chrome://tracing / Perfetto) output path
+    },
+    'Radio': {
+        'probe_timeout_seconds': '5', # How long a radio mirror may take to connect and send audio
+        'stall_timeout_seconds': '10', # A stream that sends nothing for this long counts as dropped
+        'buffer_kb': '128', # Read-ahead kept between live streams and playback: bridges outages, delays the start
+        'max_reconnects': '5', # Reconnect attempts (with backoff) before a mirror counts as failed
+        'timeshift_minutes': '30', # Radio kept on disk for pause/rewind, 0 = disabled
+    },
+    'Analysis': {
+        'enabled': 'True', # Analyse loudness/silence of downloaded songs in the background
+        'normalize': 'True', # Play songs at the same loudness (ReplayGain-style)
+        'target_lufs': '-18', # Loudness songs are normalized to (ReplayGain 2.0 reference)
+        'trim_silence': 'True', # Skip leading/trailing silence
+    },
+    'Thumbnails': {
+        'enabled': 'True', # Fetch artwork once per video (MPRIS art, embedding)
+        'size': '300', # Longest side of cached thumbnails, in pixels
+        'max_cache_mb': '20', # Least recently used thumbnails are removed beyond this
+        'embed': 'idle', # Artwork in cached songs: idle (in the background), download (right away) or off
+    },
+    'Log': {
+        'level': 'info', # Lowest level shown in the log view: debug, info, warning or error
+        'lines': '500', # Log lines kept in memory (log view, attached TUIs)
+        'file': '', # Optional JSON lines log file, e.g. ~/.config/ymp/ymp.jsonl
+        'file_level': 'debug', # Lowest level written to the file
+        'max_file_kb': '1024', # The file is rotated at this size
+        'backups': '3', # Rotated files kept
+    },
+    'Metrics': {
+        'enabled': 'True', # Export runtime metrics (they are always collected)
+        'textfile': os.path.join(CONFIG_DIR, 'metrics.prom'), # Prometheus text format, read by `ymp --stats`
+        'write_interval_seconds': '15',
+        'http_port': '0', # Serve /metrics on 127.0.0.1:<port>, 0 = disabled
     }
 }
 
@@ -85,17 +156,195 @@ def is_preload_enabled():
 def get_preload_trigger():
     return get_config().getint('SmartDownload', 'preload_trigger_seconds')
 
+def get_download_connections():
+    return get_config().getint('Download', 'connections')
+
+def get_download_chunk_size():
+    return get_config().getint('Download', 'chunk_size_kb') * 1024
+
+def get_max_connections_per_host():
+    return get_config().getint('Download', 'max_connections_per_host')
+
+def is_adaptive_quality_enabled():
+    return get_config().getboolean('Quality', 'adaptive')
+
+def is_quality_upgrade_enabled():
+    return get_config().getboolean('Quality', 'upgrade')
+
+def is_watcher_enabled():
+    return get_config().getboolean('Watcher', 'enabled')
+
+def get_reconcile_minutes():
+    return max(1, get_config().getint('Watcher', 'reconcile_minutes'))
+
+def get_offline_mode():
+    value = get_config().get('Network', 'offline').strip().lower()
+    return value if value in ('auto', 'on', 'off') else 'auto'
+
+def get_probe_host():
+    return get_config().get('Network', 'probe_host').strip()
+
+def get_offline_recheck_seconds():
+    return max(1, get_config().getint('Network', 'recheck_seconds'))
+
+def get_offline_queue():
+    value = get_config().get('Network', 'offline_queue').strip().lower()
+    return value if value in ('defer', 'skip') else 'defer'
+
+def is_library_scan_enabled():
+    return get_config().getboolean('Library', 'scan_on_start')
+
+def get_search_results():
+    return max(1, get_config().getint('Search', 'results'))
+
+def get_search_debounce():
+    return get_config().getint('Search', 'debounce_ms') / 1000
+
+def get_search_cache_entries():
+    return get_config().getint('Search', 'cache_entries')
+
+def get_search_cache_days():
+    return get_config().getfloat('Search', 'cache_days')
+
+def is_session_enabled():
+    return get_config().getboolean('Session', 'enabled')
+
+def get_session_interval():
+    return get_config().getint('Session', 'snapshot_interval_seconds')
+
+def is_tracing_enabled():
+    return get_config().getboolean('Tracing', 'enabled')
+
+def get_trace_file():
+    path = get_config().get('Tracing', 'trace_file').strip()
+    return os.path.expanduser(path) if path else None
+
+def get_radio_probe_timeout():
+    return get_config().getfloat('Radio', 'probe_timeout_seconds')
+
+def get_radio_stall_timeout():
+    return get_config().getfloat('Radio', 'stall_timeout_seconds')
+
+def get_stream_buffer_kb():
+    return get_config().getint('Radio', 'buffer_kb')
+
+def get_stream_max_reconnects():
+    return get_config().getint('Radio', 'max_reconnects')
+
+def get_timeshift_minutes():
+    return get_config().getfloat('Radio', 'timeshift_minutes')
+
+def is_analysis_enabled():
+    return get_config().getboolean('Analysis', 'enabled')
+
+def is_normalize_enabled():
+    return get_config().getboolean('Analysis', 'normalize')
+
+def get_target_loudness():
+    return get_config().getfloat('Analysis', 'target_lufs')
+
+def is_trim_silence_enabled():
+    return get_config().getboolean('Analysis', 'trim_silence')
+
+def is_thumbnails_enabled():
+    return get_config().getboolean('Thumbnails', 'enabled')
+
+def get_thumbnail_size():
+    return get_config().getint('Thumbnails', 'size')
+
+def get_thumbnail_cache_mb():
+    return get_config().getfloat('Thumbnails', 'max_cache_mb')
+
+def get_thumbnail_embed():
+    mode = get_config().get('Thumbnails', 'embed').strip().lower()
+    return mode if mode in ('idle', 'download', 'off') else 'idle'
+
+def get_log_level():
+    return get_config().get('Log', 'level').strip().lower()
+
+def get_log_lines():
+    return get_config().getint('Log', 'lines')
+
+def get_log_file():
+    path = get_config().get('Log', 'file').strip()
+    return os.path.expanduser(path) if path else None
+
+def get_log_file_level():
+    return get_config().get('Log', 'file_level').strip().lower()
+
+def get_log_max_file_kb():
+    return get_config().getint('Log', 'max_file_kb')
+
+def get_log_backups():
+    return get_config().getint('Log', 'backups')
+
+def is_metrics_enabled():
+    return get_config().getboolean('Metrics', 'enabled')
+
+def get_metrics_file():
+    path = get_config().get('Metrics', 'textfile').strip()
+    return os.path.expanduser(path) if path else None
+
+def get_metrics_interval():
+    return get_config().getint('Metrics', 'write_interval_seconds')
+
+def get_metrics_port():
+    return get_config().getint('Metrics', 'http_port')
+
+def iter_music_files(music_dir=None):
+    """Paths of all songs (.mp3) in the music directory, nested directories included."""
+    for dirpath, _, filenames in os.walk(music_dir or get_music_dir()):
+        for f in filenames:
+            if f.endswith('.mp3'):
+                yield os.path.join(dirpath, f)
+
 def check_disk_usage(path):
-    """Returns used disk space in MB for a directory."""
+    """Returns used disk space in MB for a directory (hardlinked files count once)."""
     total_size = 0
     if not os.path.exists(path):
         return 0
+    seen = set()
     for dirpath, dirnames, filenames in os.walk(path):
         for f in filenames:
-            fp = os.path.join(dirpath, f)
-            total_size += os.path.getsize(fp)
+            st = os.stat(os.path.join(dirpath, f))
+            if (st.st_dev, st.st_ino) in seen:
+                continue
+            seen.add((st.st_dev, st.st_ino))
+            total_size += st.st_size
     return total_size / (1024 * 1024)
 
+def _stored_songs(music_dir):
+    """
+    Songs in the music directory as (paths, mtime, size), oldest first. The paths of a
+    song are hardlinks of one file (see ymp.cacheindex), evicting it removes all of them.
+    """
+    songs = {}
+    for path in iter_music_files(music_dir):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        paths, mtime, size = songs.get((st.st_dev, st.st_ino), ([], 0, st.st_size))
+        songs[(st.st_dev, st.st_ino)] = (paths + [path], max(mtime, st.st_mtime), size)
+    # Sort by modification time (oldest first): playing a song touches it, so this is LRU
+    return sorted(songs.values(), key=lambda song: song[1])
+
+def _watched_tree(music_dir):
+    """The music directory as ymp.watcher keeps it current, or None (walk it instead)."""
+    import ymp.watcher as watcher
+    return watcher.current(music_dir)
+
+def _evict(paths, reason, message):
+    print(f"[SmartDownload] {message}{os.path.basename(paths[0])}")
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"Error deleting {path}: {e}")
+            return False
+    metrics.EVICTIONS.inc(reason=reason)
+    return True
+
 def manage_storage():
     """Enforces Smart Download limits (max songs / max storage)."""
     if is_permanent_mode():
@@ -109,35 +358,19 @@ def manage_storage():
     max_songs = config.getint('SmartDownload', 'max_songs')
     max_mb = config.getint('SmartDownload', 'max_storage_mb')
 
-    # Recursively find mp3 files to handle nested directories
-    files = []
-    for dirpath, _, filenames in os.walk(music_dir):
-        for f in filenames:
-            if f.endswith('.mp3'):
-                files.append(os.path.join(dirpath, f))
-    # Sort by creation time (oldest first) - though access time might be better for cache?
-    # Using modification time as proxy for "downloaded time"
-    files.sort(key=os.path.getmtime)
+    tree = _watched_tree(music_dir)
+    songs = tree.stored_songs() if tree else _stored_songs(music_dir)
 
     # 1. Check Song Count
     if max_songs > 0:
-        while len(files) > max_songs:
-            oldest = files.pop(0)
-            try:
-                print(f"[SmartDownload] Removing old song: {os.path.basename(oldest)}")
-                os.remove(oldest)
-            except OSError as e:
-                print(f"Error deleting {oldest}: {e}")
+        while len(songs) > max_songs:
+            paths, _, _ = songs.pop(0)
+            _evict(paths, 'count', "Removing old song: ")
 
     # 2. Check Storage Size (only if songs limit didn't clear enough)
     if max_mb > 0:
-        current_mb = check_disk_usage(music_dir)
-        while current_mb > max_mb and files:
-            oldest = files.pop(0)
-            size_mb = os.path.getsize(oldest) / (1024 * 1024)
-            try:
-                print(f"[SmartDownload] Storage limit exceeded. Removing: {os.path.basename(oldest)}")
-                os.remove(oldest)
-                current_mb -= size_mb
-            except OSError as e:
-                print(f"Error deleting {oldest}: {e}")
+        current_mb = tree.usage_mb() if tree else check_disk_usage(music_dir)
+        while current_mb > max_mb and songs:
+            paths, _, size = songs.pop(0)
+            if _evict(paths, 'size', "Storage limit exceeded. Removing: "):
+                current_mb -= size / (1024 * 1024)
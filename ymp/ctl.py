@@ -0,0 +1,160 @@
+"""
+Client for the control socket of a running ymp (see ymp.daemon).
+
+The protocol is one JSON object per line in both directions:
+    {"cmd": "enqueue", "items": ["song"]}  ->  {"ok": true, "queued": 1}
+Errors come back as {"ok": false, "error": "..."}.
+
+This module is imported by `ymp ctl`, so it only uses the standard library.
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+
+import ymp.config as config
+
+SOCKET_PATH = os.path.join(config.CONFIG_DIR, 'ymp.sock')
+
+class DaemonError(Exception):
+    """The daemon answered a command with an error."""
+
+class Client:
+    def __init__(self, path=SOCKET_PATH, timeout=5):
+        self.path = path
+        self.timeout = timeout
+        self.sock = None
+        self.reader = None
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+        self.reader = sock.makefile('rb')
+
+    def request(self, cmd, **args):
+        """Sends one command and returns the decoded reply. Raises OSError if the daemon is gone."""
+        if self.sock is None:
+            self.connect()
+        args['cmd'] = cmd
+        try:
+            self.sock.sendall(json.dumps(args).encode('utf-8') + b'\n')
+            line = self.reader.readline()
+        except OSError:
+            self.close()
+            raise
+        if not line:
+            self.close()
+            raise ConnectionError("Connection closed by ymp")
+        reply = json.loads(line)
+        if not reply.get('ok'):
+            raise DaemonError(reply.get('error', 'Unknown error'))
+        return reply
+
+    def close(self):
+        if self.sock:
+            self.reader.close()
+            self.sock.close()
+            self.sock = None
+            self.reader = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def ping(path=SOCKET_PATH):
+    """Returns the running instance's ping reply ({'pid', 'mode'}) or None if nothing answers."""
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(path):
+        return None
+    try:
+        with Client(path, timeout=1) as client:
+            return client.request('ping')
+    except (OSError, ValueError, DaemonError):
+        return None
+
+def is_running(path=SOCKET_PATH):
+    """Returns True if a ymp instance answers on the control socket."""
+    return ping(path) is not None
+
+def absolute_items(items):
+    """Makes local files (PLS, audio) absolute, the running instance has another working directory."""
+    return [os.path.abspath(item) if isinstance(item, str) and os.path.exists(item) else item for item in items]
+
+def format_time(seconds):
+    seconds = int(seconds or 0)
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+def entry_title(entry):
+    """Display name of a queue entry (a track's to_dict(), or a string from older versions)."""
+    if isinstance(entry, dict):
+        return entry.get('title') or entry.get('url') or 'Unknown'
+    return str(entry)
+
+def print_status(status):
+    if not status.get('title'):
+        state = "Loading..." if status.get('loading') else "Idle"
+        print(f"{state} ({status['queue_length']} queued)")
+        return
+    state = "Paused" if status['paused'] else "Playing"
+    artist = f" - {status['artist']}" if status.get('artist') else ""
+    print(f"{state}: {status['title']}{artist}")
+    print(f"  {format_time(status['position'])} / {format_time(status['duration'])}, {status['queue_length']} queued")
+    stream = status.get('stream')
+    if stream:
+        print(f"  Stream {stream['state']}: {stream['outages']} outages, {stream['reconnects']} reconnects, "
+              f"{format_time(stream['behind'])} behind live, {format_time(stream['window'])} recorded")
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='ymp ctl', description='Control a running ymp instance')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('status', help="Show the current song")
+    commands.add_parser('queue', help="List the queue")
+    add = commands.add_parser('enqueue', aliases=['add'], help="Add songs, URLs or playlists to the queue")
+    add.add_argument('items', nargs='+')
+    add.add_argument('--next', action='store_true', help="Play them next instead of at the end")
+    commands.add_parser('next', help="Skip to the next song")
+    commands.add_parser('prev', help="Go back to the previous song")
+    commands.add_parser('pause', help="Toggle play/pause")
+    seek = commands.add_parser('seek', help="Seek by a number of seconds (negative = back)")
+    seek.add_argument('seconds', type=float)
+    commands.add_parser('shuffle', help="Shuffle the queue")
+    commands.add_parser('stop', help="Stop playback and shut the daemon down")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    command = {'add': 'enqueue'}.get(args.command, args.command)
+    request = {}
+    if command == 'enqueue':
+        request = {'items': absolute_items(args.items), 'front': args.next}
+    elif command == 'seek':
+        request = {'seconds': args.seconds}
+
+    try:
+        with Client() as client:
+            reply = client.request(command, **request)
+    except DaemonError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    except (OSError, ValueError):
+        print("Error: ymp is not running (start it with `ymp --daemon`).", file=sys.stderr)
+        return 1
+
+    if command == 'status':
+        print_status(reply)
+    elif command == 'queue':
+        for index, entry in enumerate(reply['queue'], 1):
+            print(f"{index:>4}. {entry_title(entry)}")
+        if not reply['queue']:
+            print("Queue is empty.")
+    elif reply.get('message'):
+        print(reply['message'])
+    return 0
@@ -0,0 +1,500 @@
+"""
+Headless mode: `ymp --daemon` runs the queue and the player without Textual, the banner
+or MPRIS, and is controlled through a Unix socket (see ymp.ctl for the protocol and client).
+"""
+import json
+import os
+import socketserver
+import threading
+import time
+
+import ymp.config as config
+import ymp.downloader as downloader
+import ymp.spotify as spotify
+import ymp.radio as radio
+import ymp.playlists as playlists
+import ymp.cacheindex as cacheindex
+import ymp.tracing as tracing
+import ymp.metrics as metrics
+import ymp.logbook as logbook
+import ymp.library as library
+import ymp.offline as offline
+import ymp.watcher as watcher
+import ymp.tracks as tracks
+from ymp.ctl import SOCKET_PATH, DaemonError, is_running
+
+# Log lines kept for `status` (attached TUIs fetch the ones they have not seen yet)
+LOG_LINES = 200
+# Queue entries sent along with `status` when asked for, enough to fill the queue view
+QUEUE_PREVIEW = 100
+
+class ControlServer:
+    """
+    Accepts connections on the control socket and dispatches every command line
+    to target.cmd_<name>(**arguments), which returns a dict merged into the reply.
+    """
+
+    def __init__(self, target, path=SOCKET_PATH):
+        self.target = target
+        self.path = path
+        self.server = None
+
+    def start(self):
+        if os.path.exists(self.path):
+            if is_running(self.path):
+                raise OSError(f"Another ymp is already listening on {self.path}")
+            os.unlink(self.path) # Left behind by a crashed instance
+
+        dispatch = self.dispatch
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    try:
+                        request = json.loads(line)
+                        if not isinstance(request, dict):
+                            raise ValueError("Expected a JSON object")
+                        reply = dispatch(request)
+                    except ValueError as e:
+                        reply = {'ok': False, 'error': f"Bad request: {e}"}
+                    self.wfile.write(json.dumps(reply, default=str).encode('utf-8') + b'\n')
+                    self.wfile.flush()
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        old_umask = os.umask(0o077) # Only our user may control the player
+        try:
+            self.server = socketserver.ThreadingUnixStreamServer(self.path, Handler)
+        finally:
+            os.umask(old_umask)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def dispatch(self, request):
+        name = request.pop('cmd', None)
+        handler = getattr(self.target, f'cmd_{name}', None) if isinstance(name, str) else None
+        if handler is None:
+            return {'ok': False, 'error': f"Unknown command: {name}"}
+        try:
+            result = handler(**request) or {}
+        except TypeError as e:
+            return {'ok': False, 'error': f"Bad arguments for {name}: {e}"}
+        except Exception as e:
+            return {'ok': False, 'error': str(e)}
+        return dict(result, ok=True)
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+class Daemon:
+    """The queue/playback loop of the TUI without Textual, driven by control commands."""
+
+    def __init__(self, playlist, download_dir, path=SOCKET_PATH):
+        self.playlist = playlist
+        self.playlist.enable_rich_ui = False
+        self.playlist.on_stream_event = self.log_message
+        self.download_dir = download_dir
+        self.dir_path = download_dir.name if hasattr(download_dir, 'name') else download_dir
+        self.lock = threading.RLock() # Guards the playlist against the loop, workers and commands
+        self.log = logbook.from_config(lines=LOG_LINES)
+        self.is_loading = False
+        self.last_exit = None
+        self.stopped = threading.Event()
+        self.server = ControlServer(self, path)
+
+    def log_message(self, msg, level='info'):
+        self.log.add(msg, level)
+        print(f"[{time.strftime('%H:%M:%S')}] {msg}", flush=True)
+
+    def run(self, initial_queue=(), resume=None):
+        """Serves the control socket and plays until `stop` (or shutdown()) is received."""
+        self.server.start()
+        self.log_message(f"YMP daemon listening on {self.server.path}")
+        self.check_for_playlists() # Links of a restored session
+        if initial_queue:
+            self.enqueue(initial_queue)
+        if resume:
+            self.resume_playback(resume)
+        if config.is_library_scan_enabled():
+            threading.Thread(target=self.refresh_library, daemon=True).start()
+        offline.on_change(self.connectivity_changed)
+        threading.Thread(target=watcher.start, daemon=True).start()
+        try:
+            self.player_loop()
+        finally:
+            self.server.stop()
+            self.playlist.stop_all()
+            watcher.stop()
+            self.log.close()
+
+    def refresh_library(self):
+        updated, removed = library.LIBRARY.refresh()
+        self.log_message(f"Library: {len(library.LIBRARY)} songs ({updated} updated, {removed} removed)", 'debug')
+
+    def shutdown(self):
+        self.stopped.set()
+
+    # --- Playback (mirrors YmpTui's player loop) ---
+
+    def player_loop(self):
+        while not self.stopped.wait(0.5):
+            failover = None
+            with self.lock:
+                playobj = self.playlist.playobj
+                if playobj and not playobj.is_playing() and not self.playlist.songpaused:
+                    failover = self.song_finished()
+                elif not playobj and not self.playlist.songpaused and self.playlist.has_next() and not self.is_loading:
+                    self.is_loading = True
+                    threading.Thread(target=self.start_next_song, daemon=True).start()
+                else:
+                    self.playlist.update_playback_progress() # Preload trigger
+            if failover:
+                self.fail_over(*failover)
+
+    def song_finished(self):
+        """
+        Called with the lock held. Returns (station, mirror) when a dropped radio station
+        is to be restarted, which player_loop does after releasing the lock (see fail_over).
+        """
+        station = self.playlist.station
+        if station:
+            # A radio stream never finishes on its own: the mirror dropped or stalled
+            url = station.next_mirror()
+            if url:
+                return station, url
+            self.playlist.station = None
+            self.log_message(f"All mirrors of {station.title} failed.", 'error')
+        self.log_message("Song finished.")
+        if self.playlist.repeat == 2:
+            self.playlist.shiftlastplayedsong()
+        elif self.playlist.repeat == 1:
+            self.playlist.loopqueue()
+        self.last_exit = getattr(self.playlist.playobj, 'exited_at', None)
+        self.playlist.mark_finished(self.last_exit)
+        self.playlist.playobj = None
+        return None
+
+    def fail_over(self, station, url):
+        """
+        Restarts a dropped station on its next mirror. The mirror is connected without the
+        lock, so control commands are not held up by the network. The player is swapped
+        under it, and only if the station was not skipped or stopped meanwhile.
+        """
+        self.log_message(f"Stream dropped, switching to {station.label()}")
+        relay = self.playlist.connect_stream(url)
+        with self.lock:
+            if self.playlist.station is not station:
+                # Skipped or stopped meanwhile: the loop moves on
+                if relay:
+                    relay.close()
+                return
+            self.playlist.filepath = url
+            if self.playlist.songpaused:
+                # Paused meanwhile: resuming plays the new mirror
+                self.playlist.open_stream(relay)
+                return
+            self.playlist.playsong(self.playlist.meta, None, relay=relay)
+
+    def start_next_song(self):
+        trace = tracing.begin_track(since=self.last_exit, on_finish=self.log_message)
+        self.last_exit = None
+        try:
+            with trace.activate():
+                self.play_next(trace)
+        except Exception as e:
+            self.log_message(f"Error starting song: {e}", 'error')
+        finally:
+            self.is_loading = False
+
+    def play_next(self, trace):
+        with self.lock, tracing.span('queue_pop'):
+            song = self.playlist.returnsong()
+        if song is None:
+            return
+        trace.set_label(song)
+
+        entry = self.playlist.playedplaylist[-1] if self.playlist.playedplaylist else None
+        if radio.is_station(entry):
+            station = radio.Station(entry)
+            self.log_message(f"Connecting to {station.title} ({len(station.mirrors)} mirrors)...")
+            with tracing.span('resolve', station=station.title):
+                url = station.race()
+            if not url:
+                self.log_message(f"No mirror of {station.title} is reachable.", 'error')
+                return
+            with self.lock:
+                self.playlist.trace = trace
+                self.playlist.play_station(station, url)
+            self.log_message(f"Playing {station.label()}")
+            return
+        local = playlists.local_meta(entry)
+        if local:
+            with self.lock:
+                self.playlist.trace = trace
+                self.playlist.filepath = song
+                self.playlist.playsong(local, None)
+            self.log_message(f"Playing: {local['title']}")
+            return
+
+        if not offline.is_online(wait=True):
+            self.play_offline(entry, song, trace)
+            return
+
+        self.log_message(f"Fetching info for: {song}...", 'debug')
+
+        meta, stream_url = downloader.extract_stream_info(song)
+        if meta and stream_url:
+            with self.lock:
+                self.playlist.mark_resolved(meta)
+                self.playlist.trace = trace
+                self.playlist.filepath = stream_url
+                self.playlist.playsong(meta, None)
+            self.log_message(f"Playing: {meta.get('title')}")
+            threading.Thread(target=self.background_cache, args=(meta.get('webpage_url') or song,), daemon=True).start()
+            return
+
+        if not offline.note_failure():
+            self.play_offline(entry, song, trace)
+            return
+        self.log_message("Stream info failed, falling back to download...", 'warning')
+        meta, filepath = downloader.download(song, self.dir_path, lookup='play')
+        if not meta:
+            self.log_message(f"Failed to download {song}", 'error')
+            return
+        with self.lock:
+            self.playlist.mark_resolved(meta)
+            self.playlist.trace = trace
+            self.playlist.filepath = filepath
+            self.playlist.playsong(meta, self.dir_path)
+        self.log_message(f"Playing: {meta.get('title')}")
+
+    def play_offline(self, entry, song, trace):
+        """Plays the stored copy of an entry while offline, else defers it."""
+        hit = offline.local_copy(entry)
+        with self.lock:
+            if hit:
+                filepath, meta = hit
+                self.playlist.trace = trace
+                self.playlist.filepath = filepath
+                self.playlist.playsong(meta, None)
+            else:
+                deferred = self.playlist.defer_last()
+        if hit:
+            self.log_message(f"Offline: playing {meta.get('title') or song} from disk")
+        elif deferred:
+            self.log_message(f"Offline: {song} deferred until the connection is back")
+        else:
+            self.log_message(f"Offline: skipped {song} (no local copy)", 'warning')
+
+    def connectivity_changed(self, online):
+        if not online:
+            self.log_message("Offline: playing from the cache and library only.", 'warning')
+            return
+        with self.lock:
+            count = self.playlist.requeue_deferred()
+        self.log_message("Back online." + (f" Queued {count} deferred song(s) again." if count else ""))
+
+    def background_cache(self, song):
+        meta, path = downloader.download(song, lookup='background')
+        if path:
+            current = self.playlist.meta or {}
+            if meta and current.get('id') == meta.get('id'):
+                self.playlist.cachepath = path
+        else:
+            self.log_message(f"Download failed for: {song}", 'warning')
+
+    def resume_playback(self, current):
+        """Resumes the song of a restored session from its cached file."""
+        meta = current.get('meta') or {}
+        # The file may have been collapsed into another copy of the same video (ymp --dedupe)
+        filepath = cacheindex.INDEX.locate(meta.get('id'), current.get('filepath'))
+        cached = filepath is not None
+        metrics.cache_lookup('resume', hit=cached)
+        with self.lock:
+            if cached:
+                self.log_message(f"Resuming session: {meta.get('title', filepath)}")
+                self.playlist.filepath = filepath
+                self.playlist.playsong(meta, None, int(current.get('position', 0) * 1000))
+            elif self.playlist.playedplaylist:
+                self.playlist.shiftlastplayedsong()
+
+    # --- Queue ---
+
+    def enqueue(self, items, front=False):
+        """
+        Adds songs/URLs to the queue. Playlists (YouTube, Spotify, PLS/M3U/XSPF) are expanded
+        in the background and queued as their entries arrive; YouTube playlists where their
+        link was queued. Returns the number of entries queued right away.
+        """
+        songs = []
+        for item in items:
+            if isinstance(item, str) and (spotify.is_spotify_url(item) or playlists.is_playlist(item)
+                                          or library.is_folder(item)):
+                threading.Thread(target=self._expand, args=(item, front), daemon=True).start()
+            else:
+                songs.append(item)
+        self._add(songs, front)
+        self.check_for_playlists()
+        return len(songs)
+
+    def check_for_playlists(self):
+        """Expands the YouTube playlist links in the queue in place (see YmpTui.check_for_playlists)."""
+        with self.lock:
+            links = [song for song in self.playlist.queuedplaylist
+                     if song.state == tracks.UNRESOLVED and downloader.is_url(song.url) and "list=" in song.url]
+            for link in links:
+                start = self.playlist.begin_expansion(link)
+                threading.Thread(target=self._expand_in_place, args=(link, start), daemon=True).start()
+
+    def _expand_in_place(self, link, start):
+        count = 0
+        try:
+            for batch in playlists.batches(downloader.iter_playlist(link.url, start)):
+                with self.lock:
+                    if not self.playlist.expand(link, batch):
+                        break
+                count += len(batch)
+        except Exception as e:
+            self.log_message(f"Error expanding playlist {link.url}: {e}", 'error')
+        with self.lock:
+            self.playlist.end_expansion(link)
+        self.log_message(f"Expanded playlist: {count} songs added.")
+
+    def _add(self, songs, front=False, after=None):
+        """
+        Queues songs at the end, or with front=True at the front: right after `after`, the
+        last track of an earlier batch, while it is still queued. Returns the last track queued.
+        """
+        with self.lock:
+            if not front:
+                for song in songs:
+                    self.playlist.addsong(song)
+                return None
+            index = 0
+            if after is not None:
+                index = next((i + 1 for i, track in enumerate(self.playlist.queuedplaylist) if track is after), 0)
+            added = self.playlist.insertsongs(index, songs)
+            return added[-1] if added else after
+
+    def _expand(self, url, front):
+        """Queues the entries of a playlist while it is fetched/parsed."""
+        count = 0
+        last = None # Front: batches go after the previous one, so the entries keep their order
+        try:
+            if spotify.is_spotify_url(url):
+                songs = spotify.iter_tracks(url, log=self.log_message)
+            elif playlists.is_playlist(url):
+                songs = playlists.iter_queue_entries(url)
+            else:
+                library.LIBRARY.refresh(url)
+                songs = library.LIBRARY.songs_in(url)
+            for batch in playlists.batches(songs):
+                last = self._add(batch, front, last)
+                count += len(batch)
+        except Exception as e:
+            self.log_message(f"Error reading playlist {url}: {e}", 'error')
+        if count:
+            self.log_message(f"Expanded playlist: {count} songs added.")
+        else:
+            self.log_message(f"Nothing found in {url}")
+
+    # --- Control commands ---
+
+    def _require_song(self):
+        if not self.playlist.playobj:
+            raise DaemonError("Nothing is playing")
+
+    def cmd_ping(self):
+        return {'pid': os.getpid(), 'mode': 'daemon'}
+
+    def cmd_enqueue(self, items, front=False):
+        if isinstance(items, str):
+            items = [items]
+        count = self.enqueue(items, front)
+        return {'queued': count, 'message': f"Queued {len(items)} item(s)."}
+
+    def cmd_next(self):
+        with self.lock:
+            self.playlist.nextsong()
+        return {'message': "Skipping to next..."}
+
+    def cmd_prev(self):
+        with self.lock:
+            if len(self.playlist.playedplaylist) < 2:
+                raise DaemonError("Can't go back beyond start")
+            self.playlist.previoussong()
+        return {'message': "Skipping back..."}
+
+    def cmd_pause(self, paused=None):
+        with self.lock:
+            self._require_song()
+            if paused is None:
+                paused = not self.playlist.songpaused
+            if paused and not self.playlist.songpaused:
+                self.playlist.pausesong()
+            elif not paused and self.playlist.songpaused:
+                self.playlist.resumesong(None)
+        return {'paused': paused, 'message': "Paused." if paused else "Resumed."}
+
+    def cmd_seek(self, seconds):
+        with self.lock:
+            self._require_song()
+            self.playlist.seeksong(float(seconds), None)
+            reply = {'position': self.playlist.get_position()}
+            timeshift = self.playlist.timeshift_label()
+            if timeshift:
+                reply['message'] = f"Radio: {timeshift}"
+        return reply
+
+    def cmd_shuffle(self):
+        with self.lock:
+            self.playlist.shuffleplaylist()
+        return {'message': "Queue shuffled."}
+
+    def cmd_jump(self, index):
+        """Plays queue entry `index` next and skips the current song."""
+        with self.lock:
+            queue = self.playlist.queuedplaylist
+            if not 0 <= index < len(queue):
+                raise DaemonError(f"No queue entry {index}")
+            queue.insert(0, queue.pop(index))
+            self.playlist.changed()
+            if self.playlist.playobj:
+                self.playlist.nextsong()
+        return {'message': "Jumping..."}
+
+    def cmd_status(self, since=None, queue=False):
+        with self.lock:
+            meta = (self.playlist.meta or {}) if self.playlist.playobj else {}
+            status = {
+                'title': meta.get('title'),
+                'artist': meta.get('artist'),
+                'duration': meta.get('duration') or 0,
+                'position': self.playlist.get_position(),
+                'paused': self.playlist.songpaused,
+                'loading': self.is_loading,
+                'repeat': self.playlist.repeat,
+                'queue_length': len(self.playlist.queuedplaylist),
+                'stream': self.playlist.stream_stats(),
+                'log_seq': self.log.seq,
+            }
+            if since is not None:
+                status['log'] = self.log.since(since, config.get_log_level())
+            if queue:
+                status['queue'] = [track.to_dict() for track in self.playlist.queuedplaylist[:QUEUE_PREVIEW]]
+        return status
+
+    def cmd_queue(self):
+        with self.lock:
+            return {'queue': [track.to_dict() for track in self.playlist.queuedplaylist],
+                    'history': [track.to_dict() for track in self.playlist.playedplaylist]}
+
+    def cmd_stop(self):
+        self.shutdown()
+        return {'message': "Stopping ymp."}
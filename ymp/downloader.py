@@ -1,81 +1,78 @@
-from yt_dlp import YoutubeDL
 from requests import get
-from bs4 import BeautifulSoup
-import re , json ,tempfile, os
+import re , json ,tempfile, os, time, shutil, threading
 import ymp.config as config
-from rich.progress import Progress, BarColumn, TextColumn, TransferSpeedColumn, TimeElapsedColumn
+import ymp.metrics as metrics
+import ymp.spotify as spotify
+import ymp.playlists as playlists
+import ymp.tracing as tracing
+import ymp.analysis as analysis
+import ymp.cacheindex as cacheindex
+import ymp.library as library
+import ymp.thumbnails as thumbnails
+import ymp.chunked as chunked
+import ymp.quality as quality
+import ymp.tracks as tracks
+
+def _youtube_dl(options):
+    """Creates a yt-dlp instance. yt-dlp is imported on first use, it is by far the slowest import."""
+    from yt_dlp import YoutubeDL
+    return YoutubeDL(options)
 
 def spotifyparser(url):
     """
-    Parses a Spotify playlist URL to extract track information.
-
-    Note: This method is fragile as it relies on scraping the Spotify website,
-    which can change at any time. A more robust solution would use the Spotify API.
+    Parses a Spotify playlist URL and returns all tracks as search strings.
+    Use `ymp.spotify.iter_tracks` to queue tracks while the playlist is still loading.
     """
-    print("Pinging "+url)
-    try:
-        spotifyhtml=get(url)
-        soup=BeautifulSoup(spotifyhtml.content,"lxml")
-        tags=soup('script')
-        if len(tags) < 6:
-            print("[red]Error: Spotify page structure changed. Cannot find script tags.")
-            return []
-
-        # Heuristic: Look for the script containing the entity data if index 5 fails
-        target_content = None
-        for tag in tags:
-            if tag.contents and "Spotify.Entity =" in tag.contents[0]:
-                target_content = tag.contents[0]
-                break
-
-        if not target_content:
-            # Fallback to legacy index if search failed (though search should have found it)
-            if len(tags) > 5 and tags[5].contents:
-                target_content = tags[5].contents[0]
-
-        if not target_content:
-             print("[red]Error: Could not find Spotify Entity data.")
-             return []
-
-        x=re.findall("Spotify.Entity = (.*);", target_content)
-        if not x:
-             print("[red]Error: Could not extract JSON from Spotify script.")
-             return []
-
-        data=x[0]
-        jsonfile=json.loads(data)
-
-        print("Adding "+jsonfile['name']+" To Queue." )
-        tracks=jsonfile['tracks']['items']
+    return list(spotify.iter_tracks(url))
 
-        tracklist=[]
-
-        for track in tracks:
-            trackname=track['track']['name']
-            artistname=""
-            for artist in track['track']['artists']:
-                artistname=artistname+" "+artist['name']
-            tracklist.append(trackname+artistname)
-
-        return tracklist
+def get_playlist_info(url):
+    """The videos of a playlist URL as Tracks (flat: one listing, no per-video extraction)."""
+    try:
+        return list(iter_playlist(url))
     except Exception as e:
-        print(f"Error parsing Spotify playlist: {e}")
+        print(f"Error fetching playlist info: {e}")
         return []
 
-def get_playlist_info(url):
-    """Extracts video info from a playlist URL without downloading."""
+def iter_playlist(url, start=0):
+    """
+    Yields the videos of a playlist URL as Tracks while yt-dlp pages through it, after
+    skipping the first `start`. Pages are only fetched as the entries are consumed, so
+    the first video is there after one request, even for a 5,000 video playlist or a mix.
+    """
+    from yt_dlp.utils import PlaylistEntries
     options = {
         'extract_flat': 'in_playlist',
+        'lazy_playlist': True,
+        'playlist_items': f'{start + 1}:',
         'quiet': True,
         'no_warnings': True,
     }
-    with YoutubeDL(options) as ytdl:
-        try:
-            meta = ytdl.extract_info(url, download=False)
-            return meta.get('entries', [])
-        except Exception as e:
-            print(f"Error fetching playlist info: {e}")
-            return []
+    with _youtube_dl(options) as ytdl:
+        # Unprocessed, the entries stay a generator over the pages
+        info = ytdl.extract_info(url, download=False, process=False)
+        for _ in range(3):
+            if info.get('_type') not in ('url', 'url_transparent'):
+                break
+            # A watch?v=...&list=... link first leads to the playlist itself
+            info = ytdl.extract_info(info['url'], download=False, process=False, ie_key=info.get('ie_key'))
+        if info.get('_type') not in ('playlist', 'multi_video'):
+            if start == 0:
+                yield tracks.from_dict(info) # A single video
+            return
+        for _, entry in PlaylistEntries(ytdl, info).get_requested_items():
+            if entry:
+                yield tracks.from_dict(entry)
+
+def is_url(link):
+    return isinstance(link, str) and (link.startswith('http://') or link.startswith('https://'))
+
+def resolve_query(ytdl, query):
+    """Returns the video URL of the first search result for a query (or None)."""
+    search = ytdl.extract_info(f"ytsearch1:{query}", download=False, process=False)
+    for entry in search.get('entries') or []:
+        return entry.get('url') or f"https://www.youtube.com/watch?v={entry['id']}"
+    print(f"No search results for: {query}")
+    return None
 
 def extract_stream_info(link):
     """
@@ -83,16 +80,24 @@ def extract_stream_info(link):
     Returns (meta_dict, stream_url).
     """
     options = {
-        'format': 'bestaudio/best',
+        'format': quality.format_for(quality.choose_tier('stream')),
         'quiet': True,
         'no_warnings': True,
         'default_search': 'ytsearch',
         'noplaylist': True,
     }
-    with YoutubeDL(options) as ytdl:
+    with _youtube_dl(options) as ytdl:
         try:
+            if not is_url(link):
+                # Search first (flat result), then extract only the chosen video
+                with tracing.span('resolve', query=link), metrics.RESOLVE_SECONDS.time():
+                    link = resolve_query(ytdl, link)
+                if not link:
+                    return None, None
+
             # extract_info(download=False) usually returns the stream URL
-            meta = ytdl.extract_info(link, download=False)
+            with tracing.span('extract', url=link), metrics.EXTRACT_SECONDS.time():
+                meta = ytdl.extract_info(link, download=False)
             if 'entries' in meta:
                 meta = meta['entries'][0]
 
@@ -101,69 +106,207 @@ def extract_stream_info(link):
             print(f"Error fetching stream info: {e}")
             return None, None
 
-def download(link, dir_path=None):
-    """
-    Downloads a song from YouTube using yt-dlp.
-    """
-    # Determine target directory
-    if config.is_smart_download_enabled():
-        target_dir = config.get_music_dir()
-        os.makedirs(target_dir, exist_ok=True)
-        config.manage_storage()
-    else:
-        target_dir = dir_path if dir_path else tempfile.gettempdir()
+# Running downloads and when the last one ended, for work that waits for idle time
+_activity = {'running': 0, 'ended': 0.0}
+_activity_lock = threading.Lock()
 
-    # Determine output template based on mode
-    if config.is_permanent_mode():
-        # Artist/Album/Title structure
-        out_tmpl = os.path.join(target_dir, '%(artist)s', '%(album)s', '%(title)s.%(ext)s')
-    else:
-        # Flat structure for cache
-        out_tmpl = os.path.join(target_dir, '%(artist)s - %(title)s.%(ext)s')
+def idle_seconds():
+    """Seconds since the last download ended, 0 while one runs."""
+    with _activity_lock:
+        if _activity['running']:
+            return 0
+        return time.monotonic() - _activity['ended']
 
-    options={
-        'format': 'bestaudio/best',
+def _download_options(out_tmpl, tier):
+    return {
+        'format': quality.format_for(tier),
         'outtmpl': out_tmpl,
         'postprocessors': [{
             'key': 'FFmpegExtractAudio',
             'preferredcodec': 'mp3',
             'preferredquality': '320',
-        }, {
-            'key': 'EmbedThumbnail',
         }, {
             'key': 'FFmpegMetadata',
             'add_metadata': True,
         }],
-        'writethumbnail': True,
         'add_metadata': True,
         'default_search': 'ytsearch',
         'quiet': True,
         'no_warnings': True,
         'nooverwrites': True, # Smart Cache: don't download if exists
         'continuedl': True,
+        # Fragmented formats; single files are fetched in parallel ranges by ymp.chunked
+        'concurrent_fragment_downloads': max(1, config.get_download_connections()),
+        'http_chunk_size': config.get_download_chunk_size(),
+        'progress_hooks': [quality.progress_hook],
     }
 
+def _fetch(ytdl, link):
+    """Extracts and downloads a video, returns its meta (the file is at prepare_filename, as .mp3)."""
+    meta = ytdl.extract_info(link, download=False)
+    if 'entries' in meta:
+        meta = meta['entries'][0]
+    filename = ytdl.prepare_filename(meta)
+    if not os.path.exists(os.path.splitext(filename)[0] + '.mp3'):
+        # yt-dlp finds the fetched file and goes on with the postprocessors
+        chunked.fetch(meta, filename, hooks=ytdl.params['progress_hooks'])
+    return ytdl.process_ie_result(meta, download=True)
+
+def download(link, dir_path=None, lookup='download', tier=None):
+    """
+    Downloads a song from YouTube using yt-dlp.
+    lookup names the caller in the cache hit/miss metrics (e.g. 'preload').
+    The format tier (see ymp.quality) follows the measured bandwidth unless given.
+    """
+    with _activity_lock:
+        _activity['running'] += 1
+    try:
+        return _download(link, dir_path, lookup, tier or quality.choose_tier('download'))
+    finally:
+        with _activity_lock:
+            _activity['running'] -= 1
+            _activity['ended'] = time.monotonic()
+
+def _download(link, dir_path, lookup, tier):
+    # Determine target directory
+    smart = config.is_smart_download_enabled()
+    if smart:
+        target_dir = config.get_music_dir()
+        os.makedirs(target_dir, exist_ok=True)
+        with tracing.span('manage_storage'):
+            config.manage_storage()
+    else:
+        target_dir = dir_path if dir_path else tempfile.gettempdir()
+
+    # Determine output template based on mode
+    if config.is_permanent_mode():
+        # Artist/Album/Title structure
+        out_tmpl = os.path.join(target_dir, '%(artist)s', '%(album)s', '%(title)s.%(ext)s')
+    else:
+        # Flat structure for cache
+        out_tmpl = os.path.join(target_dir, '%(artist)s - %(title)s.%(ext)s')
+
+    options = _download_options(out_tmpl, tier)
+
+    # A cache hit never reports 'downloading': yt-dlp finds the final .mp3 and skips the fetch
+    fetch = {'downloading': False, 'bytes': {}}
+
+    def progress_hook(d):
+        if d['status'] == 'downloading':
+            fetch['downloading'] = True
+        elif d['status'] == 'finished' and fetch['downloading']:
+            # By file: yt-dlp reports a file fetched by ymp.chunked as finished once more
+            fetch['bytes'][d.get('filename')] = d.get('downloaded_bytes') or d.get('total_bytes') or 0
+
+    options['progress_hooks'].append(progress_hook)
+    if tracing.is_enabled():
+        _add_trace_hooks(options, link)
+
     filepath = None
-    with YoutubeDL(options) as ytdl:
+    with _youtube_dl(options) as ytdl:
         try:
-            # We assume 'link' can be a URL or a search query
-            # If it's a search query, we might want to ensure we get the SAME video
-            # as extract_stream_info did. Ideally we pass the direct video ID.
-            # But for now, relying on 'default_search' is okay.
-            meta = ytdl.extract_info(link, download=True)
-            if 'entries' in meta:
-                meta = meta['entries'][0]
+            if smart and not is_url(link):
+                # Resolve the search first (as extract_info would), so the video ID is known
+                # before downloading and another search for a stored video is a cache hit
+                with tracing.span('resolve', query=link), metrics.RESOLVE_SECONDS.time():
+                    link = resolve_query(ytdl, link) or link
+            vid = cacheindex.video_id(link)
+            # Songs stored before the cache index are found by the video ID in their tags
+            hit = (cacheindex.INDEX.lookup(vid) or library.LIBRARY.lookup(vid)) if smart else None
+            if hit:
+                filepath, meta = hit
+                metrics.cache_lookup(lookup, hit=True)
+                analysis.schedule(filepath)
+                return meta, filepath
+
+            start = time.perf_counter()
+            with tracing.span('download_total', link=link):
+                meta = _fetch(ytdl, link)
+            elapsed = time.perf_counter() - start
+
+            metrics.cache_lookup(lookup, hit=not fetch['downloading'])
+            if fetch['downloading']:
+                metrics.DOWNLOADED_BYTES.inc(sum(fetch['bytes'].values()))
+                metrics.DOWNLOAD_SECONDS.observe(elapsed)
 
             # Get the actual filename
             filepath = ytdl.prepare_filename(meta)
             filepath = os.path.splitext(filepath)[0] + '.mp3'
 
+            if os.path.exists(filepath):
+                if smart:
+                    if fetch['downloading']:
+                        meta['quality'] = tier # Lower tiers are upgraded later (ymp.quality)
+                    cacheindex.INDEX.add(meta.get('id'), filepath, meta)
+                    if meta.get('quality', 'best') != 'best':
+                        quality.schedule_upgrade()
+                analysis.schedule(filepath) # Low priority, skipped if already analysed
+                if fetch['downloading']:
+                    # Artwork comes from the shared thumbnail cache instead of EmbedThumbnail
+                    thumbnails.after_download(meta, filepath)
             return meta, filepath
 
         except Exception as e:
             print(f"Download Error: {e}")
             return None, None
 
+def upgrade(vid):
+    """
+    Downloads a cached video again at the best quality and replaces its file.
+    Hardlinked files (ymp --dedupe) are left alone. Returns False if it did not work out.
+    """
+    hit = cacheindex.INDEX.lookup(vid)
+    if not hit:
+        return False
+    filepath, meta = hit
+    if os.stat(filepath).st_nlink > 1 or not meta.get('webpage_url'):
+        return False
+    with _activity_lock:
+        _activity['running'] += 1
+    try:
+        with tempfile.TemporaryDirectory(prefix='ymp-upgrade-') as tmp_dir:
+            options = _download_options(os.path.join(tmp_dir, '%(id)s.%(ext)s'), 'best')
+            with _youtube_dl(options) as ytdl:
+                new_meta = _fetch(ytdl, meta['webpage_url'])
+                new_path = os.path.splitext(ytdl.prepare_filename(new_meta))[0] + '.mp3'
+            if not os.path.exists(new_path):
+                return False
+            # Copied next to the song first: the temporary directory may be on another file system
+            tmp_path = filepath + '.ymp-upgrade'
+            shutil.copyfile(new_path, tmp_path)
+            os.replace(tmp_path, filepath)
+    except Exception as e:
+        print(f"Upgrade Error: {e}")
+        return False
+    finally:
+        with _activity_lock:
+            _activity['running'] -= 1
+            _activity['ended'] = time.monotonic()
+    cacheindex.INDEX.add(vid, filepath, dict(meta, quality='best'))
+    analysis.schedule(filepath) # The new file has its own loudness
+    thumbnails.after_download(meta, filepath)
+    return True
+
+def _add_trace_hooks(options, link):
+    """Splits a traced download into 'download' and 'postprocess' spans using yt-dlp's hooks."""
+    spans = {}
+
+    def progress_hook(d):
+        if d['status'] == 'downloading' and 'download' not in spans:
+            spans['download'] = tracing.span('download', link=link)
+        elif d['status'] == 'finished' and 'download' in spans:
+            spans['download'].end()
+
+    def postprocessor_hook(d):
+        name = d.get('postprocessor')
+        if d['status'] == 'started':
+            spans[name] = tracing.span('postprocess', postprocessor=name)
+        elif d['status'] == 'finished' and name in spans:
+            spans.pop(name).end()
+
+    options.setdefault('progress_hooks', []).append(progress_hook)
+    options.setdefault('postprocessor_hooks', []).append(postprocessor_hook)
+
 def speed_text(speed):
     if speed is None:
         return ""
@@ -173,25 +316,29 @@ def parse_pls(url_or_path):
     """
     Parses a PLS file (local path or URL) and returns a list of URLs/files.
     """
-    content = ""
+    return [entry['url'] for entry in parse_pls_entries(url_or_path)]
+
+def parse_pls_entries(url_or_path):
+    """
+    Parses a PLS file (local path or URL) into a list of {'url', 'title', 'length'}
+    from its FileN/TitleN/LengthN keys. The file is streamed, see ymp.playlists.
+    """
     # Check if it's a URL
-    if url_or_path.startswith('http://') or url_or_path.startswith('https://'):
+    if is_url(url_or_path):
         try:
             print(f"Fetching PLS from {url_or_path}...")
-            response = get(url_or_path, timeout=10)
-            if response.status_code == 200:
-                content = response.text
-            else:
+            response = get(url_or_path, stream=True, timeout=10)
+            if response.status_code != 200:
                 print(f"[red]Error fetching PLS: Status code {response.status_code}")
                 return []
+            entries = list(playlists.parse_pls(response.iter_content(playlists.CHUNK_SIZE), url_or_path))
         except Exception as e:
             print(f"[red]Error fetching PLS: {e}")
             return []
     # Check if it's a local file
     elif os.path.exists(url_or_path):
         try:
-            with open(url_or_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
+            entries = list(playlists.parse_pls(playlists.read_chunks(url_or_path), url_or_path))
         except Exception as e:
             print(f"[red]Error reading PLS file: {e}")
             return []
@@ -199,23 +346,12 @@ def parse_pls(url_or_path):
         # Not a file or URL we can handle here
         return []
 
-    urls = []
-    lines = content.splitlines()
-    for line in lines:
-        line = line.strip()
-        # Look for FileX=http://...
-        # Case insensitive check for 'file'
-        if line.lower().startswith('file'):
-            parts = line.split('=', 1)
-            if len(parts) == 2:
-                urls.append(parts[1].strip())
-
-    if urls:
-        print(f"Found {len(urls)} entries in PLS file.")
+    if entries:
+        print(f"Found {len(entries)} entries in PLS file.")
     else:
         print("No entries found in PLS file.")
 
-    return urls
+    return entries
 
 def makedownload(permanent=False):
     """
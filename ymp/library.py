@@ -0,0 +1,311 @@
+"""
+Index of the songs on disk (the music directory, and folders queued from the command
+line), built from their tags: title, artist, album, duration and the source video.
+
+Tags are read once per file. A rescan only stats the files and compares (inode, size,
+mtime) with the index, so it costs one stat() per song when nothing changed and
+re-reads just the files that did. The index backs queueing folders (`ymp -p ~/Music/ymp/Artist`),
+local results in the TUI search panel, and cache hits for videos stored before the
+cache index existed (see ymp.cacheindex).
+
+The tag reader covers what yt-dlp's FFmpegMetadata writes into MP3s (ID3v2.2-2.4
+text frames, the webpage URL as comment/purl) and ID3v1; the duration comes from the
+Xing/Info or VBRI header, or the bitrate of a CBR file.
+"""
+import json
+import os
+import struct
+import threading
+
+import ymp.config as config
+
+LIBRARY_FILE = os.path.join(config.CONFIG_DIR, 'library.json')
+EXTENSIONS = ('.mp3',)
+
+# ID3v2.2 frame IDs are three characters
+_FRAMES = {
+    'TIT2': 'title', 'TT2': 'title',
+    'TPE1': 'artist', 'TP1': 'artist',
+    'TALB': 'album', 'TAL': 'album',
+    'TLEN': 'length', 'TLE': 'length',
+    'COMM': 'comment', 'COM': 'comment',
+    'TXXX': 'user', 'TXX': 'user',
+}
+_ENCODINGS = {0: 'latin-1', 1: 'utf-16', 2: 'utf-16-be', 3: 'utf-8'}
+
+# MPEG audio layer III
+_BITRATES = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_SAMPLE_RATES = {1: (44100, 48000, 32000), 2: (22050, 24000, 16000), 2.5: (11025, 12000, 8000)}
+
+def _split(data, encoding):
+    """Splits off the first null-terminated string of a frame body: (text, rest)."""
+    terminator = b'\0\0' if encoding in (1, 2) else b'\0'
+    end = data.find(terminator)
+    while terminator == b'\0\0' and end != -1 and end % 2:
+        end = data.find(terminator, end + 1) # UTF-16 terminators are aligned
+    if end == -1:
+        return data, b''
+    return data[:end], data[end + len(terminator):]
+
+def _decode(data, encoding):
+    return data.decode(_ENCODINGS.get(encoding, 'latin-1'), 'replace').strip('\0 \ufeff')
+
+def _text_frame(frame_id, body):
+    """(field, value) of a frame ymp reads, or None."""
+    field = _FRAMES.get(frame_id)
+    if not field or not body:
+        return None
+    encoding, data = body[0], body[1:]
+    if field == 'comment':
+        _, text = _split(data[3:], encoding) # Language, then the short description
+        return field, _decode(text, encoding)
+    if field == 'user':
+        description, value = _split(data, encoding)
+        return _decode(description, encoding).lower(), _decode(value, encoding)
+    text, _ = _split(data, encoding) # ID3v2.4: the first of several values
+    return field, _decode(text, encoding)
+
+def _id3v2_frames(tag, major):
+    """Yields (frame ID, body) of an ID3v2 tag body."""
+    header = 6 if major == 2 else 10
+    pos = 0
+    while pos + header <= len(tag):
+        if major == 2:
+            frame_id = tag[pos:pos + 3]
+            size = int.from_bytes(tag[pos + 3:pos + 6], 'big')
+        else:
+            frame_id = tag[pos:pos + 4]
+            raw = tag[pos + 4:pos + 8]
+            size = ((raw[0] << 21) | (raw[1] << 14) | (raw[2] << 7) | raw[3]) if major == 4 else int.from_bytes(raw, 'big')
+        if not frame_id.strip(b'\0') or size <= 0:
+            return # Padding
+        yield frame_id.decode('latin-1'), tag[pos + header:pos + header + size]
+        pos += header + size
+
+def _frame_duration(data, audio_bytes):
+    """Duration of `audio_bytes` of MPEG layer III audio starting with `data`, or None."""
+    for pos in range(min(len(data) - 4, 4096)):
+        if data[pos] != 0xFF or data[pos + 1] & 0xE0 != 0xE0:
+            continue
+        version = {3: 1, 2: 2, 0: 2.5}.get((data[pos + 1] >> 3) & 3)
+        layer = (data[pos + 1] >> 1) & 3
+        bitrate_index = data[pos + 2] >> 4
+        rate_index = (data[pos + 2] >> 2) & 3
+        if version is None or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+            continue
+        sample_rate = _SAMPLE_RATES[version][rate_index]
+        bitrate = _BITRATES[1 if version == 1 else 2][bitrate_index] * 1000
+        samples = 1152 if version == 1 else 576
+        mono = (data[pos + 3] >> 6) == 3
+        side_info = (17 if mono else 32) if version == 1 else (9 if mono else 17)
+        xing = pos + 4 + side_info
+        if data[xing:xing + 4] in (b'Xing', b'Info') and len(data) >= xing + 12:
+            flags = struct.unpack('>I', data[xing + 4:xing + 8])[0]
+            if flags & 1:
+                return struct.unpack('>I', data[xing + 8:xing + 12])[0] * samples / sample_rate
+        vbri = pos + 4 + 32
+        if data[vbri:vbri + 4] == b'VBRI' and len(data) >= vbri + 18:
+            return struct.unpack('>I', data[vbri + 14:vbri + 18])[0] * samples / sample_rate
+        return (audio_bytes - pos) * 8 / bitrate
+    return None
+
+def read_tags(path):
+    """
+    {'title', 'artist', 'album', 'duration', 'id'} of an MP3 (only what it has), read
+    from its ID3 tags and first audio frame.
+    """
+    import ymp.cacheindex as cacheindex
+    tags = {}
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        header = f.read(10)
+        offset = 0
+        if len(header) == 10 and header[:3] == b'ID3' and header[3] in (2, 3, 4):
+            major, flags = header[3], header[5]
+            tag_size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+            tag = f.read(tag_size)
+            if flags & 0x40 and major in (3, 4): # Extended header
+                ext = tag[:4]
+                ext_size = ((ext[0] << 21) | (ext[1] << 14) | (ext[2] << 7) | ext[3]) if major == 4 else 4 + int.from_bytes(ext, 'big')
+                tag = tag[ext_size:]
+            for frame_id, body in _id3v2_frames(tag, major):
+                field = _text_frame(frame_id, body)
+                if field and field[1] and field[0] not in tags:
+                    tags[field[0]] = field[1]
+            offset = 10 + tag_size + (10 if flags & 0x10 else 0)
+        f.seek(offset)
+        head = f.read(8192)
+        trailer = b''
+        if size >= 128:
+            f.seek(size - 128)
+            trailer = f.read(128)
+
+    if trailer[:3] == b'TAG':
+        for field, start in (('title', 3), ('artist', 33), ('album', 63)):
+            if field not in tags:
+                value = trailer[start:start + 30].split(b'\0')[0].decode('latin-1').strip()
+                if value:
+                    tags[field] = value
+
+    result = {k: tags[k] for k in ('title', 'artist', 'album') if k in tags}
+    length = tags.get('length', '')
+    if length.isdigit() and int(length) > 0:
+        result['duration'] = int(length) / 1000
+    else:
+        audio_bytes = size - offset - (128 if trailer[:3] == b'TAG' else 0)
+        duration = _frame_duration(head, audio_bytes)
+        if duration:
+            result['duration'] = round(duration, 3)
+    # yt-dlp stores the webpage URL as purl and comment
+    vid = cacheindex.video_id(tags.get('purl')) or cacheindex.video_id(tags.get('comment'))
+    if vid:
+        result['id'] = vid
+    return result
+
+def _scan(root):
+    """Yields (path, stat) of the songs below root."""
+    try:
+        entries = list(os.scandir(root))
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _scan(entry.path)
+            elif entry.name.lower().endswith(EXTENSIONS):
+                yield entry.path, entry.stat()
+        except OSError:
+            continue
+
+def _matches(tags, path, words):
+    # Permanent mode stores Artist/Album/Title.mp3: the folders count when tags are missing
+    text = ' '.join((tags.get('title') or '', tags.get('artist') or '', tags.get('album') or '',
+                     *path.split(os.sep)[-3:])).lower()
+    return all(word in text for word in words)
+
+class Library:
+    """Path -> (inode, size, mtime_ns, tags) of the songs on disk, persisted as JSON."""
+
+    def __init__(self, path=LIBRARY_FILE):
+        self.path = path
+        self.files = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self.files is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.files = json.load(f).get('files', {})
+            except (OSError, ValueError, AttributeError):
+                self.files = {}
+        return self.files
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'files': self.files}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def refresh(self, root=None):
+        """
+        Brings the songs below root (default: the music directory) up to date: tags are
+        read for new and changed files, removed ones are dropped. Returns (updated, removed).
+        """
+        root = os.path.abspath(root or config.get_music_dir())
+        found = {}
+        for path, st in _scan(root):
+            found[path] = (st.st_ino, st.st_size, st.st_mtime_ns)
+        with self._lock:
+            files = dict(self._load())
+        prefix = os.path.join(root, '')
+        removed = [path for path in files if path.startswith(prefix) and path not in found]
+        updated = {}
+        for path, key in found.items():
+            entry = files.get(path)
+            if entry is None or tuple(entry[:3]) != key:
+                try:
+                    tags = read_tags(path)
+                except OSError:
+                    continue
+                updated[path] = [*key, tags]
+        if updated or removed:
+            with self._lock:
+                files = self._load()
+                for path in removed:
+                    files.pop(path, None)
+                files.update(updated)
+                self._save()
+        return len(updated), len(removed)
+
+    def update(self, changed=(), removed=()):
+        """Applies changes reported by ymp.watcher without a scan: tags are read for `changed`."""
+        updated = {}
+        for path in changed:
+            try:
+                st = os.stat(path)
+                updated[path] = [st.st_ino, st.st_size, st.st_mtime_ns, read_tags(path)]
+            except OSError:
+                continue
+        if not updated and not removed:
+            return
+        with self._lock:
+            files = self._load()
+            for path in removed:
+                files.pop(path, None)
+            files.update(updated)
+            self._save()
+
+    def songs_in(self, folder):
+        """Queue entries for the indexed songs below a folder, in path order."""
+        prefix = os.path.join(os.path.abspath(folder), '')
+        with self._lock:
+            items = sorted((path, entry[3]) for path, entry in self._load().items() if path.startswith(prefix))
+        return [self.queue_entry(path, tags) for path, tags in items]
+
+    def search(self, query, limit=None):
+        """Queue entries of the songs whose tags (or file name) contain every word of the query."""
+        words = query.lower().split()
+        if not words:
+            return []
+        with self._lock:
+            items = [(path, entry[3]) for path, entry in self._load().items() if _matches(entry[3], path, words)]
+        items.sort(key=lambda item: (item[1].get('artist') or '', item[1].get('title') or item[0]))
+        return [self.queue_entry(path, tags) for path, tags in items[:limit]]
+
+    def lookup(self, vid):
+        """(path, meta) of an indexed song of a video, like ymp.cacheindex.CacheIndex.lookup."""
+        if not vid:
+            return None
+        with self._lock:
+            hits = [(path, entry[3]) for path, entry in self._load().items() if entry[3].get('id') == vid]
+        for path, tags in hits:
+            if os.path.exists(path):
+                return path, dict(tags, webpage_url=f"https://www.youtube.com/watch?v={vid}")
+        return None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._load())
+
+    @staticmethod
+    def queue_entry(path, tags):
+        """A queue entry playing the file itself (see ymp.playlists.local_meta)."""
+        entry = {
+            'url': path,
+            'title': tags.get('title') or os.path.splitext(os.path.basename(path))[0],
+            'channel': tags.get('artist'),
+            'duration': tags.get('duration'),
+        }
+        if tags.get('id'):
+            entry['id'] = tags['id'] # Downloaded by ymp: the video it came from
+        return entry
+
+LIBRARY = Library()
+
+def is_folder(item):
+    """True for a queued item that is a local folder (queued as its songs)."""
+    return isinstance(item, str) and not item.startswith(('http://', 'https://')) and os.path.isdir(item)
@@ -6,29 +6,44 @@ if sys.platform == 'win32':
 else:
     import fcntl
 
+def pid_alive(pid):
+    """Returns True if a process with this PID exists."""
+    if sys.platform == 'win32':
+        return True # os.kill would terminate it, assume the lock holder is alive
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True # Exists, owned by someone else
+    return True
+
 class LockFile:
     def __init__(self, path):
         self.path = path
         self.fp = None
 
     def acquire(self):
-        """Acquires the lock. Returns True if successful, False otherwise."""
+        """
+        Acquires the lock. Returns True if successful, False otherwise.
+        A held lock is never taken over, whatever PID its file shows (see holder()).
+        """
         try:
             # Ensure directory exists
             os.makedirs(os.path.dirname(self.path), exist_ok=True)
 
+            # Opened without truncating, the holder's PID must survive a failed attempt
+            self.fp = open(self.path, 'a+')
+            self.fp.seek(0)
             if sys.platform == 'win32':
-                self.fp = open(self.path, 'w')
                 # Lock the file
                 msvcrt.locking(self.fp.fileno(), msvcrt.LK_NBLCK, 1)
-                self.fp.write(str(os.getpid()))
-                self.fp.flush()
             else:
-                self.fp = open(self.path, 'w')
                 # Try to acquire an exclusive lock without blocking
                 fcntl.lockf(self.fp, fcntl.LOCK_EX | fcntl.LOCK_NB)
-                self.fp.write(str(os.getpid()))
-                self.fp.flush()
+            self.fp.truncate()
+            self.fp.write(str(os.getpid()))
+            self.fp.flush()
             return True
         except (IOError, OSError):
             if self.fp:
@@ -36,11 +51,30 @@ class LockFile:
                 self.fp = None
             return False
 
+    def read_pid(self):
+        """PID written by the lock holder, or None."""
+        try:
+            with open(self.path, 'r') as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def holder(self):
+        """
+        PID of the running lock holder, or None if it is unknown: not written yet, no longer
+        running, or a process this one cannot see (another PID namespace). Only for messages.
+        """
+        pid = self.read_pid()
+        if pid is not None and pid != os.getpid() and pid_alive(pid):
+            return pid
+        return None
+
     def release(self):
         """Releases the lock."""
         if self.fp:
             try:
                 if sys.platform == 'win32':
+                    self.fp.seek(0)
                     msvcrt.locking(self.fp.fileno(), msvcrt.LK_UNLCK, 1)
                 else:
                     fcntl.lockf(self.fp, fcntl.LOCK_UN)
@@ -0,0 +1,104 @@
+"""
+The log of a session: a bounded ring buffer of (seq, time, level, message) records.
+
+Messages come from many threads (workers, the stream relay, MPRIS). Adding one only
+takes a lock: the TUI picks new records up in batches on its own timer and writes
+them to the Log widget in one go, the daemon hands them to attached TUIs by sequence
+number. Memory stays flat however long the session runs.
+
+With `[Log] file` set, records are also appended to a JSON lines file by a background
+thread (logging's QueueListener), which rotates it at `max_file_kb`.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+import ymp.config as config
+
+LEVELS = {'debug': logging.DEBUG, 'info': logging.INFO, 'warning': logging.WARNING, 'error': logging.ERROR}
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record (formatted on the writer thread)."""
+
+    def format(self, record):
+        return json.dumps({
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + f'.{int(record.msecs):03d}',
+            'level': record.levelname.lower(),
+            'seq': record.seq,
+            'message': record.getMessage(),
+        }, ensure_ascii=False)
+
+class LogBook:
+    """Thread-safe, bounded log. `drain()` hands out new lines in batches, `since()` by sequence number."""
+
+    def __init__(self, lines=500, path=None, file_level='debug', max_bytes=1 << 20, backups=3):
+        self.records = deque(maxlen=lines)
+        self.pending = deque(maxlen=lines) # Not yet shown; a burst beyond `lines` would scroll out anyway
+        self.seq = 0
+        self._lock = threading.Lock()
+        self._queue = None
+        self._listener = None
+        if path:
+            self._open(path, file_level, max_bytes, backups)
+
+    def _open(self, path, file_level, max_bytes, backups):
+        from logging.handlers import QueueListener, RotatingFileHandler
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8', delay=True)
+        except OSError as e:
+            self.add(f"Log file unavailable: {e}", 'warning')
+            return
+        handler.setLevel(LEVELS.get(file_level, logging.DEBUG))
+        handler.setFormatter(JsonLinesFormatter())
+        self._queue = queue.SimpleQueue()
+        self._listener = QueueListener(self._queue, handler, respect_handler_level=True)
+        self._listener.start()
+
+    def add(self, message, level='info'):
+        message = str(message)
+        with self._lock:
+            self.seq += 1
+            record = (self.seq, time.time(), level, message)
+            self.records.append(record)
+            self.pending.append(record)
+        if self._queue is not None:
+            self._queue.put(logging.makeLogRecord({
+                'msg': message, 'levelno': LEVELS.get(level, logging.INFO), 'levelname': level.upper(),
+                'created': record[1], 'msecs': (record[1] % 1) * 1000, 'seq': record[0],
+            }))
+
+    def drain(self, level='info'):
+        """Messages added since the last call, at `level` or above."""
+        threshold = LEVELS.get(level, logging.INFO)
+        with self._lock:
+            records = list(self.pending)
+            self.pending.clear()
+        return [message for _, _, lvl, message in records if LEVELS.get(lvl, logging.INFO) >= threshold]
+
+    def since(self, seq, level='info'):
+        """Messages after sequence number `seq` that are still kept, at `level` or above."""
+        threshold = LEVELS.get(level, logging.INFO)
+        with self._lock:
+            return [message for s, _, lvl, message in self.records
+                    if s > seq and LEVELS.get(lvl, logging.INFO) >= threshold]
+
+    def close(self):
+        """Writes out what is queued for the log file and stops the writer."""
+        if self._listener is not None:
+            self._listener.stop()
+            for handler in self._listener.handlers:
+                handler.close()
+            self._listener = self._queue = None
+
+def from_config(lines=None, file=True):
+    """A LogBook sized and (if `file` and configured) writing a log file as set in `[Log]`."""
+    return LogBook(lines or config.get_log_lines(),
+                   path=config.get_log_file() if file else None,
+                   file_level=config.get_log_file_level(),
+                   max_bytes=config.get_log_max_file_kb() * 1024,
+                   backups=config.get_log_backups())
@@ -0,0 +1,274 @@
+"""
+Runtime metrics: cache hits/misses, bytes fetched vs served from cache, evictions,
+resolve/extract/download latency, player restarts and gaps between tracks.
+
+Collection is always on (a lock and a dict update per event). The running instance
+exports the registry in the Prometheus text format, to a file (for node_exporter's
+textfile collector and `ymp --stats`) and optionally on a local-only HTTP endpoint.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Seconds; covers a cached lookup (ms) up to a slow full download
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_lock = threading.Lock()
+REGISTRY = []
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(label, '')) for label in self.labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(label, '')) for label in self.labels)
+        return self.values.get(key, 0)
+
+    def samples(self):
+        with _lock:
+            items = sorted(self.values.items())
+        return [(self.name, dict(zip(self.labels, key)), value) for key, value in items]
+
+class Gauge(Counter):
+    def set(self, value, **labels):
+        key = tuple(str(labels.get(label, '')) for label in self.labels)
+        with _lock:
+            self.values[key] = value
+
+class Histogram:
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1) # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        REGISTRY.append(self)
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with _lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        """Context manager observing the duration of its block."""
+        return _Timer(self)
+
+    def samples(self):
+        with _lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        samples = []
+        cumulative = 0
+        for bound, n in zip(self.buckets + (float('inf'),), counts):
+            cumulative += n
+            le = '+Inf' if bound == float('inf') else repr(float(bound))
+            samples.append((self.name + '_bucket', {'le': le}, cumulative))
+        samples.append((self.name + '_sum', {}, total))
+        samples.append((self.name + '_count', {}, count))
+        return samples
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+# --- The registry ---
+
+START_TIME = Gauge('ymp_start_time_seconds', 'Unix time the ymp process started.')
+START_TIME.set(time.time())
+
+CACHE_LOOKUPS = Counter('ymp_cache_lookups_total', 'Smart Download cache lookups by lookup path and result (hit/miss).', ('path', 'result'))
+DOWNLOADED_BYTES = Counter('ymp_downloaded_bytes_total', 'Bytes downloaded by yt-dlp (cache misses).')
+SERVED_BYTES = Counter('ymp_cache_served_bytes_total', 'Bytes of local cached files handed to the player.')
+EVICTIONS = Counter('ymp_cache_evictions_total', 'Songs removed by Smart Download, by limit (count/size).', ('reason',))
+TRACKS_STARTED = Counter('ymp_tracks_started_total', 'Tracks started, by source (stream/cache).', ('source',))
+PLAYER_RESTARTS = Counter('ymp_player_restarts_total', 'Player processes respawned for the same track (resume, seek).')
+RESOLVE_SECONDS = Histogram('ymp_resolve_seconds', 'Latency of resolving a search query to a video.')
+EXTRACT_SECONDS = Histogram('ymp_extract_seconds', 'Latency of extracting stream info for a video.')
+DOWNLOAD_SECONDS = Histogram('ymp_download_seconds', 'Latency of downloads that missed the cache (including postprocessing).')
+STREAM_OUTAGES = Counter('ymp_stream_outages_total', 'Live stream connections that dropped while playing.')
+STREAM_RECONNECTS = Counter('ymp_stream_reconnects_total', 'Live streams that resumed after reconnecting.')
+TRACK_GAP_SECONDS = Histogram('ymp_track_gap_seconds', 'Silence between the end of a track and the start of the next player.')
+
+def cache_lookup(path, hit):
+    CACHE_LOOKUPS.inc(path=path, result='hit' if hit else 'miss')
+
+# --- Exposition ---
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in labels.items())
+    return '{' + pairs + '}'
+
+def _format_value(value):
+    return repr(value) if isinstance(value, float) else str(value)
+
+def exposition():
+    """The registry in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        kind = 'histogram' if isinstance(metric, Histogram) else 'gauge' if isinstance(metric, Gauge) else 'counter'
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
+
+def write_textfile(path):
+    """Atomically writes the exposition, so collectors never read a torn file."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(exposition())
+    os.replace(tmp_path, path)
+
+def serve(port, host='127.0.0.1'):
+    """Serves /metrics on a local-only HTTP endpoint from a daemon thread. Returns the server."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = exposition().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass # Would draw over the TUI
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+class MetricsExporter:
+    """Periodically writes the textfile and serves the HTTP endpoint (if configured)."""
+
+    def __init__(self, path=None, interval=15, port=0):
+        self.path = path
+        self.interval = max(1, interval)
+        self.port = port
+        self.server = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.port:
+            try:
+                self.server = serve(self.port)
+            except OSError as e:
+                print(f"Could not start metrics endpoint on port {self.port}: {e}")
+        if self.path:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def write(self):
+        try:
+            write_textfile(self.path)
+        except OSError:
+            pass # Metrics must never break playback
+
+    def stop(self):
+        self._stop.set()
+        if self.server:
+            self.server.shutdown()
+            self.server = None
+        if self.path:
+            self.write()
+
+# --- `ymp --stats` ---
+
+def parse(text):
+    """Parses the text format into {(name, frozenset(labels)): value} (enough for our own files)."""
+    samples = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        head, _, value = line.rpartition(' ')
+        labels = {}
+        if '{' in head:
+            head, _, rest = head.partition('{')
+            for pair in rest.rstrip('}').split('",'):
+                if '=' in pair:
+                    key, _, val = pair.partition('=')
+                    labels[key.strip()] = val.strip().strip('"')
+        try:
+            samples[(head, frozenset(labels.items()))] = float(value)
+        except ValueError:
+            continue
+    return samples
+
+def _total(samples, name, **labels):
+    wanted = set(labels.items())
+    return sum(v for (n, l), v in samples.items() if n == name and wanted <= l)
+
+def _mb(n):
+    return f"{n / (1024 * 1024):.1f} MB"
+
+def _rate(hits, misses):
+    total = hits + misses
+    return f"{hits / total:.0%} ({int(hits)} hits / {int(misses)} misses)" if total else "no lookups"
+
+def _latency(samples, name):
+    count = _total(samples, name + '_count')
+    if not count:
+        return "no samples"
+    return f"avg {_total(samples, name + '_sum') / count:.2f}s over {int(count)}"
+
+def report(samples):
+    """Human readable summary of parsed samples, one line per entry."""
+    started = _total(samples, 'ymp_start_time_seconds')
+    lines = []
+    if started:
+        lines.append(f"Since {time.strftime('%Y-%m-%d %H:%M', time.localtime(started))}")
+
+    lookups = 'ymp_cache_lookups_total'
+    lines.append(f"Cache hit rate: {_rate(_total(samples, lookups, result='hit'), _total(samples, lookups, result='miss'))}")
+    paths = sorted({dict(l)['path'] for (n, l) in samples if n == lookups})
+    for path in paths:
+        rate = _rate(_total(samples, lookups, path=path, result='hit'), _total(samples, lookups, path=path, result='miss'))
+        lines.append(f"  {path}: {rate}")
+
+    lines.append(f"Downloaded: {_mb(_total(samples, 'ymp_downloaded_bytes_total'))}, "
+                 f"served from cache: {_mb(_total(samples, 'ymp_cache_served_bytes_total'))}")
+    lines.append(f"Evictions: {int(_total(samples, 'ymp_cache_evictions_total'))}")
+    lines.append(f"Tracks: {int(_total(samples, 'ymp_tracks_started_total', source='stream'))} streamed, "
+                 f"{int(_total(samples, 'ymp_tracks_started_total', source='cache'))} from cache, "
+                 f"{int(_total(samples, 'ymp_player_restarts_total'))} player restarts")
+    lines.append(f"Live streams: {int(_total(samples, 'ymp_stream_outages_total'))} outages, "
+                 f"{int(_total(samples, 'ymp_stream_reconnects_total'))} reconnects")
+    lines.append(f"Resolve latency: {_latency(samples, 'ymp_resolve_seconds')}")
+    lines.append(f"Extract latency: {_latency(samples, 'ymp_extract_seconds')}")
+    lines.append(f"Download latency: {_latency(samples, 'ymp_download_seconds')}")
+    lines.append(f"Gap between tracks: {_latency(samples, 'ymp_track_gap_seconds')}")
+    return lines
@@ -1,24 +1,66 @@
-try:
-    from mpris_server.adapters import MprisAdapter
-    from mpris_server.events import EventAdapter
-    from mpris_server.server import Server
-    MPRIS_AVAILABLE = True
-except ImportError:
-    MPRIS_AVAILABLE = False
-    # Mock classes for Type Hinting / Safe Import
-    class MprisAdapter: pass
-    class EventAdapter: pass
-    class Server: pass
-
 import threading
 
-class YmpMprisAdapter(MprisAdapter):
+import ymp.config as config
+import ymp.thumbnails as thumbnails
+
+# mpris_server pulls in the DBus/GObject stack, so it is only imported once MPRIS is started.
+MPRIS_AVAILABLE = False
+MprisAdapter = None
+Server = None
+
+def _try_import_mpris():
+    """Imports mpris_server on first use. Returns True if it is available."""
+    global MPRIS_AVAILABLE, MprisAdapter, Server
+    try:
+        from mpris_server.adapters import MprisAdapter
+        from mpris_server.server import Server
+        MPRIS_AVAILABLE = True
+    except ImportError:
+        MPRIS_AVAILABLE = False
+    return MPRIS_AVAILABLE
+
+TRACK_PREFIX = '/ymp/track/'
+NO_TRACK = '/org/mpris/MediaPlayer2/TrackList/NoTrack'
+TRACKLIST_WINDOW = 50 # Queued tracks listed on DBus; metadata is only built for the ones a client asks for
+
+def track_id(index):
+    """DBus track ID of an entry, by its index in played + queued songs (stable while the queue advances)."""
+    return f"{TRACK_PREFIX}{index}"
+
+def track_index(track):
+    if not isinstance(track, str) or not track.startswith(TRACK_PREFIX):
+        return None
+    try:
+        return int(track[len(TRACK_PREFIX):])
+    except ValueError:
+        return None
+
+def track_metadata(index, entry):
+    """MPRIS metadata of a queue entry (ymp.tracks.Track)."""
+    art = thumbnails.CACHE.peek(entry.id) # Listing the queue must not keep every thumbnail fresh
+    return {
+        'mpris:trackid': track_id(index),
+        'mpris:length': int((entry.duration or 0) * 1000000),
+        'mpris:artUrl': thumbnails.art_url(art) if art else '',
+        'xesam:title': entry.label,
+    }
+
+class YmpMprisAdapter:
     """
     Adapter linking the YMP TUI/PlaylistManager to the DBus MPRIS interface.
+    Commands run on the app's thread like key bindings do, never on the DBus thread.
     """
-    def __init__(self, tui_app):
+    def __init__(self, tui_app, controller=None):
         self.app = tui_app
         self.playlist = tui_app.playlist
+        self.controller = controller
+
+    def _call(self, callback, *args):
+        """Runs a command on the app's thread, which drives the player and its workers."""
+        try:
+            return self.app.call_from_thread(callback, *args)
+        except RuntimeError:
+            return None # The app is shutting down
 
     def CanQuit(self):
         return True
@@ -30,7 +72,7 @@ class YmpMprisAdapter(MprisAdapter):
         return False
 
     def HasTrackList(self):
-        return False # Keeping it simple for now
+        return True
 
     def Identify(self):
         return "ymp"
@@ -39,7 +81,7 @@ class YmpMprisAdapter(MprisAdapter):
         return "ymp"
 
     def Quit(self):
-        self.app.action_quit()
+        self._call(self.app.action_quit)
 
     # --- Player Interface ---
 
@@ -62,74 +104,172 @@ class YmpMprisAdapter(MprisAdapter):
         return True
 
     def PlayPause(self):
-        self.app.call_from_thread(self.app.action_toggle_pause)
+        self._call(self.app.action_toggle_pause)
 
     def Play(self):
-        if self.playlist.songpaused:
-            self.app.call_from_thread(self.app.action_toggle_pause)
+        self._call(self.app.set_paused, False)
 
     def Pause(self):
-        if not self.playlist.songpaused:
-             self.app.call_from_thread(self.app.action_toggle_pause)
+        self._call(self.app.set_paused, True)
 
     def Next(self):
-        self.app.call_from_thread(self.app.action_next_song)
+        self._call(self.app.action_next_song)
 
     def Previous(self):
-        self.app.call_from_thread(self.app.action_prev_song)
+        self._call(self.app.action_prev_song)
 
     def Stop(self):
-        self.app.call_from_thread(self.app.action_toggle_pause) # Just pause for now
+        self._call(self.app.set_paused, True) # Just pause for now
+
+    def Position(self):
+        """The position in microseconds, read from the player clock when a client asks."""
+        if not self.playlist.playobj:
+            return 0
+        return int(self.playlist.get_position() * 1000000)
 
     def Seek(self, offset_microseconds):
-         # Offset is relative to current position
-         # offset is in microseconds (1e-6 s)
-         seconds = offset_microseconds / 1000000
-         self.playlist.seeksong(seconds, None)
+        # Offset is relative to current position
+        self._call(self.app.seek_by, offset_microseconds / 1000000)
+
+    def SetPosition(self, track, position_microseconds):
+        self._call(self._set_position, track, position_microseconds / 1000000)
+
+    def _set_position(self, track, seconds):
+        # Ignored unless the track is still the current one (MPRIS spec)
+        if track == self.current_track() and self.playlist.playobj:
+            self.app.seek_by(seconds - self.playlist.get_position())
+
+    # --- TrackList Interface ---
+
+    def current_track(self):
+        """ID of the playing track: the last played entry."""
+        if not self.playlist.playedplaylist:
+            return NO_TRACK
+        return track_id(len(self.playlist.playedplaylist) - 1)
+
+    def _entry(self, index):
+        played, queued = self.playlist.playedplaylist, self.playlist.queuedplaylist
+        try:
+            if index is None or index < 0:
+                return None
+            if index < len(played):
+                return played[index]
+            return queued[index - len(played)]
+        except IndexError:
+            return None
+
+    def Tracks(self):
+        """The current track and the next TRACKLIST_WINDOW queued ones (IDs only)."""
+        played = len(self.playlist.playedplaylist)
+        queued = min(len(self.playlist.queuedplaylist), TRACKLIST_WINDOW)
+        return [track_id(index) for index in range(max(played - 1, 0), played + queued)]
+
+    def CanEditTracks(self):
+        return False
+
+    def GetTracksMetadata(self, tracks):
+        """Metadata of the requested tracks only; unknown (or no longer queued) IDs are skipped."""
+        current = self.current_track()
+        result = []
+        for track in tracks:
+            if track == current and self.controller and self.controller.metadata:
+                result.append(dict(self.controller.metadata))
+                continue
+            index = track_index(track)
+            entry = self._entry(index)
+            if entry is not None:
+                result.append(track_metadata(index, entry))
+        return result
+
+    def GoTo(self, track):
+        self._call(self._go_to, track)
+
+    def _go_to(self, track):
+        index = track_index(track)
+        played = len(self.playlist.playedplaylist)
+        if index is not None and index >= played:
+            self.app.jump_to(index - played)
 
 
 class MprisController:
     """
     Manages the MPRIS Server lifecycle.
+    The server is started in a background thread so the DBus imports don't delay the first frame.
     """
     def __init__(self, tui_app):
         self.app = tui_app
         self.server = None
         self.adapter = None
+        self.metadata = None
+        self.thread = threading.Thread(target=self._start, daemon=True)
+        self.thread.start()
 
-        if not MPRIS_AVAILABLE:
-            tui_app.log_message("MPRIS not available (install mpris_server). Media keys disabled.")
+    def _log(self, msg, level='info'):
+        self.app.log_message(msg, level) # Thread-safe
+
+    def _start(self):
+        if not _try_import_mpris():
+            self._log("MPRIS not available (install mpris_server). Media keys disabled.", 'warning')
             return
 
         try:
-            self.adapter = YmpMprisAdapter(tui_app)
-            self.server = Server("ymp", adapter=self.adapter)
-
-            # Start loop in background
-            self.thread = threading.Thread(target=self.server.loop, daemon=True)
-            self.thread.start()
-            tui_app.log_message("Media Keys (MPRIS) Enabled.")
+            # Mix in the library base class now that it is imported
+            adapter_class = type('YmpMprisAdapter', (YmpMprisAdapter, MprisAdapter), {})
+            self.adapter = adapter_class(self.app, self)
+            server = Server("ymp", adapter=self.adapter)
+            self.server = server
+            self._log("Media Keys (MPRIS) Enabled.")
+            # Blocks for the lifetime of the app
+            server.loop()
         except Exception as e:
-            tui_app.log_message(f"Failed to start MPRIS: {e}")
+            self._log(f"Failed to start MPRIS: {e}", 'error')
             self.server = None
 
-    def update_metadata(self, title, duration=0, artist=""):
+    def update_metadata(self, title, duration=0, artist="", meta=None):
+        """
+        Publishes the current track. Its thumbnail (see ymp.thumbnails) is the artUrl;
+        one that is not cached yet is fetched in the background and published after.
+        """
         if not self.server: return
 
         # Duration in microseconds
         duration_us = int(duration * 1000000) if duration else 0
 
         metadata = {
-            'mpris:trackid': '/ymp/current',
+            'mpris:trackid': self.adapter.current_track(),
             'mpris:length': duration_us,
-            'mpris:artUrl': '', # Could add thumb path
+            'mpris:artUrl': '',
             'xesam:title': title,
             'xesam:artist': [artist] if artist else [],
             'xesam:album': '',
         }
+        self.metadata = metadata
+        if meta and config.is_thumbnails_enabled():
+            art = thumbnails.CACHE.get(meta.get('id'))
+            if art:
+                metadata['mpris:artUrl'] = thumbnails.art_url(art)
+            elif meta.get('id'):
+                threading.Thread(target=self._fetch_art, args=(meta, metadata), daemon=True).start()
         self.server.update_metadata(metadata)
 
+    def _fetch_art(self, meta, metadata):
+        art = thumbnails.CACHE.fetch(meta)
+        # Only if the track is still playing
+        if art and self.metadata is metadata and self.server:
+            metadata['mpris:artUrl'] = thumbnails.art_url(art)
+            self.server.update_metadata(metadata)
+
     def update_playback_status(self, is_playing):
         if not self.server: return
         status = "Playing" if is_playing else "Paused"
         self.server.update_playback_status(status)
+
+    def tracklist_changed(self):
+        """Publishes the (windowed) track list after the queue changed."""
+        if not self.server: return
+        self.server.update_tracklist(self.adapter.Tracks(), self.adapter.current_track())
+
+    def seeked(self):
+        """Tells clients the position jumped (they extrapolate it from the playback status otherwise)."""
+        if not self.server: return
+        self.server.update_position(self.adapter.Position())
@@ -0,0 +1,155 @@
+"""
+Offline mode: playing from the cache and the library while the network is down.
+
+Without a connection every queued song used to run into yt-dlp's timeouts twice
+(stream info, then the download fallback) before the next one was tried. A watcher
+thread now probes a TCP connection to YouTube (`[Network] probe_host`, at most
+PROBE_TIMEOUT seconds): once at startup, then every minute while online and every
+`recheck_seconds` while offline. A failed stream lookup probes right away.
+
+While offline, queued entries are resolved against the local copies only (the cache
+index by video ID, the library by video ID or by the words of a search), without any
+network request. Entries with no local copy are deferred until the connection is back
+and then queued again in front (`offline_queue = defer`), or dropped (`skip`).
+`[Network] offline` (or `ymp --offline`) forces the mode on, `off` never assumes it.
+"""
+import socket
+import threading
+
+import ymp.config as config
+import ymp.tracks as tracks
+
+PROBE_PORT = 443
+PROBE_TIMEOUT = 1.5
+ONLINE_RECHECK_SECONDS = 60
+
+_forced = False
+
+def force_offline(enabled=True):
+    """Runtime override (ymp --offline)."""
+    global _forced
+    _forced = enabled
+
+def mode():
+    return 'on' if _forced else config.get_offline_mode()
+
+class Connectivity:
+    """Whether YouTube is reachable, kept current by a watcher thread; listeners hear about changes."""
+
+    def __init__(self, host=None, timeout=PROBE_TIMEOUT):
+        self.host = host
+        self.timeout = timeout
+        self.online = None # Not probed yet
+        self.listeners = [] # Called with the new state (from the watcher thread)
+        self._checked = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def probe(self):
+        try:
+            socket.create_connection((self.host or config.get_probe_host(), PROBE_PORT), timeout=self.timeout).close()
+            return True
+        except OSError:
+            return False
+
+    def check(self):
+        """Probes now, notifies the listeners if the state changed. Returns whether it is online."""
+        online = self.probe()
+        with self._lock:
+            changed = self.online is not None and online != self.online
+            self.online = online
+        self._checked.set()
+        if changed:
+            for listener in list(self.listeners):
+                try:
+                    listener(online)
+                except Exception:
+                    pass
+        return online
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            online = self.check()
+            self._wake.wait(ONLINE_RECHECK_SECONDS if online else config.get_offline_recheck_seconds())
+            self._wake.clear()
+
+    def is_online(self, wait=False):
+        """
+        The last known state (online until a probe says otherwise). With `wait`, the
+        first probe is waited for, so the first song of a session already knows.
+        """
+        current = mode()
+        if current != 'auto':
+            return current == 'off'
+        self.start()
+        if wait:
+            self._checked.wait(self.timeout + 1)
+        return self.online is not False
+
+    def note_failure(self):
+        """A network request failed: probes right away. Returns whether it is still online."""
+        if mode() != 'auto':
+            return self.is_online()
+        self.start()
+        return self.check()
+
+CONNECTIVITY = Connectivity()
+
+def is_online(wait=False):
+    return CONNECTIVITY.is_online(wait)
+
+def note_failure():
+    return CONNECTIVITY.note_failure()
+
+def on_change(listener):
+    """Calls listener(online) whenever the connection goes down or comes back."""
+    CONNECTIVITY.listeners.append(listener)
+    if mode() == 'auto':
+        CONNECTIVITY.start()
+
+def _words(track):
+    """The search words of a track: its title, or the query of a search."""
+    text = track.title or (track.url if track.source == tracks.SEARCH else None)
+    if not isinstance(text, str):
+        return []
+    if text.endswith(" song"):
+        text = text[:-len(" song")] # Appended to typed queries by Playlist.addsong
+    return text.lower().split()
+
+def local_copy(entry):
+    """
+    (path, meta) of a stored copy of a queue entry, found without the network: by the
+    video ID of a link or resolved entry, else by the words of a search query or title.
+    None if there is none (and for radio stations, which are always live).
+    """
+    import ymp.cacheindex as cacheindex
+    import ymp.library as library
+    import ymp.radio as radio
+    if entry is None or radio.is_station(entry):
+        return None
+    track = tracks.of(entry)
+    vid = track.id or cacheindex.video_id(track.url)
+    if vid:
+        return cacheindex.INDEX.lookup(vid) or library.LIBRARY.lookup(vid)
+    if track.source == tracks.URL:
+        return None # Another site: nothing to match it by
+    words = _words(track)
+    if not words:
+        return None
+    for vid, path, meta in cacheindex.INDEX.entries():
+        text = f"{meta.get('title') or ''} {meta.get('artist') or ''}".lower()
+        if all(word in text for word in words):
+            hit = cacheindex.INDEX.lookup(vid)
+            if hit:
+                return hit
+    for result in library.LIBRARY.search(' '.join(words), 1):
+        return result['url'], {'title': result['title'], 'artist': result.get('channel'),
+                               'duration': result.get('duration') or 0, 'webpage_url': None}
+    return None
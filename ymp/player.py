@@ -3,6 +3,7 @@ import os
 import sys
 import subprocess
 import signal
+import threading
 
 # Check for audio device on Linux
 AUDIO_AVAILABLE = True
@@ -33,6 +34,8 @@ class FFplayProcess:
     def __init__(self, process):
         self.process = process
         self.paused = False
+        self.exited_at = None # perf_counter() time the process ended (only known when traced)
+        self.source = None # ymp.stream.StreamRelay feeding stdin, for live streams
 
     def is_playing(self):
         if self.process.poll() is not None:
@@ -40,6 +43,8 @@ class FFplayProcess:
         return True
 
     def stop(self):
+        if self.source:
+            self.source.detach() # The relay keeps recording, see ymp.stream
         if self.is_playing():
             self.process.terminate()
             try:
@@ -47,22 +52,76 @@ class FFplayProcess:
             except subprocess.TimeoutExpired:
                 self.process.kill()
 
-def genmusic(filepath, start_time_ms):
+def _watch_status(playobj, on_first_audio):
+    """
+    Reads ffplay's -stats output. The status line starts with the playback clock,
+    so the first positive clock value means audio is coming out.
+    """
+    stream = playobj.process.stderr
+    pending = b''
+    while True:
+        chunk = stream.read1(4096)
+        if not chunk:
+            break
+        if on_first_audio is None:
+            continue # Just drain the pipe
+        pending += chunk
+        *lines, pending = pending.replace(b'\r', b'\n').split(b'\n')
+        for line in lines:
+            fields = line.split()
+            try:
+                clock = float(fields[0]) if fields else 0
+            except ValueError:
+                continue
+            if clock > 0:
+                on_first_audio()
+                on_first_audio = None
+                break
+    playobj.exited_at = time.perf_counter()
+
+def genmusic(filepath, start_time_ms, on_first_audio=None, stall_timeout=None, source=None, gain_db=None, end_ms=None):
     """
     Starts playback using ffplay.
     Returns (playobj, start_time_epoch).
+    on_first_audio is called (from a helper thread) once ffplay reports audio output.
+    With a stall_timeout (seconds), ffplay gives up on a network stream that stops sending.
+    With a source (ymp.stream.StreamRelay), ffplay plays what the source feeds into its stdin.
+    gain_db adjusts the volume and end_ms stops playback early (see ymp.analysis).
     """
+    if end_ms and start_time_ms >= end_ms:
+        # Seeked or resumed into the trimmed silence: the song is over
+        playobj = MockPlayObj()
+        playobj.stop()
+        return playobj, time.time()
+
     if not AUDIO_AVAILABLE:
+        if on_first_audio:
+            on_first_audio()
         return MockPlayObj(), time.time()
 
     cmd = ['ffplay', '-nodisp', '-autoexit', '-hide_banner', '-loglevel', 'error']
 
+    stderr = subprocess.DEVNULL
+    if on_first_audio:
+        # -stats prints the status line (clock first) even at loglevel error
+        cmd.append('-stats')
+        stderr = subprocess.PIPE
+
+    if stall_timeout and source is None:
+        cmd.extend(['-rw_timeout', str(int(stall_timeout * 1000000))])
+
     # Seek if needed (ffplay takes seconds)
     if start_time_ms > 0:
         start_seconds = start_time_ms / 1000.0
         cmd.extend(['-ss', str(start_seconds)])
 
-    cmd.append(filepath)
+    if end_ms:
+        cmd.extend(['-t', str((end_ms - start_time_ms) / 1000.0)])
+
+    if gain_db:
+        cmd.extend(['-af', f'volume={gain_db}dB'])
+
+    cmd.append('pipe:0' if source is not None else filepath)
 
     try:
         # Start ffplay in a new process group so signals (like Ctrl+C) don't kill it immediately
@@ -73,12 +132,19 @@ def genmusic(filepath, start_time_ms):
 
         process = subprocess.Popen(
             cmd,
-            stdin=subprocess.DEVNULL,
+            stdin=subprocess.PIPE if source is not None else subprocess.DEVNULL,
             stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
+            stderr=stderr,
             start_new_session=start_new_session
         )
-        return FFplayProcess(process), time.time()
+        playobj = FFplayProcess(process)
+        if source is not None:
+            playobj.source = source
+            source.start()
+            source.pipe_to(process.stdin)
+        if on_first_audio:
+            threading.Thread(target=_watch_status, args=(playobj, on_first_audio), daemon=True).start()
+        return playobj, time.time()
     except Exception as e:
         print(f"Error starting ffplay: {e}")
         return MockPlayObj(), time.time()
@@ -1,6 +1,12 @@
 import ymp.downloader as downloader
 import ymp.player as player
 import ymp.config as config
+import ymp.tracing as tracing
+import ymp.metrics as metrics
+import ymp.stream as stream
+import ymp.analysis as analysis
+import ymp.offline as offline
+import ymp.tracks as tracks
 import os
 import time
 import threading
@@ -8,82 +14,179 @@ import threading
 
 import random
 from termcolor import colored
-from rich.console import Console
-from rich.table import Table
-from rich.progress import Progress, BarColumn, TextColumn, TimeRemainingColumn
 
-console = Console()
+_console = None
+
+def console():
+    """Returns the shared Rich console, created on first use."""
+    global _console
+    if _console is None:
+        from rich.console import Console
+        _console = Console()
+    return _console
 
 class Playlist:
     """Manages the playlist, including queuing, playback, and song history."""
 
     def __init__(self):
         """Initializes the Playlist object."""
-        self.queuedplaylist=[]
+        self.queuedplaylist=[] # ymp.tracks.Track entries
         self.playedplaylist=[]
         self.starttime = None
         self.pausetime = None
         self.meta = None
         self.filepath = None
+        self.cachepath = None # Local copy of the current song, if known
         self.playobj = None
         self.resumetime = None
         self.songpaused = False
         self.repeat = 0
         self.enable_rich_ui = True # Flag to control CLI output
-        self.playback_progress = Progress(
-            TextColumn("[bold green]Playing:"),
-            BarColumn(),
-            "[progress.percentage]{task.percentage:>3.0f}%",
-            "•",
-            TimeRemainingColumn(),
-        )
+        self._playback_progress = None
+        self.trace = tracing.NULL_TRACE # Trace of the song being started (see ymp.tracing)
+        self.ended_at = None # perf_counter() time the previous song ended (for the track gap metric)
+        self.station = None # ymp.radio.Station while a radio station is playing
+        self.relay = None # ymp.stream.StreamRelay of the playing station
+        self.gain = None # dB applied to the current song (ymp.analysis)
+        self.end_ms = None # Where the current song's trailing silence starts
+        self.on_stream_event = None # Called with stream drop/reconnect messages (from the relay thread)
+        self.deferred = [] # Entries with no local copy while offline (see ymp.offline)
+        self.revision = 0 # Bumped on every change to the queue, history or deferred entries (see ymp.session)
         self.preload_thread = None
         self.preload_done = set() # Keep track of what we've already preloaded
 
+    @property
+    def playback_progress(self):
+        """Rich progress bar for CLI output, only built when the Rich UI actually uses it."""
+        if self._playback_progress is None:
+            from rich.progress import Progress, BarColumn, TextColumn, TimeRemainingColumn
+            self._playback_progress = Progress(
+                TextColumn("[bold green]Playing:"),
+                BarColumn(),
+                "[progress.percentage]{task.percentage:>3.0f}%",
+                "•",
+                TimeRemainingColumn(),
+            )
+        return self._playback_progress
+
+    def changed(self):
+        """Marks the queue/history as changed, for code that edits the lists directly."""
+        self.revision += 1
+
+    def has_next(self):
+        """True if the next song can be started (not a playlist whose next page is still loading)."""
+        return bool(self.queuedplaylist) and self.queuedplaylist[0].state != tracks.EXPANDING
+
     def returnsong(self):
         """Returns the next song from the queue and adds it to the played list."""
-        if not self.queuedplaylist:
+        if not self.has_next():
             return None
 
-        song_info = self.queuedplaylist.pop(0)
-        self.playedplaylist.append(song_info)
-
-        if isinstance(song_info, dict):
-            return song_info.get('url') or song_info.get('title')
-        return song_info # It's already a string
-
-    def addsong(self,query):
-        """Adds a song to the queue."""
-        # Check if it's just a search term
-        if isinstance(query, dict):
-            self.queuedplaylist.append(query)
+        track = self.queuedplaylist.pop(0)
+        self.playedplaylist.append(track)
+        self.changed()
+        return track.url # A link, file path or search query
+
+    def defer_last(self):
+        """
+        Takes the entry just popped by returnsong() out of the history again, as it cannot
+        be played offline. Returns True if it is kept for requeue_deferred(), False if dropped.
+        """
+        if not self.playedplaylist:
+            return False
+        entry = self.playedplaylist.pop()
+        self.changed()
+        if config.get_offline_queue() != 'defer':
+            return False
+        self.deferred.append(entry)
+        return True
+
+    def requeue_deferred(self):
+        """Queues the deferred entries again, in front. Returns how many."""
+        count = len(self.deferred)
+        self.queuedplaylist[:0] = self.deferred
+        self.deferred = []
+        self.changed()
+        return count
+
+    def begin_expansion(self, link):
+        """
+        Keeps a queued playlist link in place while its videos are fetched: they are
+        queued in front of it by expand(), end_expansion() removes it. Returns how many
+        were queued before (a link restored from a session continues from there).
+        """
+        link.state = tracks.EXPANDING
+        link.extra = {'queued': (link.extra or {}).get('queued', 0)}
+        self.changed()
+        return link.extra['queued']
+
+    def expand(self, link, songs):
+        """Queues songs of an expanding playlist in front of its link. False if the link was removed."""
+        index = next((i for i, track in enumerate(self.queuedplaylist) if track is link), None)
+        if index is None:
+            return False
+        self.queuedplaylist[index:index] = [self._entry(song) for song in songs]
+        link.extra['queued'] += len(songs)
+        self.changed()
+        return True
+
+    def end_expansion(self, link):
+        """Removes the link of a playlist once all its videos are queued; if there were none, it stays a song."""
+        if link.extra['queued']:
+            self.queuedplaylist[:] = [track for track in self.queuedplaylist if track is not link]
+        else:
+            link.state, link.extra = tracks.UNRESOLVED, None
+        self.changed()
+
+    def mark_resolved(self, meta):
+        """
+        Resolves the last played entry to the video that was played,
+        so replaying it (back/repeat/resume) skips the search.
+        """
+        if not meta or not self.playedplaylist or not meta.get('webpage_url'):
             return
+        self.playedplaylist[-1].resolve(meta)
+        self.changed()
 
-        if not query.startswith("http"):
+    def addsong(self,query):
+        """Adds a song (Track, entry dict, link, file or search query) to the queue."""
+        self.queuedplaylist.append(self._entry(query))
+        self.changed()
+
+    def insertsongs(self, index, songs):
+        """Queues songs at `index` (0 = next), in order. Returns their tracks."""
+        entries = [self._entry(song) for song in songs]
+        self.queuedplaylist[index:index] = entries
+        self.changed()
+        return entries
+
+    def _entry(self, query):
+        if isinstance(query, str) and not query.startswith("http") and not os.path.exists(query): # Local files play as they are
             query += " song"
-        self.queuedplaylist.append(query)
+        return tracks.of(query)
 
     def downloadsong(self,song,dir_path):
         """Downloads a song."""
-        meta, filepath = downloader.download(song,dir_path)
+        meta, filepath = downloader.download(song,dir_path,lookup='play')
         self.filepath = filepath
         return meta
 
     def check_preload(self, elapsed_seconds):
         """Checks if we should preload the next song."""
-        if not config.is_preload_enabled() or not self.queuedplaylist:
+        if not config.is_preload_enabled() or not self.queuedplaylist or not offline.is_online():
             return
 
         trigger = config.get_preload_trigger()
         if elapsed_seconds > trigger:
-            next_song = self.queuedplaylist[0]
+            if self.queuedplaylist[0].source in (tracks.FILE, tracks.STATION) or not self.has_next():
+                return # Nothing to download
+            next_song = self.queuedplaylist[0].url
             # Avoid downloading the same object multiple times if check runs often
-            song_id = str(next_song)
-            if song_id in self.preload_done:
+            if next_song in self.preload_done:
                 return
 
             # Start background download
-            self.preload_done.add(song_id)
+            self.preload_done.add(next_song)
             threading.Thread(target=self._background_download, args=(next_song,), daemon=True).start()
 
     def _background_download(self, song):
@@ -91,36 +194,124 @@ class Playlist:
         # Using config.get_music_dir() implicitly via downloader logic if smart download on
         try:
             # We don't need the result, just want it cached on disk
-            downloader.download(song)
+            downloader.download(song, lookup='preload')
         except Exception as e:
             pass # Silent fail in background is okay
 
     def shuffleplaylist(self):
             """Shuffles the queued playlist."""
             random.shuffle(self.queuedplaylist)
-            if self.enable_rich_ui: console.print("Queue Shuffled", style="bold green")
+            self.changed()
+            if self.enable_rich_ui: console().print("Queue Shuffled", style="bold green")
 
-    def playsong(self,meta,dir_path):
-        """Plays a song."""
+    def playsong(self,meta,dir_path,start_ms=0,relay=None):
+        """Plays a song (a radio mirror through `relay`, if connect_stream() opened it already)."""
         self.meta=meta
-        self.resumetime=0
+        if self.filepath and os.path.exists(self.filepath):
+            self.cachepath = self.filepath
+            metrics.TRACKS_STARTED.inc(source='cache')
+            metrics.SERVED_BYTES.inc(os.path.getsize(self.filepath))
+        else:
+            self.cachepath = None
+            metrics.TRACKS_STARTED.inc(source='stream')
+
+        # Gain and silence trimming from the analysis done after the download
+        self.gain, lead, end = analysis.playback_options(self.cachepath)
+        self.end_ms = end * 1000 if end else None
+        start_ms = max(start_ms, lead * 1000)
+        self.resumetime=start_ms
 
         # Reset preload tracking for the new song cycle
         self.preload_done.clear()
 
         if self.enable_rich_ui:
-             console.print(f"[bold yellow]Currently Playing:[/] {meta['title']}")
+             console().print(f"[bold yellow]Currently Playing:[/] {meta['title']}")
              self.playback_task = self.playback_progress.add_task("playback", total=meta.get('duration', 100))
              self.playback_progress.start()
 
-        self.playobj,self.starttime=player.genmusic(self.filepath,0)
+        trace = self.trace
+        on_first_audio = trace.first_audio if not trace.finished else None
+        with trace.span('spawn'):
+            self.playobj,self.starttime=player.genmusic(self.filepath,start_ms,on_first_audio,self.stall_timeout(),self.open_stream(relay),
+                                                        self.gain,self.end_ms)
+        trace.player_started()
+        if self.ended_at is not None:
+            metrics.TRACK_GAP_SECONDS.observe(time.perf_counter() - self.ended_at)
+            self.ended_at = None
+
+    def stall_timeout(self):
+        return config.get_radio_stall_timeout() if self.station else None
+
+    def open_stream(self, relay=None):
+        """A relay for the current radio mirror, or None to let ffplay read the file/URL itself."""
+        self.close_stream()
+        if relay is not None:
+            self.relay = relay
+        elif self.station and stream.is_relayable(self.filepath):
+            self.relay = stream.StreamRelay(self.filepath, on_event=self.on_stream_event)
+        return self.relay
+
+    def connect_stream(self, url):
+        """
+        Starts a relay for a radio mirror and waits until it delivers audio or fails, so
+        the caller can do the network part before taking its lock (see playsong's relay).
+        None for a mirror the relay does not handle.
+        """
+        if not stream.is_relayable(url):
+            return None
+        relay = stream.StreamRelay(url, on_event=self.on_stream_event)
+        relay.start()
+        relay.wait_connected()
+        return relay
+
+    def close_stream(self):
+        """Stops recording the station (and drops its timeshift buffer)."""
+        if self.relay:
+            self.relay.close()
+            self.relay = None
+
+    def stream_stats(self):
+        """Outage/reconnect counts of the playing station, None for anything else."""
+        if not self.station or not self.relay:
+            return None
+        return self.relay.stats()
+
+    def play_station(self, station, url):
+        """Starts a radio station on the given mirror."""
+        self.station = station
+        self.filepath = url
+        self.playsong(station.meta(), None)
+
+    def failover_station(self):
+        """
+        Called when the player of a radio station ended on its own (disconnect or stall):
+        restarts it on the next mirror. Returns False once every mirror failed.
+        """
+        url = self.station.next_mirror() if self.station else None
+        if not url:
+            self.station = None
+            return False
+        self.filepath = url
+        self.playsong(self.meta, None)
+        return True
+
+    def mark_finished(self, exited_at=None):
+        """Remembers when the current song ended, so the gap to the next one can be measured."""
+        self.ended_at = exited_at or time.perf_counter()
+
+    def get_position(self):
+        """Returns the playback position of the current song in seconds."""
+        if not self.playobj:
+            return 0
+        if self.songpaused or not self.starttime:
+            return (self.resumetime or 0) / 1000
+        return ((time.time() - self.starttime) * 1000 + (self.resumetime or 0)) / 1000
 
     def update_playback_progress(self):
         """Updates the playback progress bar and triggers preload."""
         if self.playobj and not self.songpaused:
             if self.starttime:
-                elapsed_ms = (time.time() - self.starttime) * 1000 + (self.resumetime or 0)
-                elapsed_seconds = elapsed_ms / 1000
+                elapsed_seconds = self.get_position()
                 if self.enable_rich_ui and hasattr(self, 'playback_task'):
                      self.playback_progress.update(self.playback_task, completed=elapsed_seconds)
 
@@ -129,7 +320,7 @@ class Playlist:
 
     def stop_playback_progress(self):
         """Stops and removes the playback progress bar."""
-        if self.enable_rich_ui:
+        if self.enable_rich_ui and self._playback_progress is not None:
             self.playback_progress.stop()
             if hasattr(self, 'playback_task'):
                  try:
@@ -141,32 +332,44 @@ class Playlist:
         """Resumes a paused song."""
         if self.songpaused==True:
             if self.enable_rich_ui:
-                 console.print(f"Resuming: {self.meta['title']}", style="yellow")
+                 console().print(f"Resuming: {self.meta['title']}", style="yellow")
                  self.playback_progress.start()
-            self.playobj,self.starttime=player.genmusic(self.filepath,self.resumetime)
+            if self.relay and not self.relay.closed:
+                # Radio continues from the timeshift buffer where it was paused
+                source, start_ms = self.relay, 0
+            else:
+                source = self.open_stream()
+                start_ms = 0 if source else self.resumetime # A live stream cannot be seeked
+            self.playobj,self.starttime=player.genmusic(self.filepath,start_ms,stall_timeout=self.stall_timeout(),source=source,
+                                                        gain_db=self.gain,end_ms=self.end_ms)
+            metrics.PLAYER_RESTARTS.inc()
             self.songpaused=False
         else:
-            if self.enable_rich_ui: console.print("Already Playing", style="bold red")
+            if self.enable_rich_ui: console().print("Already Playing", style="bold red")
 
     def stop_all(self):
         """Stops playback and releases resources."""
+        self.station = None
         self.stop_playback_progress()
         if self.playobj:
             self.playobj.stop()
+        self.close_stream()
         self.songpaused = False
 
     def pausesong(self):
         """Pauses the current song."""
         if self.songpaused==True:
-            console.print("Already Paused", style="bold red")
+            console().print("Already Paused", style="bold red")
         else:
             self.songpaused=True
             self.pausetime=player.pausemusic(self.playobj)
             self.resumetime = self.resumetime+((self.pausetime - self.starttime)*1000)
-            self.playback_progress.stop()
+            if self.enable_rich_ui: self.playback_progress.stop()
 
     def nextsong(self):
         """Skips to the next song."""
+        self.station = None # Skipped on purpose, no failover
+        self.close_stream()
         self.stop_playback_progress()
         if self.repeat==2:
             self.repeat=0
@@ -181,28 +384,35 @@ class Playlist:
     def shiftlastplayedsong(self):
         """Moves the last played song to the front of the queue."""
         self.queuedplaylist=[self.playedplaylist.pop()]+self.queuedplaylist
+        self.changed()
 
     def loopqueue(self):
         """Loops the queue by adding the played songs back to the queue."""
         self.queuedplaylist.extend(self.playedplaylist)
         self.playedplaylist.clear()
+        self.changed()
 
     def removelastqueuedsong(self):
         """Removes the last song from the queue."""
         try:
             self.queuedplaylist.pop()
+            self.changed()
         except:
             print("Empty queue")
 
     def previoussong(self):
         """Goes back to the previous song."""
         try:
+            self.station = None
+            self.close_stream()
             self.stop_playback_progress()
             self.queuedplaylist=[self.playedplaylist.pop()]+self.queuedplaylist
             self.queuedplaylist=[self.playedplaylist.pop()]+self.queuedplaylist
+            self.changed()
             self.playobj.stop()
             self.songpaused=False
         except:
+            self.changed() # The current song may have been moved back already
             print(colored("Error: can't go back beyond start ",'red'))
 
     def repeatsong(self,mode):
@@ -220,9 +430,23 @@ class Playlist:
         """Seeks forward or backward in the current song."""
         if self.songpaused==False:
             self.pausesong()
+        if self.relay and not self.relay.closed:
+            # Radio: within the timeshift buffer, up to the live edge
+            value = self.relay.seek(value)
         self.resumetime=self.resumetime + (value*1000)
         self.resumesong(dir_path)
 
+    def timeshift_label(self):
+        """'live' or how far the station plays behind the live edge, None if no station plays."""
+        if not self.station or not self.relay:
+            return None
+        stats = self.relay.stats()
+        behind = stats['behind']
+        # While playing, the read-ahead reserve plus a few seconds in ffplay and the pipe
+        if behind < stats['reserve'] + 5:
+            return "live"
+        return f"{int(behind) // 60}:{int(behind) % 60:02d} behind live"
+
     def returnplaylist(self):
         """Returns the entire playlist (played and queued songs)."""
         allplaylist=self.playedplaylist+self.queuedplaylist
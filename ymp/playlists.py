@@ -0,0 +1,234 @@
+"""
+Streaming playlist parsing: PLS, M3U/EXTM3U (#EXTINF), M3U8/HLS and XSPF.
+
+Playlists are read in chunks from a local file or over HTTP and M3U/XSPF entries are
+yielded while parsing, so a library export with tens of thousands of lines starts filling
+the queue right away and is never held in memory as a whole.
+The format is taken from the content when it identifies itself, else from the extension.
+"""
+import codecs
+import itertools
+import os
+import re
+from urllib.parse import unquote, urljoin, urlparse
+
+CHUNK_SIZE = 64 * 1024
+
+EXTENSIONS = {'.pls': 'pls', '.m3u': 'm3u', '.m3u8': 'm3u', '.xspf': 'xspf'}
+
+PLS_LINE = re.compile(r'(file|title|length)(\d+)\s*=(.*)', re.IGNORECASE)
+# Tags that only appear in HLS playlists: the playlist is a stream, not a list of songs
+HLS_TAGS = ('#EXT-X-TARGETDURATION', '#EXT-X-STREAM-INF', '#EXT-X-MEDIA-SEQUENCE', '#EXT-X-VERSION', '#EXT-X-KEY')
+XSPF_NS = '{http://xspf.org/ns/0/}'
+
+def is_url(source):
+    return isinstance(source, str) and (source.startswith('http://') or source.startswith('https://'))
+
+def _extension(source):
+    path = urlparse(source).path if is_url(source) else source
+    return os.path.splitext(path)[1].lower()
+
+def sniff(head):
+    """Detects the format from the first bytes of a playlist, or None."""
+    text = head.lstrip(b'\xef\xbb\xbf \t\r\n')[:512].lower()
+    if text.startswith(b'[playlist]'):
+        return 'pls'
+    if text.startswith(b'#extm3u'):
+        return 'm3u'
+    if text.startswith(b'<?xml') or text.startswith(b'<playlist'):
+        if b'xspf.org' in head[:1024].lower():
+            return 'xspf'
+    return None
+
+def detect_format(source, head=b''):
+    return sniff(head) or EXTENSIONS.get(_extension(source))
+
+def is_playlist(source):
+    """True for playlist URLs/files ymp can parse (by extension, local files also by content)."""
+    if not isinstance(source, str):
+        return False
+    if _extension(source) in EXTENSIONS:
+        return True
+    if not is_url(source) and os.path.isfile(source):
+        try:
+            with open(source, 'rb') as f:
+                return sniff(f.read(512)) is not None
+        except OSError:
+            return False
+    return False
+
+def read_chunks(source):
+    """Yields the raw bytes of a local file or URL in chunks."""
+    if is_url(source):
+        import requests
+        with requests.get(source, stream=True, timeout=10) as response:
+            response.raise_for_status()
+            yield from response.iter_content(CHUNK_SIZE)
+    else:
+        with open(source, 'rb') as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+def iter_lines(chunks):
+    """Decodes chunks as UTF-8 (bad bytes replaced) and yields lines without line endings."""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+    pending = ''
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split('\n')
+        for line in lines:
+            yield line.rstrip('\r')
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending.rstrip('\r')
+
+def _resolve(location, source):
+    """Makes a playlist location absolute, relative to the playlist itself."""
+    if is_url(location) or '://' in location:
+        if location.startswith('file://'):
+            return unquote(urlparse(location).path)
+        return location
+    if is_url(source):
+        return urljoin(source, location)
+    if os.path.isabs(location) or not source:
+        return location
+    return os.path.join(os.path.dirname(os.path.abspath(source)), location)
+
+def parse_pls(chunks, source=None):
+    """
+    Yields {'url', 'title', 'length'} per FileN of a PLS playlist, in N order.
+    Keys may come in any order (all FileN, then all TitleN, ...), so entries are
+    only yielded once the whole file is read; PLS files are small station lists.
+    """
+    numbered = {} # N -> {'file', 'title', 'length'}
+    for line in iter_lines(chunks):
+        match = PLS_LINE.match(line.strip())
+        if match:
+            key, number, value = match.groups()
+            numbered.setdefault(int(number), {})[key.lower()] = value.strip()
+    for number in sorted(numbered):
+        if numbered[number].get('file'):
+            yield _pls_entry(numbered[number], source)
+
+def _pls_entry(fields, source):
+    try:
+        length = int(fields.get('length', -1))
+    except ValueError:
+        length = -1
+    return {'url': _resolve(fields['file'], source), 'title': fields.get('title') or None, 'length': length}
+
+def parse_m3u(chunks, source=None):
+    """
+    Yields {'url', 'title', 'length'} per entry of an M3U/M3U8 playlist, using #EXTINF.
+    An HLS playlist is a single stream: it yields one entry for the playlist itself.
+    """
+    title, length = None, -1
+    found = False
+    for line in iter_lines(chunks):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('#'):
+            tag = line.upper()
+            if tag.startswith('#EXTINF:'):
+                info, _, title = line[len('#EXTINF:'):].partition(',')
+                title = title.strip() or None
+                try:
+                    # Duration, possibly followed by attributes (tvg-id="..." etc.)
+                    length = int(float(info.split()[0])) if info.split() else -1
+                except ValueError:
+                    length = -1
+            elif tag.startswith(HLS_TAGS) and not found:
+                yield {'url': source, 'title': None, 'length': -1, 'hls': True}
+                return
+            continue
+        found = True
+        yield {'url': _resolve(line, source), 'title': title, 'length': length}
+        title, length = None, -1
+
+def parse_xspf(chunks, source=None):
+    """Yields {'url', 'title', 'length'} per track of an XSPF playlist (XML parsed incrementally)."""
+    from xml.etree.ElementTree import XMLPullParser
+    parser = XMLPullParser(events=('end',))
+    for chunk in itertools.chain(chunks, [None]):
+        if chunk is None:
+            parser.close()
+        else:
+            parser.feed(chunk)
+        for _, element in parser.read_events():
+            if element.tag != XSPF_NS + 'track':
+                continue
+            location = element.findtext(XSPF_NS + 'location')
+            if location:
+                title = element.findtext(XSPF_NS + 'title')
+                creator = element.findtext(XSPF_NS + 'creator')
+                if title and creator:
+                    title = f"{creator} - {title}"
+                duration = element.findtext(XSPF_NS + 'duration')
+                length = int(duration) // 1000 if duration and duration.strip().isdigit() else -1
+                yield {'url': _resolve(location.strip(), source), 'title': title or None, 'length': length}
+            element.clear() # Keeps memory flat on big playlists
+
+def batches(entries, size=50):
+    """
+    Groups entries into lists for queueing: the first entry on its own, so playback
+    can start right away, then `size` at a time.
+    """
+    batch = []
+    for count, entry in enumerate(entries, 1):
+        batch.append(entry)
+        if count == 1 or len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+PARSERS = {'pls': parse_pls, 'm3u': parse_m3u, 'xspf': parse_xspf}
+
+def open_playlist(source, chunks=None):
+    """Returns (format, chunks) with the first chunk peeked for content sniffing."""
+    chunks = iter(read_chunks(source) if chunks is None else chunks)
+    head = next(chunks, b'')
+    fmt = detect_format(source, head)
+    if fmt not in PARSERS:
+        raise ValueError(f"Not a playlist ymp can read: {source}")
+    return fmt, itertools.chain([head], chunks)
+
+def iter_entries(source, chunks=None):
+    """Yields the {'url', 'title', 'length'} entries of a playlist file or URL while it is read."""
+    fmt, chunks = open_playlist(source, chunks)
+    yield from PARSERS[fmt](chunks, source)
+
+def _display_name(location):
+    if is_url(location):
+        return location
+    return os.path.splitext(os.path.basename(location))[0]
+
+def local_meta(entry):
+    """Player metadata for a queue entry that is a local audio file, else None."""
+    import ymp.tracks as tracks
+    track = tracks.of(entry)
+    if track.source != tracks.FILE or not os.path.isfile(track.url):
+        return None
+    return {'title': track.title or _display_name(track.url), 'duration': track.duration or 0, 'webpage_url': None}
+
+def iter_queue_entries(source, chunks=None):
+    """
+    Yields queue entries for a playlist while it is read. A radio PLS becomes one
+    station with its mirrors (see ymp.radio), anything else one entry per song.
+    """
+    fmt, chunks = open_playlist(source, chunks)
+    if fmt == 'pls':
+        import ymp.radio as radio
+        # Radio PLS files are tiny and need all mirrors at once
+        yield from radio.queue_entries(list(parse_pls(chunks, source)), name=_display_name(source))
+        return
+    for entry in PARSERS[fmt](chunks, source):
+        yield {
+            'url': entry['url'],
+            'title': entry['title'] or _display_name(entry['url']),
+            'duration': entry['length'] if entry['length'] > 0 else None,
+        }
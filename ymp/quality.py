@@ -0,0 +1,157 @@
+"""
+Bandwidth-adaptive audio format selection.
+
+Downloads report their throughput (bytes per connection per second, from the
+progress hooks), which is kept as a moving average in bandwidth.json. Streams and
+downloads pick a format tier from it: on a poor link a low bitrate stream starts
+right away instead of buffering the biggest opus format, with headroom it is the
+best audio as before. Songs cached below the best tier are downloaded again at best
+quality once the link allows it, while no other download runs (`[Quality] upgrade`).
+"""
+import json
+import os
+import threading
+import time
+
+import ymp.config as config
+import ymp.offline as offline
+
+BANDWIDTH_FILE = os.path.join(config.CONFIG_DIR, 'bandwidth.json')
+
+# yt-dlp format per tier, from the smallest
+TIERS = {
+    'low': 'bestaudio[abr<=64]/worstaudio/worst',
+    'medium': 'bestaudio[abr<=128]/bestaudio/best',
+    'best': 'bestaudio/best',
+}
+# Throughput (bytes/s) a tier needs to start without buffering, about 6x its bitrate
+TIER_THRESHOLDS = (('best', 125_000), ('medium', 48_000))
+
+MIN_SAMPLE_BYTES = 256 * 1024 # Shorter transfers mostly measure latency
+SMOOTHING = 0.3 # Weight of a new sample in the moving average
+MAX_AGE_SECONDS = 6 * 3600 # An older estimate says nothing about the current link
+IDLE_SECONDS = 30 # Upgrades wait until no download ran for this long
+
+class ThroughputEstimate:
+    """Moving average of recent per-connection throughput, persisted between runs."""
+
+    def __init__(self, path=BANDWIDTH_FILE):
+        self.path = path
+        self.value = None
+        self.updated = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if not self._loaded:
+            self._loaded = True
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.value, self.updated = float(data['bytes_per_second']), float(data['updated'])
+            except (OSError, ValueError, KeyError, TypeError):
+                pass
+
+    def add(self, nbytes, seconds, connections=1):
+        """Records a finished transfer of `nbytes` in `seconds` over `connections` connections."""
+        if nbytes < MIN_SAMPLE_BYTES or seconds <= 0:
+            return
+        sample = nbytes / seconds / max(1, connections)
+        with self._lock:
+            self._load()
+            if self.value is None or time.time() - self.updated > MAX_AGE_SECONDS:
+                self.value = sample
+            else:
+                self.value += SMOOTHING * (sample - self.value)
+            self.updated = time.time()
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                tmp_path = self.path + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'bytes_per_second': self.value, 'updated': self.updated}, f)
+                os.replace(tmp_path, self.path)
+            except OSError:
+                pass
+
+    def current(self):
+        """Bytes/s per connection, or None if nothing was measured recently."""
+        with self._lock:
+            self._load()
+            if self.value is None or time.time() - self.updated > MAX_AGE_SECONDS:
+                return None
+            return self.value
+
+ESTIMATE = ThroughputEstimate()
+
+def choose_tier(purpose='stream', estimate=ESTIMATE):
+    """
+    The format tier for a stream (one connection) or a download (several, see
+    ymp.chunked). 'best' when adaptive quality is off or the link was not measured yet.
+    """
+    if not config.is_adaptive_quality_enabled():
+        return 'best'
+    throughput = estimate.current()
+    if throughput is None:
+        return 'best'
+    if purpose == 'download':
+        throughput *= max(1, config.get_download_connections())
+    for tier, needed in TIER_THRESHOLDS:
+        if throughput >= needed:
+            return tier
+    return 'low'
+
+def format_for(tier):
+    return TIERS.get(tier, TIERS['best'])
+
+def progress_hook(d):
+    """yt-dlp progress hook feeding finished downloads into the estimate."""
+    if d['status'] == 'finished' and d.get('elapsed'):
+        ESTIMATE.add(d.get('downloaded_bytes') or d.get('total_bytes') or 0, d['elapsed'], d.get('connections', 1))
+
+class Upgrader:
+    """Downloads songs cached below the best tier again, in idle time, one after the other."""
+
+    def __init__(self):
+        self.failed = set()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def schedule(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def candidates(self):
+        import ymp.cacheindex as cacheindex
+        return [vid for vid, path, meta in cacheindex.INDEX.entries()
+                if meta.get('quality', 'best') != 'best' and vid not in self.failed]
+
+    def _run(self):
+        import ymp.downloader as downloader
+        while True:
+            # Only while nothing else downloads and the link has headroom for the best tier
+            while (downloader.idle_seconds() < IDLE_SECONDS or choose_tier('download') != 'best'
+                   or not offline.is_online()):
+                time.sleep(5)
+            with self._lock:
+                todo = self.candidates()
+                if not todo:
+                    self._thread = None
+                    return
+            try:
+                if not downloader.upgrade(todo[0]):
+                    self.failed.add(todo[0])
+            except Exception:
+                self.failed.add(todo[0]) # Never retried in this run
+
+_upgrader = None
+
+def schedule_upgrade():
+    """Starts upgrading songs cached at a lower quality (if enabled)."""
+    global _upgrader
+    if not config.is_quality_upgrade_enabled():
+        return
+    if _upgrader is None:
+        _upgrader = Upgrader()
+    _upgrader.schedule()
@@ -0,0 +1,135 @@
+"""
+Internet radio: a radio PLS file lists mirrors of one station, not separate songs.
+
+Such a playlist is queued as one station entry. When it is played, the mirrors are
+probed concurrently (connect + first bytes) and playback starts on the first one
+that answers. When a mirror drops, the player switches to the next one on its own.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import ymp.config as config
+import ymp.tracks as tracks
+
+PROBE_BYTES = 1024
+# A mirror that played this long before dropping counts as working, not as a failed start
+STABLE_SECONDS = 30
+
+def is_station(entry):
+    return entry is not None and tracks.of(entry).source == tracks.STATION
+
+def queue_entries(entries, name=None):
+    """
+    Turns parsed PLS entries ({'url', 'title', 'length'}) into queue entries.
+    Live streams (no LengthN or LengthN=-1) become a single station with every
+    FileN as a mirror; anything else stays a list of songs with their titles.
+    """
+    if not entries:
+        return []
+    if any((e.get('length') or -1) > 0 for e in entries):
+        return [{'url': e['url'], 'title': e.get('title') or e['url'], 'duration': e.get('length')} for e in entries]
+    title = next((e['title'] for e in entries if e.get('title')), None) or name or entries[0]['url']
+    return [{
+        '_type': 'station',
+        'title': title,
+        'url': entries[0]['url'],
+        'mirrors': [e['url'] for e in entries],
+        'titles': [e.get('title') for e in entries],
+    }]
+
+def probe(url, timeout=5, session=None):
+    """Connects to a mirror and reads the first bytes. Returns the seconds it took, None on failure."""
+    if session is None:
+        import requests
+        session = requests
+    start = time.perf_counter()
+    try:
+        with session.get(url, stream=True, timeout=timeout) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(PROBE_BYTES):
+                if chunk:
+                    return time.perf_counter() - start
+    except Exception:
+        pass
+    return None
+
+class Station:
+    """The mirrors of a playing station, in the order they are tried."""
+
+    def __init__(self, entry):
+        entry = tracks.of(entry)
+        self.title = entry.label
+        self.mirrors = list(entry.extra['mirrors'])
+        self.titles = dict(zip(entry.extra['mirrors'], entry.extra['titles']))
+        self.index = 0
+        self.failures = 0 # Consecutive mirrors that dropped right after starting
+        self.started_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return self.mirrors[self.index]
+
+    def race(self, timeout=None):
+        """
+        Probes all mirrors concurrently and returns the first one that delivers audio
+        (or None if none does). The remaining mirrors are reordered by how fast they
+        answered once their probes finish, so failover tries the next fastest first.
+        """
+        if len(self.mirrors) == 1:
+            return self.start() # Nothing to choose from, let the player connect directly
+        timeout = timeout or config.get_radio_probe_timeout()
+        executor = ThreadPoolExecutor(max_workers=len(self.mirrors))
+        futures = {executor.submit(probe, url, timeout): url for url in self.mirrors}
+        executor.shutdown(wait=False)
+
+        results = {}
+        pending = as_completed(futures)
+        winner = None
+        for future in pending:
+            results[futures[future]] = future.result()
+            if results[futures[future]] is not None:
+                winner = futures[future]
+                break
+        if winner is None:
+            return None
+
+        with self._lock:
+            self.mirrors = [winner] + [url for url in self.mirrors if url != winner]
+            self.index = 0
+        threading.Thread(target=self._order_fallbacks, args=(pending, futures, results), daemon=True).start()
+        return self.start()
+
+    def _order_fallbacks(self, pending, futures, results):
+        for future in pending:
+            results[futures[future]] = future.result()
+        with self._lock:
+            if self.index == 0: # Still on the winner
+                # Fastest first, the ones that failed last
+                self.mirrors[1:] = sorted(self.mirrors[1:], key=lambda url: (results.get(url) is None, results.get(url) or 0))
+
+    def start(self):
+        """Marks the current mirror as playing from now on and returns it."""
+        self.started_at = time.monotonic()
+        return self.url
+
+    def next_mirror(self):
+        """After a drop: returns the mirror to switch to, or None once every mirror failed in a row."""
+        with self._lock:
+            if self.started_at is not None and time.monotonic() - self.started_at < STABLE_SECONDS:
+                self.failures += 1
+            else:
+                self.failures = 0
+            if self.failures >= len(self.mirrors):
+                return None
+            self.index = (self.index + 1) % len(self.mirrors)
+        return self.start()
+
+    def label(self):
+        """Display name of the current mirror, e.g. 'Station (mirror 2/3)'."""
+        mirror = f" (mirror {self.index + 1}/{len(self.mirrors)})" if len(self.mirrors) > 1 else ""
+        return f"{self.titles.get(self.url) or self.title}{mirror}"
+
+    def meta(self):
+        return {'title': self.title, 'duration': 0, 'webpage_url': None, 'is_live': True}
@@ -0,0 +1,139 @@
+"""
+YouTube search for the TUI's search panel, with a persistent result cache.
+
+A search fetches one page of flat results (no per-video extraction), about a second.
+Results are kept per normalised query in search_cache.json, least recently used
+first out (`[Search] cache_entries`), so a repeated query is answered from disk.
+While typing, a query that extends a cached one ("daft pu" -> "daft punk") is first
+answered by filtering the cached results; only when fewer than the panel shows remain
+does it go to the network (debounced and cancelled by the TUI, see YmpTui.run_search).
+
+Results double as queue entries: {'id', 'url', 'title', 'channel', 'duration'}.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import ymp.config as config
+
+SEARCH_CACHE_FILE = os.path.join(config.CONFIG_DIR, 'search_cache.json')
+FETCH_RESULTS = 20 # One page of YouTube results, also what prefix-extended queries filter
+
+def normalize(query):
+    return ' '.join(query.lower().split())
+
+def matches(result, query):
+    """True if every word of a (normalised) query occurs in the result's title or channel."""
+    text = f"{result.get('title') or ''} {result.get('channel') or ''}".lower()
+    return all(word in text for word in query.split())
+
+def to_result(entry):
+    """A queue entry for a flat yt-dlp search entry."""
+    return {
+        'id': entry['id'],
+        'url': entry.get('url') or f"https://www.youtube.com/watch?v={entry['id']}",
+        'title': entry.get('title'),
+        'channel': entry.get('channel') or entry.get('uploader'),
+        'duration': entry.get('duration'),
+    }
+
+def describe(result):
+    """One line for the results list: title, channel and duration."""
+    duration = result.get('duration')
+    length = f"{int(duration) // 60}:{int(duration) % 60:02d}" if duration else "live"
+    line = f"{result.get('title') or result['url']} · {result.get('channel') or '?'} · {length}"
+    return line if result['url'].startswith(('http://', 'https://')) else line + " · local"
+
+def merge(local, remote, limit):
+    """
+    Local songs (ymp.library) first, then the YouTube results of videos not already
+    among them, `limit` in all.
+    """
+    have = {result['id'] for result in local if result.get('id')}
+    return (local + [result for result in remote if result.get('id') not in have])[:limit]
+
+class SearchCache:
+    """LRU map from normalised query to its results, written through to a JSON file."""
+
+    def __init__(self, path=SEARCH_CACHE_FILE, max_entries=None, max_age_days=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.entries = None # OrderedDict query -> (time, results), oldest use first
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self.entries is None:
+            self.entries = OrderedDict()
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    for query, stored, results in json.load(f):
+                        self.entries[query] = (stored, results)
+            except (OSError, ValueError, TypeError):
+                pass
+
+    def _fresh(self, stored):
+        days = self.max_age_days if self.max_age_days is not None else config.get_search_cache_days()
+        return time.time() - stored < days * 86400
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump([[query, stored, results] for query, (stored, results) in self.entries.items()], f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+    def get(self, query, limit):
+        """
+        (results, complete) for a query from the cache: its own results, or those of the
+        longest cached query it extends that still match. `complete` is False when that
+        leaves fewer than `limit`, (None, False) when nothing is cached.
+        """
+        key = normalize(query)
+        with self._lock:
+            self._load()
+            hit = self.entries.get(key)
+            if hit and self._fresh(hit[0]):
+                self.entries.move_to_end(key)
+                return hit[1][:limit], True
+            prefixes = [q for q, (stored, _) in self.entries.items()
+                        if q and key.startswith(q) and self._fresh(stored)]
+            if not prefixes:
+                return None, False
+            results = [r for r in self.entries[max(prefixes, key=len)][1] if matches(r, key)]
+        return results[:limit], len(results) >= limit
+
+    def put(self, query, results):
+        with self._lock:
+            self._load()
+            key = normalize(query)
+            self.entries[key] = (time.time(), results)
+            self.entries.move_to_end(key)
+            limit = self.max_entries if self.max_entries is not None else config.get_search_cache_entries()
+            while len(self.entries) > max(1, limit):
+                self.entries.popitem(last=False)
+            self._save()
+
+CACHE = SearchCache()
+
+def fetch(query, count=FETCH_RESULTS):
+    """Searches YouTube (flat, one request) and returns up to `count` results."""
+    import ymp.downloader as downloader
+    options = {'quiet': True, 'no_warnings': True, 'extract_flat': True}
+    with downloader._youtube_dl(options) as ytdl:
+        info = ytdl.extract_info(f"ytsearch{count}:{query}", download=False)
+    return [to_result(entry) for entry in info.get('entries') or [] if entry.get('id')]
+
+def search(query, limit, cache=CACHE):
+    """The top `limit` results for a query, from the cache or else the network (then cached)."""
+    results, complete = cache.get(query, limit)
+    if complete:
+        return results
+    results = fetch(query)
+    cache.put(query, results)
+    return results[:limit]
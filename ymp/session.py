@@ -0,0 +1,149 @@
+import json
+import os
+import threading
+import time
+
+import ymp.config as config
+import ymp.tracks as tracks
+
+SESSION_FILE = os.path.join(config.CONFIG_DIR, 'session.json')
+
+# Only these keys of the (large) yt-dlp meta dict are needed to resume a track.
+META_KEYS = ('id', 'title', 'artist', 'album', 'duration', 'webpage_url')
+
+def snapshot(playlist):
+    """
+    Builds a JSON-serialisable snapshot of the playlist state.
+    Lists are copied first so the snapshot can be taken from any thread.
+    """
+    return dict(snapshot_state(playlist), **snapshot_lists(playlist))
+
+def snapshot_state(playlist):
+    """The small part of a snapshot: repeat mode and the current song with its position."""
+    current = None
+    if playlist.meta:
+        meta = {k: playlist.meta.get(k) for k in META_KEYS if playlist.meta.get(k) is not None}
+        # Only a local file can be resumed without network access
+        filepath = playlist.cachepath or playlist.filepath
+        if filepath and not os.path.exists(filepath):
+            filepath = None
+        current = {
+            'meta': meta,
+            'filepath': filepath,
+            'position': playlist.get_position(),
+        }
+
+    return {
+        'version': 1,
+        'saved_at': time.time(),
+        'repeat': playlist.repeat,
+        'current': current,
+    }
+
+def snapshot_lists(playlist):
+    """The queue and history of a snapshot, which only change with playlist.revision."""
+    return {
+        'queue': [track.to_dict() for track in playlist.deferred + playlist.queuedplaylist], # Deferred while offline: next time
+        'history': [track.to_dict() for track in playlist.playedplaylist],
+    }
+
+def write_snapshot(data, path=SESSION_FILE, lists_json=None):
+    """
+    Atomically writes a snapshot (temp file + rename), so a crash never leaves a torn file.
+    lists_json adds the queue and history serialised before (see SessionSaver).
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    text = json.dumps(data, ensure_ascii=False, default=str)
+    if lists_json:
+        text = f"{text[:-1]}, {lists_json}}}"
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def load_snapshot(path=SESSION_FILE):
+    """Returns the last saved snapshot or None if there is none (or it is unreadable)."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or 'queue' not in data:
+        return None
+    return data
+
+def restore(playlist, data):
+    """
+    Restores queue, history and repeat mode from a snapshot.
+    Returns the 'current' entry (or None) so the caller can resume playback.
+    """
+    # Sessions saved before ymp.tracks hold strings and yt-dlp entries, of() reads both
+    playlist.queuedplaylist = [tracks.of(entry) for entry in data.get('queue', [])]
+    playlist.playedplaylist = [tracks.of(entry) for entry in data.get('history', [])]
+    for track in playlist.queuedplaylist:
+        if track.state == tracks.EXPANDING:
+            track.state = tracks.UNRESOLVED # Expanded again, after the songs already queued
+    playlist.repeat = data.get('repeat', 0)
+    playlist.changed()
+    return data.get('current')
+
+class SessionSaver:
+    """Periodically writes session snapshots from a background thread."""
+
+    def __init__(self, playlist, path=SESSION_FILE, interval=None):
+        self.playlist = playlist
+        self.path = path
+        self.interval = interval if interval is not None else config.get_session_interval()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._last = None
+        self._lists = None # (playlist, revision) the queue and history were serialised at
+        self._lists_json = None # ... and their JSON, without the braces
+        self._lists_empty = True
+        self.thread = None
+        self.on_error = None # Called with the message of a failed save (from the saver thread)
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.save()
+
+    def save(self):
+        """
+        Takes and writes a snapshot, skipping the write if nothing changed. The queue and
+        history are only serialised again after a change (playlist.revision), otherwise the
+        write only updates the position.
+        """
+        with self._lock:
+            try:
+                source = (self.playlist, self.playlist.revision)
+                if source != self._lists:
+                    lists = snapshot_lists(self.playlist)
+                    self._lists_json = json.dumps(lists, ensure_ascii=False, default=str)[1:-1]
+                    self._lists_empty = not (lists['queue'] or lists['history'])
+                    self._lists = source
+                data = snapshot_state(self.playlist)
+                # Don't clobber the previous session with an empty one
+                if self._lists_empty and not data['current']:
+                    return
+                # 'saved_at' always differs, compare the rest
+                key = (source, json.dumps({k: v for k, v in data.items() if k != 'saved_at'}, default=str))
+                if key == self._last:
+                    return
+                write_snapshot(data, self.path, self._lists_json)
+                self._last = key
+            except Exception as e:
+                if self.on_error:
+                    self.on_error(f"Error saving session: {e}")
+                else:
+                    print(f"Error saving session: {e}")
+
+    def stop(self):
+        """Stops the background thread and writes a final snapshot."""
+        self._stop.set()
+        self.save()
@@ -0,0 +1,165 @@
+import json
+import re
+
+ENTITY_MARKER = b'Spotify.Entity = '
+TOKEN_RE = re.compile(rb'"accessToken"\s*:\s*"([^"]+)"')
+
+CHUNK_SIZE = 16 * 1024
+
+def is_spotify_url(url):
+    """Returns True for Spotify playlist/album/track links."""
+    return isinstance(url, str) and url.startswith('http') and ('spotify.com/' in url or 'spotify.link/' in url)
+
+class _JsonObjectScanner:
+    """
+    Incrementally collects one JSON object from a byte stream by tracking brace depth,
+    so the object can be decoded as soon as it is complete.
+    """
+    SPECIAL = re.compile(rb'[{}"\\]')
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.depth = 0
+        self.in_string = False
+        self.escape_at = -1 # Absolute offset of the byte escaped by a backslash
+        self.offset = 0
+        self.done = False
+
+    def feed(self, data):
+        """Consumes bytes and returns whatever follows the end of the object (or b'')."""
+        # Only braces, quotes and backslashes matter, jump between them
+        for match in self.SPECIAL.finditer(data):
+            pos = self.offset + match.start()
+            if pos == self.escape_at:
+                continue
+            c = match.group()
+            if self.in_string:
+                if c == b'\\':
+                    self.escape_at = pos + 1
+                elif c == b'"':
+                    self.in_string = False
+            elif c == b'"':
+                self.in_string = True
+            elif c == b'{':
+                self.depth += 1
+            elif c == b'}':
+                self.depth -= 1
+                if self.depth == 0:
+                    end = match.end()
+                    self.buf += data[:end]
+                    self.done = True
+                    return data[end:]
+        self.buf += data
+        self.offset += len(data)
+        return b''
+
+    def result(self):
+        return json.loads(self.buf.decode('utf-8'))
+
+def scan_entity(chunks):
+    """
+    Streams over the page bytes looking for the embedded `Spotify.Entity` JSON and the
+    web player access token, without building a DOM or holding the whole page.
+    Returns (entity_dict or None, access_token or None).
+    """
+    entity = None
+    token = None
+    scanner = None
+    tail = b'' # Overlap between chunks so markers split across chunks are found
+
+    for chunk in chunks:
+        if not chunk:
+            continue
+        if scanner is not None:
+            rest = scanner.feed(chunk)
+            if not scanner.done:
+                continue
+            entity = scanner.result()
+            scanner = None
+            data = rest
+        else:
+            data = tail + chunk
+
+        if token is None:
+            match = TOKEN_RE.search(data)
+            if match:
+                token = match.group(1).decode('utf-8')
+
+        if entity is None and scanner is None:
+            pos = data.find(ENTITY_MARKER)
+            if pos != -1:
+                scanner = _JsonObjectScanner()
+                rest = scanner.feed(data[pos + len(ENTITY_MARKER):])
+                if scanner.done:
+                    entity = scanner.result()
+                    scanner = None
+                    if token is None:
+                        match = TOKEN_RE.search(rest)
+                        if match:
+                            token = match.group(1).decode('utf-8')
+
+        if entity is not None and token is not None:
+            break
+        # The token pattern is short, keeping a few hundred bytes covers both markers
+        tail = data[-256:] if scanner is None else b''
+
+    return entity, token
+
+def _track_query(item):
+    """Turns a playlist/album item into the 'Title Artist ...' search string used for the queue."""
+    track = item.get('track', item) if isinstance(item, dict) else None
+    if not track or not track.get('name'):
+        return None
+    artistname = ""
+    for artist in track.get('artists', []):
+        artistname = artistname + " " + artist['name']
+    return track['name'] + artistname
+
+def iter_tracks(url, session=None, log=print):
+    """
+    Yields the tracks of a Spotify playlist/album as search strings, page by page,
+    so the caller can queue them while the rest is still being fetched.
+
+    Note: This relies on the data embedded in the Spotify web page, which can change at any time.
+    Pages beyond the embedded first one are fetched from the `next` links with the page's access token.
+    """
+    if session is None:
+        import requests
+        session = requests.Session()
+    log("Pinging " + url)
+    try:
+        with session.get(url, stream=True, timeout=10) as response:
+            response.raise_for_status()
+            entity, token = scan_entity(response.iter_content(CHUNK_SIZE))
+    except Exception as e:
+        log(f"Error parsing Spotify playlist: {e}")
+        return
+
+    if not entity:
+        log("Error: Could not find Spotify Entity data.")
+        return
+
+    log("Adding " + entity.get('name', 'Spotify playlist') + " To Queue.")
+    # A single track page embeds the track itself
+    page = entity.get('tracks') or {'items': [entity]}
+    count = 0
+    while True:
+        for item in page.get('items', []):
+            query = _track_query(item)
+            if query:
+                count += 1
+                yield query
+
+        next_url = page.get('next')
+        if not next_url:
+            break
+        if not token:
+            log(f"Warning: No Spotify access token found, only the first {count} tracks were added.")
+            break
+        try:
+            response = session.get(next_url, headers={'Authorization': f'Bearer {token}'}, timeout=10)
+            response.raise_for_status()
+            page = response.json()
+        except Exception as e:
+            log(f"Error fetching Spotify page ({count} tracks so far): {e}")
+            break
@@ -0,0 +1,388 @@
+"""
+Live streams: a relay between a radio server and ffplay.
+
+ffplay reading a radio URL itself exits on the first network hiccup, which the player
+can only take as the end of the station. Instead, the relay reads the stream into a
+bounded buffer and writes it to ffplay's stdin. ffplay is only fed once BufferKB are
+buffered (and again after the buffer ran dry), so it plays that far behind the live
+edge: when the connection drops, the relay reconnects with backoff while ffplay plays
+the reserve, and an outage shorter than it goes unheard. Only after MaxReconnects failed attempts in a row the pipe is closed:
+ffplay then plays out the buffer and exits, and the player moves on to the next mirror.
+
+The buffer is a ring over a memory-mapped file holding the last TimeshiftMinutes of the
+station (timeshift). Recording goes on while ffplay is stopped, so pausing, rewinding
+and seeking within that window replay local data instead of reconnecting.
+"""
+import mmap
+import os
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+
+import ymp.config as config
+import ymp.metrics as metrics
+
+CHUNK_SIZE = 16 * 1024
+BACKOFF_SECONDS = (0.5, 1, 2, 4, 8)
+# Byte rate assumed until the stream tells (icy-br) or it can be measured
+DEFAULT_BYTE_RATE = 128 * 1000 // 8
+# Used to size the timeshift window when the bitrate is unknown, so the window is never too short
+MAX_BYTE_RATE = 320 * 1000 // 8
+MEASURE_SECONDS = 10
+
+def is_relayable(url):
+    """True for a stream the relay can pass through (HLS playlists are left to ffplay)."""
+    if not isinstance(url, str) or not url.startswith(('http://', 'https://')):
+        return False
+    return not urlparse(url).path.lower().endswith(('.m3u8', '.m3u', '.pls'))
+
+def backoff(attempt):
+    """Seconds to wait before reconnect attempt `attempt` (1-based)."""
+    return BACKOFF_SECONDS[min(attempt, len(BACKOFF_SECONDS)) - 1]
+
+def _iter_chunks(response):
+    """The body of a streaming response as it arrives (iter_content waits for full chunks)."""
+    raw = response.raw
+    if hasattr(raw, 'read1'): # urllib3 2
+        while True:
+            chunk = raw.read1(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        yield from response.iter_content(4096)
+
+class RingBuffer:
+    """
+    The last `capacity` bytes of a stream in an mmap (of a temporary file, or anonymous
+    memory with file=False). Positions are absolute stream offsets; not thread-safe.
+    """
+
+    def __init__(self, capacity, file=True):
+        self.capacity = capacity
+        self.start = 0 # Oldest offset still held
+        self.end = 0 # Offset after the newest byte
+        self._file = None
+        if file:
+            fd, path = tempfile.mkstemp(prefix='ymp-timeshift-', suffix='.buf')
+            self._file = os.fdopen(fd, 'w+b')
+            self._file.truncate(capacity) # Sparse, only written parts take disk space
+            self.map = mmap.mmap(self._file.fileno(), capacity)
+            try:
+                os.unlink(path) # Gone with the last handle, even after a crash
+                self._path = None
+            except OSError:
+                self._path = path # Windows: removed in close()
+        else:
+            self.map = mmap.mmap(-1, capacity)
+
+    def write(self, data):
+        if len(data) > self.capacity:
+            skipped = len(data) - self.capacity
+            self.end += skipped
+            data = data[skipped:]
+        offset = self.end % self.capacity
+        first = min(len(data), self.capacity - offset)
+        self.map[offset:offset + first] = data[:first]
+        if first < len(data):
+            self.map[0:len(data) - first] = data[first:]
+        self.end += len(data)
+        self.start = max(self.start, self.end - self.capacity)
+
+    def read(self, pos, size):
+        """Up to `size` bytes from `pos` (which must be within start..end)."""
+        size = min(size, self.end - pos)
+        offset = pos % self.capacity
+        first = min(size, self.capacity - offset)
+        data = self.map[offset:offset + first]
+        if first < size:
+            data += self.map[0:size - first]
+        return data
+
+    def close(self):
+        self.map.close()
+        if self._file:
+            self._file.close()
+            if self._path:
+                try:
+                    os.unlink(self._path)
+                except OSError:
+                    pass
+
+class StreamRelay:
+    """Records a live stream into a ring buffer and feeds it to a player pipe, reconnecting on drops."""
+
+    def __init__(self, url, on_event=None, buffer_bytes=None, max_reconnects=None,
+                 connect_timeout=None, stall_timeout=None, timeshift_seconds=None, session=None):
+        self.url = url
+        self.on_event = on_event # Called with a message on drops/reconnects (from the relay thread)
+        self.buffer_bytes = buffer_bytes or config.get_stream_buffer_kb() * 1024
+        self.max_reconnects = config.get_stream_max_reconnects() if max_reconnects is None else max_reconnects
+        self.connect_timeout = connect_timeout or config.get_radio_probe_timeout()
+        self.stall_timeout = stall_timeout or config.get_radio_stall_timeout()
+        self.timeshift_seconds = config.get_timeshift_minutes() * 60 if timeshift_seconds is None else timeshift_seconds
+        self.session = session
+        self.ring = None # Created on the first connect, when the bitrate may be known
+        self.cursor = 0 # Stream offset the player reads next
+        self.buffering = True # Holding the player back until buffer_bytes are ahead of it
+        self.bitrate = None # Bytes per second announced by the server (icy-br)
+        self.received = 0
+        self.first_data_at = None
+        self.dropped_bytes = 0 # Audio overwritten before the player got to it
+        self.outages = 0
+        self.reconnects = 0
+        self.connected = False
+        self.failed = False # Gave up reconnecting
+        self.closed = False
+        self._started = False
+        self._feed = 0 # Generation of the pipe being fed, see pipe_to()
+        self._feed_start = None # (cursor, monotonic time) when the current pipe started
+        self._response = None
+        self._cond = threading.Condition()
+
+    def start(self):
+        """Starts recording (once; it goes on until close())."""
+        with self._cond:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._read_loop, daemon=True).start()
+
+    def wait_connected(self, timeout=None):
+        """Waits until the stream delivers audio, failed or was closed. True if it delivers."""
+        if timeout is None:
+            timeout = self.connect_timeout + self.stall_timeout
+        with self._cond:
+            self._cond.wait_for(lambda: self.received or self.failed or self.closed, timeout)
+            return self.received > 0
+
+    def pipe_to(self, pipe):
+        """Writes the stream from the cursor to a pipe (e.g. ffplay's stdin) until detached or ended."""
+        with self._cond:
+            self._feed += 1
+            feed = self._feed
+            self._feed_start = None # Set by read() once audio flows
+        threading.Thread(target=self._write_loop, args=(pipe, feed), daemon=True).start()
+
+    def detach(self, feed=None):
+        """
+        Stops feeding the current pipe (or only pipe `feed`, if it is still the current
+        one), e.g. when ffplay is stopped for a pause, while recording goes on. The cursor
+        moves back to about what was actually heard: ffplay and the pipe hold a few
+        seconds that were fed but not played yet.
+        """
+        with self._cond:
+            if feed is not None and feed != self._feed:
+                return
+            self._feed += 1
+            if self._feed_start is not None:
+                start, since = self._feed_start
+                heard = start + int((time.monotonic() - since) * self.byte_rate())
+                self.cursor = min(self.cursor, heard)
+                self._clamp_cursor()
+                self._feed_start = None
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            response = self._response
+            ring, self.ring = self.ring, None
+            self._cond.notify_all()
+        if response is not None:
+            try:
+                response.close() # Unblocks a read in progress
+            except Exception:
+                pass
+        if ring is not None:
+            ring.close()
+
+    def byte_rate(self):
+        """Bytes per second of audio: announced, else measured once there is enough, else a guess."""
+        if self.bitrate:
+            return self.bitrate
+        if self.first_data_at is not None:
+            elapsed = time.monotonic() - self.first_data_at
+            if elapsed >= MEASURE_SECONDS:
+                return max(1, int(self.received / elapsed))
+        return DEFAULT_BYTE_RATE
+
+    def seek(self, seconds):
+        """
+        Moves the cursor within the recorded window (negative = back), not past the live edge.
+        Returns the seconds actually moved.
+        """
+        with self._cond:
+            if self.ring is None:
+                return 0
+            rate = self.byte_rate()
+            before = self.cursor
+            self.cursor = min(self.ring.end, max(self.ring.start, self.cursor + int(seconds * rate)))
+            return (self.cursor - before) / rate
+
+    def behind_live(self):
+        """Seconds between what the player reads and the live edge (the read-ahead while playing)."""
+        with self._cond:
+            if self.ring is None:
+                return 0
+            return (self.ring.end - self.cursor) / self.byte_rate()
+
+    def stats(self):
+        with self._cond:
+            state = ('failed' if self.failed else 'reconnecting' if not self.connected
+                     else 'buffering' if self.buffering else 'playing')
+            ring = self.ring
+            rate = self.byte_rate()
+            return {'state': state, 'outages': self.outages, 'reconnects': self.reconnects,
+                    'buffered': ring.end - self.cursor if ring else 0, 'dropped': self.dropped_bytes,
+                    'behind': (ring.end - self.cursor) / rate if ring else 0,
+                    'reserve': self.buffer_bytes / rate,
+                    'window': (ring.end - ring.start) / rate if ring else 0}
+
+    def _event(self, message):
+        if self.on_event:
+            try:
+                self.on_event(message)
+            except Exception:
+                pass
+
+    def _clamp_cursor(self):
+        if self.ring is not None and self.cursor < self.ring.start:
+            # Paused or behind for longer than the window: continue with the oldest audio left
+            self.dropped_bytes += self.ring.start - self.cursor
+            self.cursor = self.ring.start
+
+    def _open_ring(self, response):
+        try:
+            self.bitrate = int(response.headers.get('icy-br', '').split(',')[0]) * 1000 // 8 or None
+        except (ValueError, AttributeError):
+            self.bitrate = None
+        window = int(self.timeshift_seconds * (self.bitrate or MAX_BYTE_RATE))
+        # Room beyond the reserve, so a full reserve never overwrites audio not played yet
+        capacity = max(2 * self.buffer_bytes, window)
+        ring = RingBuffer(capacity, file=window > 2 * self.buffer_bytes)
+        with self._cond:
+            if self.closed:
+                ring.close()
+                return False
+            self.ring = ring
+        return True
+
+    def _put(self, chunk):
+        with self._cond:
+            if self.ring is None:
+                return
+            self.ring.write(chunk)
+            self.received += len(chunk)
+            if self.first_data_at is None:
+                self.first_data_at = time.monotonic()
+            self._cond.notify_all()
+
+    def read(self, size=CHUNK_SIZE, feed=None):
+        """
+        The next chunk from the cursor; blocks while waiting for the stream, and while
+        fewer than buffer_bytes are ahead of the cursor after a start or running dry.
+        Returns b'' when the relay ended (or the pipe `feed` was detached).
+        """
+        with self._cond:
+            while not self.closed and (feed is None or feed == self._feed):
+                if self.ring is not None:
+                    self._clamp_cursor()
+                    ahead = self.ring.end - self.cursor
+                    if ahead and (not self.buffering or ahead >= self.buffer_bytes or self.failed):
+                        if self.buffering or self._feed_start is None:
+                            # Audio flows (again) from here, see detach()
+                            self._feed_start = (self.cursor, time.monotonic())
+                        self.buffering = False
+                        data = self.ring.read(self.cursor, size)
+                        self.cursor += len(data)
+                        return data
+                    if not ahead:
+                        self.buffering = True # Ran dry: build the reserve up again
+                if self.failed:
+                    break
+                self._cond.wait()
+            return b''
+
+    def _connect(self):
+        if self.session is None:
+            import requests
+            self.session = requests
+        response = self.session.get(self.url, stream=True, timeout=(self.connect_timeout, self.stall_timeout))
+        response.raise_for_status()
+        return response
+
+    def _read_loop(self):
+        attempts = 0 # Failed connects since the stream last delivered audio
+        dropped_at = None
+        ever_connected = False
+        while not self.closed:
+            try:
+                response = self._connect()
+                with self._cond:
+                    if self.closed:
+                        response.close()
+                        return
+                    self._response = response
+                if self.ring is None and not self._open_ring(response):
+                    return
+                with response:
+                    for chunk in _iter_chunks(response):
+                        if self.closed:
+                            return
+                        if not chunk:
+                            continue
+                        if not self.connected:
+                            with self._cond:
+                                self.connected = True
+                            if dropped_at is not None:
+                                self.reconnects += 1
+                                metrics.STREAM_RECONNECTS.inc()
+                                self._event(f"Stream reconnected after {time.monotonic() - dropped_at:.1f}s "
+                                            f"({self.outages} outages, {self.reconnects} reconnects)")
+                                dropped_at = None
+                            ever_connected = True
+                            attempts = 0
+                        self._put(chunk)
+            except Exception:
+                pass
+            if self.closed:
+                return
+
+            # Live streams do not end: a closed connection is an outage as well
+            with self._cond:
+                self._response = None
+                was_connected, self.connected = self.connected, False
+            if was_connected:
+                self.outages += 1
+                metrics.STREAM_OUTAGES.inc()
+                dropped_at = time.monotonic()
+                self._event(f"Stream dropped, reconnecting ({self.behind_live():.0f}s buffered)...")
+            attempts += 1
+            # A mirror that never delivered is not retried, the station fails over right away
+            if not ever_connected or attempts > self.max_reconnects:
+                if ever_connected:
+                    self._event(f"Stream lost after {self.max_reconnects} reconnect attempts.")
+                with self._cond:
+                    self.failed = True
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                self._cond.wait_for(lambda: self.closed, timeout=backoff(attempts))
+
+    def _write_loop(self, pipe, feed):
+        try:
+            while True:
+                chunk = self.read(feed=feed)
+                if not chunk:
+                    break
+                pipe.write(chunk)
+                pipe.flush()
+        except (BrokenPipeError, OSError, ValueError):
+            self.detach(feed) # The player is gone
+        finally:
+            try:
+                pipe.close() # EOF: ffplay plays out what it has and exits
+            except (BrokenPipeError, OSError):
+                pass
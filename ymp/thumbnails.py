@@ -0,0 +1,241 @@
+"""
+Shared, size-bounded thumbnail cache.
+
+yt-dlp used to write and embed the artwork of every download itself (EmbedThumbnail):
+the image was fetched again for each download and the whole MP3 rewritten a second time
+right after it. Thumbnails are now fetched once per video ID, downscaled once and kept
+in THUMBNAIL_DIR (least recently used removed beyond `[Thumbnails] max_cache_mb`).
+The cached image is the MPRIS artUrl, and it is embedded into cached songs at idle time,
+right after the download or not at all (`[Thumbnails] embed`).
+"""
+import os
+import queue
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import ymp.config as config
+
+THUMBNAIL_DIR = os.path.join(config.CONFIG_DIR, 'thumbnails')
+
+IDLE_SECONDS = 10 # Embedding waits until no download ran for this long (see downloader.idle_seconds)
+
+def source_url(meta, size=300):
+    """
+    The thumbnail to fetch for a video: the smallest JPEG at least `size` pixels wide
+    (so the download stays small), else the main thumbnail, else YouTube's default one.
+    """
+    candidates = [t for t in meta.get('thumbnails') or []
+                  if t.get('url') and t.get('width') and t['url'].split('?')[0].endswith('.jpg')]
+    large_enough = [t for t in candidates if t['width'] >= size]
+    if large_enough:
+        return min(large_enough, key=lambda t: t['width'])['url']
+    if candidates:
+        return max(candidates, key=lambda t: t['width'])['url']
+    if meta.get('thumbnail'):
+        return meta['thumbnail']
+    if meta.get('id'):
+        return f"https://i.ytimg.com/vi/{meta['id']}/hqdefault.jpg"
+    return None
+
+def downscale(src, dest, size):
+    """Scales an image to at most `size` pixels on its longest side (JPEG). Returns False if ffmpeg fails."""
+    cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-i', src,
+           '-vf', f'scale={size}:{size}:force_original_aspect_ratio=decrease',
+           '-frames:v', '1', '-q:v', '3', '-f', 'mjpeg', dest]
+    try:
+        return subprocess.run(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL).returncode == 0
+    except OSError:
+        return False
+
+class ThumbnailCache:
+    """Thumbnails by video ID as small JPEG files, oldest removed beyond max_bytes."""
+
+    def __init__(self, directory=THUMBNAIL_DIR, max_bytes=None, size=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size = size
+
+    def path(self, vid):
+        return os.path.join(self.directory, f"{vid}.jpg")
+
+    def get(self, vid):
+        """The cached thumbnail of a video (marked as recently used), or None."""
+        if not vid:
+            return None
+        path = self.path(vid)
+        try:
+            os.utime(path, None)
+        except OSError:
+            return None
+        return path
+
+    def peek(self, vid):
+        """The cached thumbnail of a video without marking it as used (listings), or None."""
+        if not vid:
+            return None
+        path = self.path(vid)
+        return path if os.path.exists(path) else None
+
+    def fetch(self, meta):
+        """The thumbnail of a video, downloaded and downscaled on the first request. None if there is none."""
+        vid = (meta or {}).get('id')
+        cached = self.get(vid)
+        if cached or not vid:
+            return cached
+        size = self.size or config.get_thumbnail_size()
+        url = source_url(meta, size)
+        if not url:
+            return None
+
+        import requests
+        os.makedirs(self.directory, exist_ok=True)
+        fd, raw_path = tempfile.mkstemp(suffix='.img', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                response = requests.get(url, timeout=10)
+                response.raise_for_status()
+                f.write(response.content)
+            scaled_path = raw_path + '.jpg'
+            if downscale(raw_path, scaled_path, size):
+                os.replace(scaled_path, self.path(vid))
+            else:
+                os.replace(raw_path, self.path(vid)) # No ffmpeg: keep it as it is
+        except (OSError, requests.RequestException):
+            return None
+        finally:
+            for leftover in (raw_path, raw_path + '.jpg'):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+        self.prune()
+        return self.path(vid)
+
+    def prune(self):
+        """Removes the least recently used thumbnails beyond the size limit. Returns how many."""
+        max_bytes = self.max_bytes if self.max_bytes is not None else config.get_thumbnail_cache_mb() * 1024 * 1024
+        if max_bytes <= 0:
+            return 0
+        files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith('.jpg') and entry.is_file():
+                    st = entry.stat()
+                    files.append((st.st_mtime, st.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for _, size, path in sorted(files):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+CACHE = ThumbnailCache()
+
+def art_url(path):
+    """A thumbnail path as the file:// URL MPRIS expects."""
+    from pathlib import Path
+    return Path(os.path.abspath(path)).as_uri()
+
+def has_cover(filepath):
+    """True if an MP3's ID3v2 tag already holds a picture (APIC frame)."""
+    try:
+        with open(filepath, 'rb') as f:
+            header = f.read(10)
+            if len(header) < 10 or header[:3] != b'ID3':
+                return False
+            tag_size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+            return b'APIC' in f.read(tag_size)
+    except OSError:
+        return False
+
+def embed(filepath, image):
+    """
+    Writes a thumbnail into an MP3's ID3 tag (audio copied, not re-encoded).
+    Files that are hardlinks of other paths (ymp --dedupe) are left alone, as the
+    rewrite would split them into copies. Returns True if the file was rewritten.
+    """
+    import ymp.analysis as analysis
+    try:
+        if os.stat(filepath).st_nlink > 1 or has_cover(filepath):
+            return False
+    except OSError:
+        return False
+    tmp_path = filepath + '.ymp-cover'
+    cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-i', filepath, '-i', image,
+           '-map', '0:a', '-map', '1:0', '-c', 'copy', '-id3v2_version', '3',
+           '-metadata:s:v', 'title=Album cover', '-metadata:s:v', 'comment=Cover (front)',
+           '-f', 'mp3', tmp_path]
+    kwargs = {'creationflags': subprocess.BELOW_NORMAL_PRIORITY_CLASS} if sys.platform == 'win32' else {}
+    try:
+        process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.DEVNULL, **kwargs)
+        if sys.platform != 'win32':
+            analysis._lower_priority(process)
+        if process.wait() != 0:
+            return False
+        # The analysis is keyed by file size, which the new tag changes
+        result = analysis.STORE.get(filepath)
+        os.replace(tmp_path, filepath)
+        if result is not None:
+            analysis.STORE.put(filepath, result)
+        return True
+    except OSError:
+        return False
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+class Embedder:
+    """Embeds thumbnails on a background thread, once no download ran for IDLE_SECONDS."""
+
+    def __init__(self, cache=CACHE):
+        self.cache = cache
+        self.queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def schedule(self, meta, filepath):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self.queue.put((meta, filepath))
+
+    def _run(self):
+        import ymp.downloader as downloader
+        while True:
+            meta, filepath = self.queue.get()
+            # Idle as for quality upgrades: not while a download (e.g. of the playing song) runs
+            while downloader.idle_seconds() < IDLE_SECONDS:
+                time.sleep(1)
+            try:
+                image = self.cache.fetch(meta)
+                if image and os.path.exists(filepath):
+                    embed(filepath, image)
+            except Exception:
+                pass # Artwork is an extra, never an error for playback
+
+_embedder = None
+
+def after_download(meta, filepath):
+    """Embeds the thumbnail of a new download now, later or never, see `[Thumbnails] embed`."""
+    global _embedder
+    if not meta or not filepath or not config.is_thumbnails_enabled():
+        return
+    mode = config.get_thumbnail_embed()
+    if mode == 'download':
+        image = CACHE.fetch(meta)
+        if image:
+            embed(filepath, image)
+    elif mode == 'idle':
+        if _embedder is None:
+            _embedder = Embedder()
+        _embedder.schedule(meta, filepath)
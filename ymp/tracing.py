@@ -0,0 +1,222 @@
+"""
+Span tracing for the resolve/download/play pipeline.
+
+Answers "where did the time to first sound go" for every track: queue pop, search
+resolve, extraction, download, postprocess, player spawn and first audio.
+Spans are written as Chrome trace events (open the file in chrome://tracing or
+Perfetto) and a rolling per-stage breakdown is kept for the TUI log.
+
+When tracing is disabled, span() and begin_track() return shared no-op objects,
+so instrumented code pays one function call and a flag check.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Rolling window for the per-stage averages
+WINDOW = 20
+
+_enabled = False
+_file = None
+_file_lock = threading.Lock()
+_stats = {}
+_local = threading.local()
+
+def enable(trace_file=None):
+    """Turns tracing on. With a trace_file, spans are also written as Chrome trace events."""
+    global _enabled, _file
+    _enabled = True
+    if trace_file:
+        os.makedirs(os.path.dirname(os.path.abspath(trace_file)), exist_ok=True)
+        # JSON array format; the closing bracket is optional for trace viewers,
+        # which keeps the file valid even if ymp is killed.
+        _file = open(trace_file, 'w', encoding='utf-8')
+        _file.write('[\n')
+        _file.flush()
+
+def disable():
+    global _enabled, _file
+    _enabled = False
+    with _file_lock:
+        if _file:
+            _file.close()
+            _file = None
+
+def is_enabled():
+    return _enabled
+
+def now():
+    return time.perf_counter()
+
+def _emit(name, start, end, args):
+    """Records a finished span: rolling stats + trace file."""
+    _stats.setdefault(name, deque(maxlen=WINDOW)).append(end - start)
+    if _file is None:
+        return
+    event = {
+        'name': name, 'cat': 'ymp', 'ph': 'X',
+        'ts': round(start * 1e6), 'dur': round((end - start) * 1e6),
+        'pid': os.getpid(), 'tid': threading.get_ident(),
+        'args': args,
+    }
+    line = json.dumps(event, default=str) + ',\n'
+    with _file_lock:
+        if _file:
+            _file.write(line)
+            _file.flush()
+
+class Span:
+    """A timed stage. Use as a context manager or call end() (possibly from another thread)."""
+
+    def __init__(self, name, trace=None, start=None, **args):
+        self.name = name
+        self.trace = trace
+        self.args = args
+        self.start = start if start is not None else now()
+        self.duration = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type:
+            self.args['error'] = repr(exc)
+        self.end()
+        return False
+
+    def end(self, end=None):
+        if self.duration is not None:
+            return
+        end = end if end is not None else now()
+        self.duration = end - self.start
+        if self.trace:
+            self.args.setdefault('track', self.trace.label)
+            self.trace.stages[self.name] = self.trace.stages.get(self.name, 0) + self.duration
+        _emit(self.name, self.start, end, self.args)
+
+class _NullSpan:
+    """Shared no-op span used while tracing is disabled."""
+    duration = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def end(self, end=None):
+        pass
+
+NULL_SPAN = _NullSpan()
+
+class TrackTrace:
+    """Collects the stages of one track, from leaving the queue (or the previous song ending) to first audio."""
+
+    def __init__(self, label=None, since=None, on_finish=None):
+        self.label = label
+        self.start = now()
+        self.stages = {}
+        self.finished = False
+        self.on_finish = on_finish # Called with the summary line once first audio is reached
+        if since is not None and since < self.start:
+            # Time between the previous song ending and the player loop noticing it
+            Span('poll', trace=self, start=since).end(self.start)
+            self.start = since
+        self._pending = None
+
+    def set_label(self, label):
+        self.label = str(label)
+
+    def span(self, name, **args):
+        return Span(name, trace=self, **args)
+
+    def activate(self):
+        """Context manager making this the current trace of the calling thread (for span())."""
+        return _Activation(self)
+
+    def player_started(self):
+        """Called right after the player process was spawned: starts waiting for first audio."""
+        self._pending = Span('first_audio', trace=self)
+
+    def first_audio(self):
+        """Called (from any thread) once the player reports audio output."""
+        if self.finished:
+            return
+        if self._pending:
+            self._pending.end()
+        self.finish()
+
+    def finish(self):
+        self.finished = True
+        total = now() - self.start
+        _emit('time_to_first_sound', self.start, self.start + total, {'track': self.label})
+        if self.on_finish:
+            self.on_finish(self.summary(total))
+
+    def summary(self, total):
+        stages = ', '.join(f"{name} {_fmt(seconds)}" for name, seconds in self.stages.items())
+        line = f"First sound after {_fmt(total)} ({stages})"
+        averages = breakdown()
+        samples = averages.get('time_to_first_sound', (0, 0))[1]
+        if samples > 1:
+            rolling = ', '.join(f"{name} {_fmt(avg)}" for name, (avg, _) in averages.items())
+            line += f"\nRolling avg (last {samples}): {rolling}"
+        return line
+
+class _NullTrace:
+    """Shared no-op trace used while tracing is disabled."""
+    label = None
+    finished = True
+
+    def set_label(self, label):
+        pass
+
+    def span(self, name, **args):
+        return NULL_SPAN
+
+    def activate(self):
+        return NULL_SPAN
+
+    def player_started(self):
+        pass
+
+    def first_audio(self):
+        pass
+
+NULL_TRACE = _NullTrace()
+
+class _Activation:
+    def __init__(self, trace):
+        self.trace = trace
+
+    def __enter__(self):
+        self.previous = getattr(_local, 'trace', None)
+        _local.trace = self.trace
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb):
+        _local.trace = self.previous
+        return False
+
+def begin_track(label=None, since=None, on_finish=None):
+    """Starts the trace of a track. Returns NULL_TRACE when tracing is disabled."""
+    if not _enabled:
+        return NULL_TRACE
+    return TrackTrace(label, since=since, on_finish=on_finish)
+
+def span(name, **args):
+    """Times a stage, attributed to the calling thread's active track trace (if any)."""
+    if not _enabled:
+        return NULL_SPAN
+    return Span(name, trace=getattr(_local, 'trace', None), **args)
+
+def breakdown():
+    """Rolling average per stage in seconds: {stage: (average, samples)}."""
+    return {name: (sum(values) / len(values), len(values)) for name, values in _stats.items() if values}
+
+def _fmt(seconds):
+    if seconds < 1:
+        return f"{seconds * 1000:.0f}ms"
+    return f"{seconds:.2f}s"
@@ -0,0 +1,163 @@
+"""
+Queue entries: one compact Track per song.
+
+The queue used to hold whatever a path produced: yt-dlp's flat playlist entries (dicts
+with a dozen or more keys: thumbnails, channel URLs, view counts...), bare strings
+(search queries, links, file paths) and small dicts from playlist files, the library
+and the search panel, so every consumer had to tell them apart. A Track keeps only what
+the queue needs, in __slots__, and the artist is interned, so a playlist of one channel
+holds its name once. The rest of the metadata is fetched when it is needed: for the
+song that is played (Playlist.mark_resolved copies the fields back), or by info().
+
+A playlist link stays in the queue while its videos are fetched page by page
+(see Playlist.begin_expansion): they are queued in front of it, and the player waits
+there for the next page instead of playing the link.
+
+Tracks are saved (session, playlists) and sent to `ymp ctl` as compact dicts
+(to_dict()); of() turns such a dict, a string or a yt-dlp entry into a Track.
+"""
+import os
+import sys
+from functools import lru_cache
+
+# Where a track comes from
+YOUTUBE = 'youtube' # A video: playlist entry, search result, link
+SEARCH = 'search'   # A typed query (in `url`), resolved to a video when played
+URL = 'url'         # Any other link: a stream, a file on a server, a playlist link
+FILE = 'file'       # A local file
+STATION = 'station' # A radio station with its mirrors in `extra` (see ymp.radio)
+
+# What is known about it
+UNRESOLVED = 'unresolved' # Only the query or link
+LISTED = 'listed'         # Title and duration from a listing (playlist, search, tags)
+RESOLVED = 'resolved'     # Extracted for playback: `url` is the exact video
+EXPANDING = 'expanding'   # A playlist link whose videos are being queued in front of it
+
+INFO_CACHE = 16 # Full metadata kept by info()
+WATCH_URL = 'https://www.youtube.com/watch?v=' # Not stored per track, rebuilt from the ID
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+def _is_url(link):
+    return isinstance(link, str) and link.startswith(('http://', 'https://'))
+
+def _source(url, vid=None):
+    if not _is_url(url):
+        return FILE
+    if vid and vid in url:
+        return YOUTUBE
+    import ymp.cacheindex as cacheindex
+    return YOUTUBE if cacheindex.video_id(url) else URL
+
+class Track:
+    """One queue entry. `url` is what the player resolves: a link, a file path or a search query."""
+
+    __slots__ = ('id', '_url', 'title', 'artist', 'duration', 'source', 'state', 'extra')
+
+    def __init__(self, url, title=None, artist=None, duration=None, id=None, source=None, state=None, extra=None):
+        self.id = id
+        self.url = url
+        self.title = title
+        self.artist = _intern(artist)
+        self.duration = duration
+        self.source = source or _source(url, id)
+        self.state = state or (LISTED if title else UNRESOLVED)
+        self.extra = extra # Stations: {'mirrors', 'titles'}, playlist links: {'queued'}
+
+    @property
+    def url(self):
+        if self._url is None and self.id:
+            return WATCH_URL + self.id
+        return self._url
+
+    @url.setter
+    def url(self, value):
+        self._url = None if self.id and value == WATCH_URL + self.id else value
+
+    @property
+    def label(self):
+        """What the queue shows."""
+        if self.state == EXPANDING:
+            return f"{self.title or self.url} (loading playlist, {self.extra['queued']} songs so far)"
+        return self.title or self.url or 'Unknown'
+
+    def resolve(self, meta):
+        """Takes over the fields of the video a track was resolved to (yt-dlp metadata)."""
+        self.id = meta.get('id')
+        self.url = meta['webpage_url']
+        self.title = meta.get('title')
+        self.artist = _intern(meta.get('artist') or meta.get('channel') or meta.get('uploader'))
+        self.duration = meta.get('duration')
+        self.source = _source(self.url, self.id)
+        self.state = RESOLVED
+
+    def info(self):
+        """The full yt-dlp metadata (fetched on first use, the last few kept). None for files and stations."""
+        if self.source in (FILE, STATION):
+            return None
+        return _fetch_info(self.url)
+
+    def to_dict(self):
+        """Compact dict for JSON (session, saved playlists, ymp ctl); of() reads it back."""
+        data = {'url': self.url, 'title': self.title, 'artist': self.artist, 'duration': self.duration,
+                'id': self.id, 'source': self.source, 'state': self.state}
+        data = {key: value for key, value in data.items() if value is not None}
+        if self.source == STATION:
+            data['_type'] = 'station'
+        data.update(self.extra or {})
+        return data
+
+    def _fields(self):
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __eq__(self, other):
+        return isinstance(other, Track) and self._fields() == other._fields()
+
+    def __repr__(self):
+        return f"Track({self.url!r}, {self.title!r}, source={self.source!r}, state={self.state!r})"
+
+@lru_cache(maxsize=INFO_CACHE)
+def _fetch_info(target):
+    import ymp.downloader as downloader
+    options = {'quiet': True, 'no_warnings': True, 'default_search': 'ytsearch', 'noplaylist': True}
+    with downloader._youtube_dl(options) as ytdl:
+        meta = ytdl.extract_info(target, download=False)
+    if 'entries' in meta:
+        meta = meta['entries'][0]
+    return meta
+
+def from_string(text):
+    """A link, a local file or else a search query."""
+    if _is_url(text):
+        import ymp.cacheindex as cacheindex
+        vid = cacheindex.video_id(text)
+        return Track(text, id=vid, source=YOUTUBE if vid else URL)
+    return Track(text, source=FILE if os.path.exists(text) else SEARCH)
+
+def from_dict(entry):
+    """
+    A Track for a dict: a yt-dlp (flat) entry, a search result or library entry
+    ({'url', 'title', 'channel', 'duration'}), a radio station or a to_dict() copy.
+    """
+    if entry.get('_type') == 'station' or 'mirrors' in entry:
+        mirrors = list(entry.get('mirrors') or [entry['url']])
+        return Track(entry['url'], entry.get('title'), source=STATION, state=LISTED,
+                     extra={'mirrors': mirrors, 'titles': list(entry.get('titles') or [None] * len(mirrors))})
+    vid = entry.get('id')
+    url = entry.get('url') or entry.get('webpage_url') or (WATCH_URL + vid if vid else None)
+    if url is None:
+        # Nothing to play but the title: look for it
+        return Track(entry.get('title'), entry.get('title'), duration=entry.get('duration'), source=SEARCH,
+                     state=UNRESOLVED)
+    return Track(url, entry.get('title'), entry.get('artist') or entry.get('channel') or entry.get('uploader'),
+                 entry.get('duration'), vid, entry.get('source'), entry.get('state'),
+                 {'queued': entry['queued']} if 'queued' in entry else None)
+
+def of(entry):
+    """The Track for any queue entry: a Track, a dict (see from_dict) or a string."""
+    if isinstance(entry, Track):
+        return entry
+    if isinstance(entry, dict):
+        return from_dict(entry)
+    return from_string(entry)
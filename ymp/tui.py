@@ -1,9 +1,10 @@
 from textual.app import App, ComposeResult
 from textual.containers import Container, Horizontal, Vertical, VerticalScroll
-from textual.widgets import Header, Footer, Static, ListView, ListItem, Label, ProgressBar, Log, Button
+from textual.widgets import Header, Footer, Static, ListView, ListItem, Label, ProgressBar, Log, Button, Input
 from textual.binding import Binding
 from textual.message import Message
 from textual import work
+from textual.worker import get_current_worker
 from textual.reactive import reactive
 
 import threading
@@ -16,8 +17,22 @@ from ymp.playlistmanager import Playlist
 import ymp.downloader as downloader
 import ymp.player as player
 import ymp.config as config
+import ymp.spotify as spotify
+import ymp.radio as radio
+import ymp.playlists as playlists
+import ymp.cacheindex as cacheindex
+import ymp.tracing as tracing
+import ymp.metrics as metrics
+import ymp.logbook as logbook
+import ymp.search as search
+import ymp.library as library
+import ymp.offline as offline
+import ymp.watcher as watcher
+import ymp.tracks as tracks
 from ymp.mpris import MprisController
 
+LOG_FLUSH_SECONDS = 0.05 # Lines logged in between are written to the widget in one batch
+
 class YmpTui(App):
     """A Textual app for YMP (Your Music Player)."""
 
@@ -101,6 +116,25 @@ class YmpTui(App):
         height: 100%;
     }
 
+    #search-panel {
+        display: none;
+        height: auto;
+        border: solid $accent;
+    }
+
+    #search-panel.visible {
+        display: block;
+    }
+
+    #search-results {
+        height: auto;
+        max-height: 12;
+    }
+
+    #search-results ListItem {
+        padding: 0 1;
+    }
+
     ListItem {
         padding: 1;
     }
@@ -114,6 +148,8 @@ class YmpTui(App):
         Binding("s", "shuffle", "Shuffle"),
         Binding("right", "seek_forward", "+10s"),
         Binding("left", "seek_back", "-10s"),
+        Binding("slash", "search", "Search"),
+        Binding("escape", "close_search", "Close search", show=False),
     ]
 
     title = "YMP - Your Music Player"
@@ -124,7 +160,7 @@ class YmpTui(App):
     progress_total = reactive(100)
     progress_current = reactive(0)
 
-    def __init__(self, playlist_manager, download_dir, initial_queue=None):
+    def __init__(self, playlist_manager, download_dir, initial_queue=None, resume=None):
         super().__init__()
         self.playlist = playlist_manager
         # Disable Rich output as we are in TUI
@@ -132,12 +168,22 @@ class YmpTui(App):
 
         self.download_dir = download_dir
         self.is_loading = False
+        self.resume = resume # 'current' entry of a restored session snapshot
+        self.last_exit = None # When the previous player process ended (traced runs only)
+        self.control = None # Control socket, lets a second `ymp` hand over its songs
+        self.mpris = None
+        self.logbook = self.create_logbook()
+        self.log_level = config.get_log_level()
+        self.search_results = [] # Shown in the search panel
 
         # Add initial items
         if initial_queue:
             for song in initial_queue:
                  self.playlist.addsong(song)
 
+    def create_logbook(self):
+        return logbook.from_config()
+
     def compose(self) -> ComposeResult:
         """Create child widgets for the app."""
         yield Header()
@@ -161,7 +207,11 @@ class YmpTui(App):
                      yield Button("Play/Pause", id="btn-play", variant="warning")
                      yield Button("Next", id="btn-next", variant="primary")
 
-                yield Log(id="log-view")
+                with Vertical(id="search-panel"):
+                    yield Input(placeholder="Search YouTube (Enter queues the highlighted result)", id="search-input")
+                    yield ListView(id="search-results")
+
+                yield Log(id="log-view", max_lines=self.logbook.records.maxlen)
 
         yield Footer()
 
@@ -177,117 +227,386 @@ class YmpTui(App):
 
     def on_list_view_selected(self, event: ListView.Selected) -> None:
         """Handle playlist item selection (click)."""
-        # We want to jump to this song.
-        # This requires finding the song in the queue and skipping to it or moving it up.
-        # Since 'playlist.queuedplaylist' is just a list, playing a specific index is tricky
-        # if the logic relies on popping(0).
-        # A simple hack: Move the selected item to index 0 and call 'next_song'.
-
-        # Determine index from UI
-        # Note: The UI might be truncated (first 100 items), so index maps directly for those.
+        if event.list_view.id == "search-results":
+            self.queue_search_result(event.list_view.index)
+            return
+        # The UI might be truncated (first 100 items), so the index maps directly for those.
         # If user clicks "and more items...", ignore.
+        index = self.query_one("#playlist-view", ListView).index
+        if index is not None and index < len(self.playlist.queuedplaylist):
+            self.jump_to(index)
 
-        try:
-            # ListView.index gives the selected index
-            index = self.query_one("#playlist-view", ListView).index
-            if index is None: return
+    # --- Search panel ---
 
-            # Check boundaries
-            if index < len(self.playlist.queuedplaylist):
-                song = self.playlist.queuedplaylist[index]
-                self.log_message(f"Jumping to: {song}")
+    def action_search(self):
+        self.query_one("#search-panel").add_class("visible")
+        self.query_one("#search-input", Input).focus()
 
-                # Remove from current position and insert at top
-                self.playlist.queuedplaylist.pop(index)
-                self.playlist.queuedplaylist.insert(0, song)
+    def action_close_search(self):
+        self.query_one("#search-panel").remove_class("visible")
+        self.workers.cancel_group(self, "search")
+        self.query_one("#playlist-view", ListView).focus()
 
-                # Stop current playback and trigger next
-                self.playlist.stop_song() # Stops ffplay
-                # The run_player_loop will see nothing playing and start the next song (which is now our selection)
+    def on_input_changed(self, event: Input.Changed) -> None:
+        """Typeahead: cached (or prefix-filtered) results right away, local songs and a search debounced."""
+        if event.input.id != "search-input":
+            return
+        query = event.value.strip()
+        self.workers.cancel_group(self, "search")
+        if not query:
+            self.show_search_results([])
+            return
+        results, complete = search.CACHE.get(query, config.get_search_results())
+        if results is not None:
+            self.show_search_results(results)
+        self.run_search(query, results if complete else None)
+
+    def on_key(self, event) -> None:
+        if event.key == "down" and self.focused is self.query_one("#search-input", Input) and self.search_results:
+            self.query_one("#search-results", ListView).focus()
+
+    def on_input_submitted(self, event: Input.Submitted) -> None:
+        if event.input.id == "search-input":
+            self.queue_search_result(self.query_one("#search-results", ListView).index or 0)
+
+    @work(thread=True, exclusive=True, group="search")
+    def run_search(self, query, cached=None):
+        """
+        Searches after a typing pause; a newer keystroke cancels this worker. Local songs
+        are looked up here as well (a scan of the library index, too slow for every key),
+        YouTube only without complete `cached` results and if local songs leave room.
+        """
+        worker = get_current_worker()
+        time.sleep(config.get_search_debounce())
+        if worker.is_cancelled:
+            return
+        limit = config.get_search_results()
+        local = library.LIBRARY.search(query, limit)
+        if cached is not None and not local:
+            return # Shown already
+        results = cached
+        if results is None and len(local) < limit:
+            try:
+                results = search.search(query, limit)
+            except Exception as e:
+                self.log_message(f"Search failed: {e}", 'error')
+        if not worker.is_cancelled:
+            self.app.call_from_thread(self.show_search_results, search.merge(local, results or [], limit))
+
+    def show_search_results(self, results):
+        self.search_results = results
+        list_view = self.query_one("#search-results", ListView)
+        list_view.clear()
+        for result in results:
+            list_view.append(ListItem(Label(search.describe(result), markup=False)))
 
-                self.update_playlist_view()
-        except Exception as e:
-            self.log_message(f"Error selecting song: {e}")
+    def queue_search_result(self, index):
+        """Adds search result `index` to the end of the queue."""
+        if index is None or not 0 <= index < len(self.search_results):
+            return
+        result = self.search_results[index]
+        self.add_search_result(dict(result))
+        self.log_message(f"Queued: {result.get('title')}")
+
+    def add_search_result(self, result):
+        self.playlist.addsong(result)
+        self.update_playlist_view()
+
+    def jump_to(self, index):
+        """Plays queue entry `index` next and skips the current song (main thread)."""
+        try:
+            song = self.playlist.queuedplaylist.pop(index)
+        except IndexError:
+            return
+        self.log_message(f"Jumping to: {song.label}")
+        self.playlist.queuedplaylist.insert(0, song)
+        self.playlist.changed()
+        # The run_player_loop will see nothing playing and start the next song (which is now our selection)
+        if self.playlist.playobj:
+            self.playlist.nextsong()
+        self.update_playlist_view()
 
     def on_mount(self) -> None:
         """Called when app starts."""
+        # Initialize MPRIS
+        self.mpris = MprisController(self)
+        self.set_interval(LOG_FLUSH_SECONDS, self.flush_log)
+
         self.update_playlist_view()
         self.log_message("YMP Started. Ready to play.")
 
-        # Initialize MPRIS
-        self.mpris = MprisController(self)
+        offline.on_change(self.connectivity_changed)
+
+        # Live stream drops/reconnects are reported from the relay thread
+        self.playlist.on_stream_event = lambda message: self.log_message(message, 'warning')
+
+        # Spotify playlists and playlist files are streamed into the queue while they are parsed.
+        # Take them out right away so the player loop never tries to play the link itself.
+        for song in [s for s in self.playlist.queuedplaylist if spotify.is_spotify_url(s.url)]:
+            self.playlist.queuedplaylist.remove(song)
+            self.import_spotify(song.url)
+        for source in [s for s in self.playlist.queuedplaylist if playlists.is_playlist(s.url)]:
+            self.playlist.queuedplaylist.remove(source)
+            self.import_playlist(source.url)
+        for folder in [s for s in self.playlist.queuedplaylist if library.is_folder(s.url)]:
+            self.playlist.queuedplaylist.remove(folder)
+            self.import_folder(folder.url)
+        self.playlist.changed()
 
         # Check for unexpanded playlists in the queue
         self.check_for_playlists()
 
+        # Continue the song of a restored session before the loop picks the next one
+        if self.resume:
+            self.resume_playback(self.resume)
+
         # Start the background player loop
         self.run_player_loop()
 
         # Start progress updater
         self.set_interval(0.5, self.update_progress)
 
-    @work(thread=True)
+        if config.is_library_scan_enabled():
+            self.refresh_library()
+        self.start_watcher()
+
+        self.start_control_server()
+
+    def start_control_server(self):
+        """Publishes the control socket next to the lock file (see ymp.ctl)."""
+        from ymp.daemon import ControlServer
+        try:
+            control = ControlServer(self)
+            control.start()
+            self.control = control
+        except (OSError, AttributeError) as e: # AttributeError: no Unix sockets on this platform
+            self.log_message(f"Control socket unavailable: {e}", 'warning')
+
+    def on_unmount(self) -> None:
+        if self.control:
+            self.control.stop()
+            self.control = None
+        watcher.stop()
+        if self.connectivity_changed in offline.CONNECTIVITY.listeners:
+            offline.CONNECTIVITY.listeners.remove(self.connectivity_changed)
+        self.logbook.close()
+
     def check_for_playlists(self):
-        """Checks queue for playlist URLs and expands them in background."""
-        # This is a bit tricky because modifying the list while iterating is bad.
-        # But we only need to do this once at startup mostly.
+        """
+        Expands the YouTube playlist links in the queue (main thread). Each link stays in
+        place while its videos are queued in front of it page by page, so the first one
+        plays right away and the player waits there for the next page.
+        """
+        for song in self.playlist.queuedplaylist:
+            if song.state == tracks.UNRESOLVED and downloader.is_url(song.url) and "list=" in song.url:
+                self.expand_playlist(song, self.playlist.begin_expansion(song))
+        self.update_playlist_view()
 
-        # We look for "list=" items
-        to_expand = []
-        for idx, song in enumerate(self.playlist.queuedplaylist):
-            if isinstance(song, str) and "list=" in song and ("http://" in song or "https://" in song):
-                 to_expand.append((idx, song))
+    @work(thread=True)
+    def expand_playlist(self, link, start):
+        """Queues the videos of a playlist link while yt-dlp pages through it."""
+        self.log_message(f"Expanding playlist: {link.url}", 'debug')
+        count = 0
+        try:
+            for batch in playlists.batches(downloader.iter_playlist(link.url, start)):
+                if not self.app.call_from_thread(self.expand_playlist_batch, link, batch):
+                    break # The link was taken out of the queue
+                count += len(batch)
+        except Exception as e:
+            self.log_message(f"Error expanding playlist: {e}", 'error')
+        self.app.call_from_thread(self.end_playlist_expansion, link)
+        self.log_message(f"Expanded playlist: {count} songs added.")
 
-        if not to_expand:
-            return
+    def expand_playlist_batch(self, link, songs):
+        """Queues the next page of an expanding playlist (main thread)."""
+        added = self.playlist.expand(link, songs)
+        self.update_playlist_view()
+        return added
 
-        self.app.call_from_thread(self.log_message, "Expanding playlists in background...")
+    def end_playlist_expansion(self, link):
+        self.playlist.end_expansion(link)
+        self.update_playlist_view()
 
-        # Process expansion (simplified: append to end, remove original?)
-        # For better UX, we should insert them in place, but that requires locking.
-        # Let's just append for now or handle the first one found.
+    @work(thread=True)
+    def import_spotify(self, link):
+        """Queues the tracks of a Spotify playlist as they are fetched."""
+        log = self.log_message
+        count = self.stream_into_queue(spotify.iter_tracks(link, log=log))
+        log(f"Spotify import finished: {count} songs added.")
+
+    def stream_into_queue(self, songs, batch_size=50):
+        """
+        Appends songs from an iterator to the queue in batches (call from a worker thread).
+        The first song is queued on its own so playback can start immediately.
+        """
+        count = 0
+        for batch in playlists.batches(songs, batch_size):
+            self.app.call_from_thread(self.append_to_queue, batch)
+            count += len(batch)
+        return count
+
+    def append_to_queue(self, songs):
+        """Adds songs to the queue and refreshes the view (main thread)."""
+        for song in songs:
+            self.playlist.addsong(song)
+        self.update_playlist_view()
 
-        for idx, url in to_expand:
-             items = downloader.get_playlist_info(url)
-             if items:
-                 # We need to safely modify the list.
-                 # Let's schedule a callback to update the main list
-                 self.app.call_from_thread(self.expand_playlist_callback, url, items)
+    def enqueue(self, items, front=False):
+        """Adds songs/URLs/playlists handed over by another invocation (main thread)."""
+        songs = []
+        for item in items:
+            if isinstance(item, str) and spotify.is_spotify_url(item):
+                self.import_spotify(item)
+            elif playlists.is_playlist(item):
+                self.import_playlist(item)
+            elif library.is_folder(item):
+                self.import_folder(item)
+            else:
+                songs.append(item)
+        queue = self.playlist.queuedplaylist
+        start = len(queue)
+        for song in songs:
+            self.playlist.addsong(song)
+        if front:
+            queue[:] = queue[start:] + queue[:start]
+            self.playlist.changed()
+        self.update_playlist_view()
+        self.log_message(f"Added {len(items)} item(s) from the command line.")
+        # YouTube playlist links are expanded in place
+        self.check_for_playlists()
+        return len(songs)
 
-    def expand_playlist_callback(self, url, items):
-        """Callback to safely update playlist on main thread."""
-        # Find the URL and replace it or append
+    @work(thread=True)
+    def import_playlist(self, source):
+        """Queues the entries of a PLS/M3U/XSPF playlist while it is read."""
         try:
-            # We remove the playlist URL
-            if url in self.playlist.queuedplaylist:
-                self.playlist.queuedplaylist.remove(url)
-                # And extend with new items
-                self.playlist.queuedplaylist.extend(items)
-                self.update_playlist_view()
-                self.log_message(f"Expanded playlist: {len(items)} songs added.")
+            count = self.stream_into_queue(playlists.iter_queue_entries(source))
         except Exception as e:
-            self.log_message(f"Error expanding playlist: {e}")
+            self.log_message(f"Error reading playlist {source}: {e}", 'error')
+            return
+        self.log_message(f"Playlist loaded: {count} entries from {source}")
+
+    @work(thread=True)
+    def import_folder(self, folder):
+        """Queues the songs of a local folder from the library index (rescanned first)."""
+        library.LIBRARY.refresh(folder)
+        count = self.stream_into_queue(library.LIBRARY.songs_in(folder))
+        self.log_message(f"Folder loaded: {count} songs from {folder}")
+
+    @work(thread=True)
+    def refresh_library(self):
+        """Indexes new and changed songs of the music directory (see ymp.library)."""
+        updated, removed = library.LIBRARY.refresh()
+        self.log_message(f"Library: {len(library.LIBRARY)} songs ({updated} updated, {removed} removed)", 'debug')
+
+    @work(thread=True)
+    def start_watcher(self):
+        """Keeps track of the music directory from now on, instead of walking it (see ymp.watcher)."""
+        running = watcher.start()
+        if running and not running.live:
+            self.log_message("Music directory not watched live (no inotify), rescanning periodically.", 'debug')
+
+    # --- Control commands (called from the control socket's threads) ---
+
+    def _require_song(self):
+        from ymp.ctl import DaemonError
+        if not self.playlist.playobj:
+            raise DaemonError("Nothing is playing")
+
+    def cmd_ping(self):
+        return {'pid': os.getpid(), 'mode': 'tui'}
+
+    def cmd_enqueue(self, items, front=False):
+        if isinstance(items, str):
+            items = [items]
+        count = self.call_from_thread(self.enqueue, items, front)
+        return {'queued': count, 'message': f"Queued {len(items)} item(s)."}
+
+    def cmd_next(self):
+        self.call_from_thread(self.action_next_song)
+
+    def cmd_prev(self):
+        self.call_from_thread(self.action_prev_song)
+
+    def cmd_pause(self):
+        self._require_song()
+        self.call_from_thread(self.action_toggle_pause)
+        return {'paused': self.playlist.songpaused}
+
+    def cmd_shuffle(self):
+        self.call_from_thread(self.action_shuffle)
+
+    def cmd_seek(self, seconds):
+        self._require_song()
+        self.call_from_thread(self.seek_by, float(seconds))
+
+    def cmd_jump(self, index):
+        from ymp.ctl import DaemonError
+        if not 0 <= index < len(self.playlist.queuedplaylist):
+            raise DaemonError(f"No queue entry {index}")
+        self.call_from_thread(self.jump_to, index)
+        return {'message': "Jumping..."}
+
+    def cmd_status(self, since=None, queue=False):
+        meta = (self.playlist.meta or {}) if self.playlist.playobj else {}
+        return {
+            'title': meta.get('title'),
+            'artist': meta.get('artist'),
+            'duration': meta.get('duration') or 0,
+            'position': self.playlist.get_position(),
+            'paused': self.playlist.songpaused,
+            'loading': self.is_loading,
+            'queue_length': len(self.playlist.queuedplaylist),
+            'stream': self.playlist.stream_stats(),
+        }
+
+    def cmd_queue(self):
+        return {'queue': [track.to_dict() for track in self.playlist.queuedplaylist],
+                'history': [track.to_dict() for track in self.playlist.playedplaylist]}
+
+    def resume_playback(self, current):
+        """Resumes the song of a restored session from its cached file."""
+        meta = current.get('meta') or {}
+        # The file may have been collapsed into another copy of the same video (ymp --dedupe)
+        filepath = cacheindex.INDEX.locate(meta.get('id'), current.get('filepath'))
+        cached = filepath is not None
+        metrics.cache_lookup('resume', hit=cached)
+        if cached:
+            self.is_loading = True
+            self.playlist.filepath = filepath
+            self.log_message(f"Resuming session: {meta.get('title', filepath)}")
+            self.play_downloaded(meta, None, start_ms=int(current.get('position', 0) * 1000))
+        elif self.playlist.playedplaylist:
+            # Not cached: the last played entry is the resolved song, replay it from the start
+            self.playlist.shiftlastplayedsong()
+            self.update_playlist_view()
 
-    def log_message(self, msg: str) -> None:
-        """Write to the log widget."""
-        log = self.query_one(Log)
-        log.write_line(msg)
+    def log_message(self, msg: str, level: str = 'info') -> None:
+        """Adds a line to the log (any thread); the log widget shows it with the next flush."""
+        self.logbook.add(msg, level)
+
+    def flush_log(self) -> None:
+        """Writes the lines logged since the last flush to the log widget in one batch."""
+        lines = self.logbook.drain(self.log_level)
+        if lines:
+            self.query_one(Log).write_lines(lines)
 
     def update_playlist_view(self) -> None:
         """Syncs the UI list with the playlist manager."""
-        list_view = self.query_one("#playlist-view", ListView)
-        list_view.clear()
-
         # Optimization: Only show the first 100 items to prevent UI freezing with large playlists
-        max_items = 100
-        total_items = len(self.playlist.queuedplaylist)
+        self.render_queue(self.playlist.queuedplaylist[:100], len(self.playlist.queuedplaylist))
+        if self.mpris:
+            self.mpris.tracklist_changed()
 
-        for idx, song in enumerate(self.playlist.queuedplaylist[:max_items]):
-            title = song
-            if isinstance(song, dict):
-                title = song.get('title', song.get('url', 'Unknown'))
+    def render_queue(self, songs, total_items):
+        """Shows the first queue entries (songs) out of total_items."""
+        list_view = self.query_one("#playlist-view", ListView)
+        list_view.clear()
+        max_items = len(songs)
 
-            list_view.append(ListItem(Label(f"{idx+1}. {title}")))
+        for idx, song in enumerate(songs):
+            # Tracks here, their to_dict() copies when attached to a daemon
+            list_view.append(ListItem(Label(f"{idx+1}. {tracks.of(song).label}")))
 
         if total_items > max_items:
             list_view.append(ListItem(Label(f"... and {total_items - max_items} more items")))
@@ -306,12 +625,20 @@ class YmpTui(App):
                 self.app.call_from_thread(self.handle_song_finished)
 
             # Check if we need to start a song (Queue has items, nothing playing)
-            elif not self.playlist.playobj and not self.playlist.songpaused and self.playlist.queuedplaylist and not self.is_loading:
+            elif not self.playlist.playobj and not self.playlist.songpaused and self.playlist.has_next() and not self.is_loading:
                 self.app.call_from_thread(self.start_next_song)
 
             time.sleep(0.5)
 
     def handle_song_finished(self):
+        station = self.playlist.station
+        if station:
+            # A radio stream never finishes on its own: the mirror dropped or stalled
+            if self.playlist.failover_station():
+                self.log_message(f"Stream dropped, switching to {station.label()}")
+                self.update_playlist_view()
+                return
+            self.log_message(f"All mirrors of {station.title} failed.", 'error')
         self.log_message("Song finished.")
         # Logic from original play() loop
         if self.playlist.repeat == 2:
@@ -320,6 +647,8 @@ class YmpTui(App):
             self.playlist.loopqueue()
 
         # Trigger next song logic via loop
+        self.last_exit = getattr(self.playlist.playobj, 'exited_at', None)
+        self.playlist.mark_finished(self.last_exit)
         self.playlist.playobj = None # Reset
         self.update_playlist_view()
 
@@ -334,41 +663,135 @@ class YmpTui(App):
 
     @work(thread=True)
     def download_and_play(self):
-        if not self.playlist.queuedplaylist:
+        if not self.playlist.has_next():
             # Should not happen if checked correctly before calling, but safe guard
             self.app.call_from_thread(self.set_loading_false)
             return
 
-        song = self.playlist.returnsong() # Pops from queue
+        trace = tracing.begin_track(since=self.last_exit, on_finish=self.log_trace)
+        self.last_exit = None
+        with trace.activate():
+            self.play_next(trace)
+
+    def play_next(self, trace):
+        """Pops the next song, resolves it and starts playback (runs in the download_and_play worker)."""
+        with tracing.span('queue_pop'):
+            song = self.playlist.returnsong() # Pops from queue
+        trace.set_label(song)
 
         # Update UI to show we popped it
         self.app.call_from_thread(self.update_playlist_view)
-        self.app.call_from_thread(self.log_message, f"Fetching info for: {song}...")
+
+        entry = self.playlist.playedplaylist[-1] if self.playlist.playedplaylist else None
+        if radio.is_station(entry):
+            self.play_station(entry, trace)
+            return
+        local = playlists.local_meta(entry)
+        if local:
+            # A file from a local playlist, nothing to resolve
+            self.playlist.filepath = song
+            self.playlist.trace = trace
+            self.app.call_from_thread(self.play_downloaded, local, None)
+            return
+
+        if not offline.is_online(wait=True):
+            self.play_offline(entry, song, trace)
+            return
+
+        self.log_message(f"Fetching info for: {song}...", 'debug')
 
         try:
             # Fast Stream Start
             meta_stream, stream_url = downloader.extract_stream_info(song)
             if meta_stream and stream_url:
-                self.app.call_from_thread(self.log_message, f"Starting stream: {meta_stream.get('title')}")
+                self.playlist.mark_resolved(meta_stream)
+                self.log_message(f"Starting stream: {meta_stream.get('title')}")
                 # Start playing stream immediately
+                self.playlist.trace = trace
                 self.app.call_from_thread(self.play_stream, meta_stream, stream_url)
 
-                # Background download for cache (fire and forget)
-                self.background_cache(song)
+                # Background download for cache (fire and forget), of the exact video we resolved
+                self.background_cache(meta_stream.get('webpage_url') or song)
+            elif not offline.note_failure():
+                self.play_offline(entry, song, trace)
             else:
-                self.app.call_from_thread(self.log_message, "Stream info failed, falling back to download...")
+                self.log_message("Stream info failed, falling back to download...", 'warning')
                 # Fallback
                 dir_path = self.download_dir.name if hasattr(self.download_dir, 'name') else self.download_dir
                 meta = self.playlist.downloadsong(song, dir_path)
                 if meta:
+                     self.playlist.mark_resolved(meta)
+                     self.playlist.trace = trace
                      self.app.call_from_thread(self.play_downloaded, meta, dir_path)
                 else:
-                     self.app.call_from_thread(self.log_message, f"Failed to download {song}")
+                     self.log_message(f"Failed to download {song}", 'error')
                      self.app.call_from_thread(self.set_loading_false)
         except Exception as e:
-            self.app.call_from_thread(self.log_message, f"Error starting song: {e}")
+            self.log_message(f"Error starting song: {e}", 'error')
             self.app.call_from_thread(self.set_loading_false)
 
+    def play_offline(self, entry, song, trace):
+        """Plays the stored copy of an entry while offline, else defers it (runs in the download_and_play worker)."""
+        hit = offline.local_copy(entry)
+        if hit:
+            filepath, meta = hit
+            self.playlist.filepath = filepath
+            self.playlist.trace = trace
+            self.log_message(f"Offline: playing {meta.get('title') or song} from disk")
+            self.app.call_from_thread(self.play_downloaded, meta, None)
+            return
+        if self.playlist.defer_last():
+            self.log_message(f"Offline: {song} deferred until the connection is back")
+        else:
+            self.log_message(f"Offline: skipped {song} (no local copy)", 'warning')
+        self.app.call_from_thread(self.update_playlist_view)
+        self.app.call_from_thread(self.set_loading_false)
+
+    def connectivity_changed(self, online):
+        """Listener of ymp.offline (watcher thread)."""
+        if online:
+            self.log_message("Back online.")
+            self.call_from_thread(self.requeue_deferred)
+        else:
+            self.log_message("Offline: playing from the cache and library only.", 'warning')
+
+    def requeue_deferred(self):
+        count = self.playlist.requeue_deferred()
+        if count:
+            self.log_message(f"Queued {count} deferred song(s) again.")
+            self.update_playlist_view()
+
+    def play_station(self, entry, trace):
+        """Races the mirrors of a radio station and plays the fastest (runs in the download_and_play worker)."""
+        station = radio.Station(entry)
+        self.log_message(f"Connecting to {station.title} ({len(station.mirrors)} mirrors)...")
+        with tracing.span('resolve', station=station.title):
+            url = station.race()
+        if not url:
+            self.log_message(f"No mirror of {station.title} is reachable.", 'error')
+            self.app.call_from_thread(self.set_loading_false)
+            return
+        self.playlist.trace = trace
+        self.app.call_from_thread(self.start_station, station, url)
+
+    def start_station(self, station, url):
+        """Plays a radio station (main thread)."""
+        meta = station.meta()
+        self.current_song_title = station.title
+        self.query_one("#now-playing", Static).update(station.title)
+        self.log_message(f"Playing {station.label()}")
+        self.mpris.update_metadata(station.title, 0, "")
+        self.mpris.update_playback_status(True)
+        self.playlist.play_station(station, url)
+        self.progress_total = 100
+        self.query_one(ProgressBar).update(total=None)
+        self.is_loading = False
+
+    def log_trace(self, summary):
+        """Logs the time-to-first-sound breakdown of a traced track (any thread)."""
+        for line in summary.splitlines():
+            self.log_message(line)
+
     def update_download_indicator(self, active: bool):
         lbl = self.query_one("#download-indicator", Label)
         if active:
@@ -384,14 +807,18 @@ class YmpTui(App):
         self.app.call_from_thread(self.update_download_indicator, True)
         try:
              # We use the standard download function which handles smart cache logic
-             self.app.call_from_thread(self.log_message, f"Background downloading: {song}")
-             meta, path = downloader.download(song)
+             self.log_message(f"Background downloading: {song}", 'debug')
+             meta, path = downloader.download(song, lookup='background')
              if path:
-                 self.app.call_from_thread(self.log_message, f"Saved to: {path}")
+                 self.log_message(f"Saved to: {path}", 'debug')
+                 # Remember the local copy so a session snapshot can resume from it
+                 current = self.playlist.meta or {}
+                 if meta and current.get('id') == meta.get('id'):
+                     self.playlist.cachepath = path
              else:
-                 self.app.call_from_thread(self.log_message, f"Download failed for: {song}")
+                 self.log_message(f"Download failed for: {song}", 'warning')
         except Exception as e:
-             self.app.call_from_thread(self.log_message, f"Cache Error: {e}")
+             self.log_message(f"Cache Error: {e}", 'warning')
         finally:
              self.app.call_from_thread(self.update_download_indicator, False)
 
@@ -409,7 +836,7 @@ class YmpTui(App):
         self.query_one("#now-playing", Static).update(title)
 
         # Update MPRIS
-        self.mpris.update_metadata(title, duration, artist)
+        self.mpris.update_metadata(title, duration, artist, meta)
         self.mpris.update_playback_status(True)
 
         # Set the filepath to the URL so genmusic plays the stream
@@ -420,7 +847,7 @@ class YmpTui(App):
         self.query_one(ProgressBar).update(total=self.progress_total)
         self.is_loading = False
 
-    def play_downloaded(self, meta, dir_path):
+    def play_downloaded(self, meta, dir_path, start_ms=0):
         title = meta.get('title', 'Unknown')
         artist = meta.get('artist', '')
         duration = meta.get('duration', 0)
@@ -430,17 +857,20 @@ class YmpTui(App):
         self.log_message(f"Playing: {title}")
 
         # Update MPRIS
-        self.mpris.update_metadata(title, duration, artist)
+        self.mpris.update_metadata(title, duration, artist, meta)
         self.mpris.update_playback_status(True)
 
         # LRU Optimization: Touch the file to update mtime so it's not deleted by SmartDownload
-        if self.playlist.filepath and os.path.exists(self.playlist.filepath):
+        # (only our own cache, not files played from a local playlist)
+        filepath = self.playlist.filepath
+        music_dir = os.path.join(os.path.abspath(config.get_music_dir()), '')
+        if filepath and os.path.exists(filepath) and os.path.abspath(filepath).startswith(music_dir):
             try:
-                os.utime(self.playlist.filepath, None)
+                os.utime(filepath, None)
             except OSError:
                 pass
 
-        self.playlist.playsong(meta, dir_path)
+        self.playlist.playsong(meta, dir_path, start_ms)
         self.progress_total = duration or 100
         self.query_one(ProgressBar).update(total=self.progress_total)
         self.is_loading = False
@@ -450,8 +880,7 @@ class YmpTui(App):
         if self.playlist.playobj and not self.playlist.songpaused:
              # Calculate progress
              if self.playlist.starttime:
-                elapsed_ms = (time.time() - self.playlist.starttime) * 1000 + (self.playlist.resumetime or 0)
-                elapsed_seconds = elapsed_ms / 1000
+                elapsed_seconds = self.playlist.get_position()
                 self.progress_current = elapsed_seconds
                 self.query_one(ProgressBar).update(progress=elapsed_seconds)
 
@@ -463,7 +892,7 @@ class YmpTui(App):
     def action_toggle_pause(self):
         if self.playlist.songpaused:
              self.playlist.resumesong(None)
-             self.log_message("Resumed.")
+             self.log_message(self.with_timeshift("Resumed."))
              self.is_paused = False
              self.mpris.update_playback_status(True)
         else:
@@ -472,6 +901,19 @@ class YmpTui(App):
              self.is_paused = True
              self.mpris.update_playback_status(False)
 
+    def set_paused(self, paused):
+        """Pauses or resumes the current song, if it is not already (MPRIS Play/Pause)."""
+        if self.playlist.playobj and self.playlist.songpaused != paused:
+            self.action_toggle_pause()
+
+    def seek_by(self, seconds):
+        """Seeks relative to the current position (main thread)."""
+        if not self.playlist.playobj:
+            return
+        self.playlist.seeksong(seconds, None)
+        self.log_message(self.with_timeshift(f"Seek {seconds:+g}s"))
+        self.mpris.seeked()
+
     def action_next_song(self):
         self.log_message("Skipping to next...")
         self.playlist.nextsong()
@@ -487,15 +929,129 @@ class YmpTui(App):
         self.log_message("Queue shuffled.")
 
     def action_seek_forward(self):
-        self.playlist.seeksong(10, None)
-        self.log_message("Seek +10s")
+        self.seek_by(10)
 
     def action_seek_back(self):
-        self.playlist.seeksong(-10, None)
-        self.log_message("Seek -10s")
+        self.seek_by(-10)
+
+    def with_timeshift(self, message):
+        """Adds how far a radio station plays behind live (after pause/seek)."""
+        timeshift = self.playlist.timeshift_label()
+        return f"{message} ({timeshift})" if timeshift else message
 
     def action_quit(self):
         self.log_message("Exiting...")
         self.playlist.stop_all()
         downloader.removedownload(self.download_dir)
         self.exit()
+
+
+class AttachedTui(YmpTui):
+    """
+    The TUI as a remote control of a running `ymp --daemon`: it shows the daemon's
+    state and sends the key bindings as control commands, playback stays in the daemon.
+    """
+
+    def __init__(self, client):
+        super().__init__(playlist_manager=Playlist(), download_dir=None)
+        self.client = client
+        self.log_seq = 0
+        self.shown_queue = None
+        self.client_lock = threading.Lock() # One request at a time on the socket
+        self.connected = True
+
+    def create_logbook(self):
+        return logbook.from_config(file=False) # The daemon writes the log file
+
+    def on_mount(self, event) -> None:
+        event.prevent_default() # The daemon owns the player loop and MPRIS
+        self.set_interval(LOG_FLUSH_SECONDS, self.flush_log)
+        self.log_message("Attached to the running ymp daemon. Quitting leaves it playing.")
+        self.sync()
+
+    def request(self, cmd, **args):
+        """Sends a control command (worker threads only), logging errors instead of raising."""
+        from ymp.ctl import DaemonError
+        try:
+            with self.client_lock:
+                reply = self.client.request(cmd, **args)
+        except DaemonError as e:
+            self.log_message(f"Error: {e}", 'error')
+            return None
+        except (OSError, ValueError):
+            if self.connected: # Not closed by action_quit
+                self.connected = False
+                self.log_message("Lost connection to the ymp daemon.", 'error')
+                self.call_from_thread(self.query_one("#now-playing", Static).update, "Disconnected")
+            return None
+        if reply.get('message'):
+            self.log_message(reply['message'])
+        return reply
+
+    @work(thread=True)
+    def send(self, cmd, **args):
+        """Sends the control command of a key binding without blocking the UI."""
+        self.request(cmd, **args)
+
+    @work(thread=True, exclusive=True, group="sync")
+    def sync(self):
+        """Polls the daemon's status, new log lines and the head of the queue every 0.5s."""
+        worker = get_current_worker()
+        while self.connected and not worker.is_cancelled:
+            status = self.request('status', since=self.log_seq, queue=True)
+            if status is not None and not worker.is_cancelled:
+                self.log_seq = status['log_seq']
+                self.call_from_thread(self.show_status, status)
+            time.sleep(0.5)
+
+    def show_status(self, status):
+        for line in status['log']:
+            self.log_message(line)
+
+        title = status['title'] or ("Loading..." if status['loading'] else "No song playing")
+        if title != self.current_song_title:
+            self.current_song_title = title
+            self.query_one("#now-playing", Static).update(title)
+        self.is_paused = status['paused']
+        self.progress_total = status['duration'] or 100
+        self.query_one(ProgressBar).update(total=self.progress_total, progress=status['position'])
+
+        shown = (status['queue'], status['queue_length'])
+        if shown != self.shown_queue:
+            self.shown_queue = shown
+            self.render_queue(*shown)
+
+    def add_search_result(self, result):
+        self.send('enqueue', items=[result])
+
+    def on_list_view_selected(self, event: ListView.Selected) -> None:
+        event.prevent_default() # The local queue is only a view
+        if event.list_view.id == "search-results":
+            self.queue_search_result(event.list_view.index)
+            return
+        index = self.query_one("#playlist-view", ListView).index
+        if index is not None and self.shown_queue and index < len(self.shown_queue[0]):
+            self.send('jump', index=index)
+
+    def action_toggle_pause(self):
+        self.send('pause')
+
+    def action_next_song(self):
+        self.send('next')
+
+    def action_prev_song(self):
+        self.send('prev')
+
+    def action_shuffle(self):
+        self.send('shuffle')
+
+    def action_seek_forward(self):
+        self.send('seek', seconds=10)
+
+    def action_seek_back(self):
+        self.send('seek', seconds=-10)
+
+    def action_quit(self):
+        self.connected = False
+        self.client.close()
+        self.exit()
@@ -0,0 +1,290 @@
+"""
+Live view of the music directory, kept current by inotify (Linux).
+
+Smart Download used to walk the whole tree on every download to count the songs and
+their bytes (manage_storage, check_disk_usage), and files added, moved or deleted by
+hand were only noticed on that walk. MusicTree holds the songs by inode (hardlinks are
+one song, as in config._stored_songs) with their size and mtime, and the byte total.
+Watcher keeps it current from inotify events, so manage_storage() reads it instead of
+walking the tree, and passes the changes on to the library index (tags of new songs)
+and the cache index/analysis store (renamed songs).
+
+A reconcile scan every `[Watcher] reconcile_minutes` catches anything inotify missed
+(e.g. a queue overflow). Without inotify (other platforms, no watches left), only the
+reconcile runs and manage_storage keeps walking the tree, as the view may be stale.
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+
+import ymp.config as config
+
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x1000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+_EVENT = struct.Struct('iIII') # wd, mask, cookie, name length
+FLUSH_SECONDS = 1.0 # Changes are handed to the library/cache index in batches
+
+def _is_song(name):
+    return name.endswith('.mp3')
+
+class MusicTree:
+    """The songs below a directory: by inode, their paths, size and mtime, and the byte total."""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.songs = {} # (dev, ino) -> [paths, mtime, size]
+        self.paths = {} # path -> (dev, ino)
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def scan(self):
+        """Rebuilds the view from a walk of the tree."""
+        songs, paths, total = {}, {}, 0
+        for path in config.iter_music_files(self.root):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            key = (st.st_dev, st.st_ino)
+            if key in songs:
+                songs[key][0].append(path)
+            else:
+                songs[key] = [[path], st.st_mtime, st.st_size]
+                total += st.st_size
+            paths[path] = key
+        with self._lock:
+            self.songs, self.paths, self.total = songs, paths, total
+
+    def update(self, path):
+        """Adds a song or updates its size/mtime (after a write, touch or move in)."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.remove(path)
+            return
+        key = (st.st_dev, st.st_ino)
+        with self._lock:
+            if self.paths.get(path) not in (None, key):
+                self._remove(path)
+            song = self.songs.get(key)
+            if song is None:
+                self.songs[key] = [[path], st.st_mtime, st.st_size]
+                self.total += st.st_size
+            else:
+                if path not in song[0]:
+                    song[0].append(path)
+                song[1] = st.st_mtime # Hardlinks share it; a touch may also set it back
+                self.total += st.st_size - song[2]
+                song[2] = st.st_size
+            self.paths[path] = key
+
+    def remove(self, path):
+        with self._lock:
+            self._remove(path)
+
+    def _remove(self, path):
+        key = self.paths.pop(path, None)
+        song = self.songs.get(key)
+        if song is None:
+            return
+        song[0].remove(path)
+        if not song[0]: # The last link of the file
+            del self.songs[key]
+            self.total -= song[2]
+
+    def remove_below(self, folder):
+        """Drops the songs of a folder that was deleted or moved away. Returns their paths."""
+        prefix = os.path.join(folder, '')
+        with self._lock:
+            gone = [p for p in self.paths if p.startswith(prefix)]
+            for path in gone:
+                self._remove(path)
+        return gone
+
+    def stored_songs(self):
+        """Like config._stored_songs: (paths, mtime, size) per song, oldest first."""
+        with self._lock:
+            songs = [(list(paths), mtime, size) for paths, mtime, size in self.songs.values()]
+        return sorted(songs, key=lambda song: song[1])
+
+    def usage_mb(self):
+        with self._lock:
+            return self.total / (1024 * 1024)
+
+def _libc():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1, libc.inotify_add_watch # Not on every libc
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+class Watcher:
+    """Keeps a MusicTree current with inotify, reconciles it periodically and syncs the indexes."""
+
+    def __init__(self, root, reconcile_seconds=600, sync_indexes=True):
+        self.tree = MusicTree(root)
+        self.reconcile_seconds = reconcile_seconds
+        self.sync_indexes = sync_indexes
+        self.live = False # True while inotify delivers the changes
+        self._fd = None
+        self._libc = None
+        self._watches = {} # wd -> directory
+        self._moves = {} # cookie -> path moved away
+        self._changed, self._removed, self._renamed = set(), set(), []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        os.makedirs(self.tree.root, exist_ok=True)
+        self._libc = _libc() if os.name == 'posix' else None
+        if self._libc is not None:
+            fd = self._libc.inotify_init1(IN_CLOEXEC)
+            if fd >= 0:
+                self._fd = fd
+                self.live = self._watch_tree(self.tree.root)
+        self.tree.scan() # After the watches, so nothing falls in between
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self.live = False
+
+    def _watch_tree(self, folder):
+        """Watches a folder and its subfolders. False if the watch limit was hit."""
+        for dirpath, _, _ in os.walk(folder):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dirpath), WATCH_MASK)
+            if wd < 0:
+                if ctypes.get_errno() == 28: # ENOSPC: fs.inotify.max_user_watches
+                    return False
+                continue
+            self._watches[wd] = dirpath
+        return True
+
+    def _run(self):
+        next_reconcile = time.monotonic() + self.reconcile_seconds
+        next_flush = None
+        while not self._stop.is_set():
+            timeout = min(next_reconcile, next_flush or next_reconcile) - time.monotonic()
+            if self._fd is not None:
+                ready, _, _ = select.select([self._fd], [], [], max(0, min(timeout, 1.0)))
+                if ready:
+                    self._handle(os.read(self._fd, 64 * 1024))
+                    next_flush = next_flush or time.monotonic() + FLUSH_SECONDS
+            else:
+                self._stop.wait(max(0, min(timeout, 1.0)))
+            now = time.monotonic()
+            if next_flush and now >= next_flush:
+                self._flush()
+                next_flush = None
+            if now >= next_reconcile:
+                self.reconcile()
+                next_reconcile = now + self.reconcile_seconds
+
+    def _handle(self, data):
+        pos = 0
+        while pos + _EVENT.size <= len(data):
+            wd, mask, cookie, length = _EVENT.unpack_from(data, pos)
+            name = data[pos + _EVENT.size:pos + _EVENT.size + length].split(b'\0', 1)[0]
+            pos += _EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                self.reconcile() # Events were lost
+                continue
+            folder = self._watches.get(wd)
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            if folder is None or not name:
+                continue
+            path = os.path.join(folder, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # Files may have landed before the watch was added: take what is there
+                    self.live = self._watch_tree(path) and self.live
+                    for song in config.iter_music_files(path):
+                        self.tree.update(song)
+                        self._changed.add(song)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._removed.update(self.tree.remove_below(path))
+                continue
+            if not _is_song(path):
+                continue
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                self.tree.remove(path)
+                if mask & IN_MOVED_FROM:
+                    self._moves[cookie] = path
+                self._removed.add(path)
+                self._changed.discard(path)
+            elif mask & (IN_CREATE | IN_CLOSE_WRITE | IN_MOVED_TO | IN_ATTRIB):
+                self.tree.update(path)
+                if mask & IN_MOVED_TO and cookie in self._moves:
+                    self._renamed.append((self._moves.pop(cookie), path))
+                if not mask & IN_ATTRIB: # A touch (LRU on play) changes no tags
+                    self._changed.add(path)
+                    self._removed.discard(path)
+
+    def _flush(self):
+        """Hands the collected changes to the library, cache index and analysis store."""
+        changed, removed, renamed = self._changed, self._removed, self._renamed
+        self._changed, self._removed, self._renamed, self._moves = set(), set(), [], {}
+        if not self.sync_indexes:
+            return
+        import ymp.analysis as analysis
+        import ymp.cacheindex as cacheindex
+        import ymp.library as library
+        for old, new in renamed:
+            cacheindex.INDEX.rename(old, new)
+            analysis.STORE.rename(old, new)
+        library.LIBRARY.update(changed, removed)
+
+    def reconcile(self):
+        self.tree.scan()
+        if self.sync_indexes:
+            import ymp.library as library
+            library.LIBRARY.refresh(self.tree.root)
+
+_watcher = None
+
+def start(music_dir=None):
+    """Starts watching the music directory (if enabled). Returns the Watcher, or None."""
+    global _watcher
+    if _watcher is None and config.is_watcher_enabled():
+        _watcher = Watcher(music_dir or config.get_music_dir(), config.get_reconcile_minutes() * 60).start()
+    return _watcher
+
+def stop():
+    global _watcher
+    if _watcher is not None:
+        _watcher.stop()
+        _watcher = None
+
+def current(music_dir):
+    """The live MusicTree of a directory, or None if it is not watched (walk it instead)."""
+    if _watcher is not None and _watcher.live and _watcher.tree.root == os.path.abspath(music_dir):
+        return _watcher.tree
+    return None